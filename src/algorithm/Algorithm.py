@@ -1,26 +1,34 @@
-from algorithm import Context, Instance, Solution, ExactSolution
+from algorithm import Context, Instance, Solution, ExactSolution, CompactExactSolution, ElitePool, LocalSearch, ParallelConstruction, Decomposition
+from utils import IO, Statistics
+import math
 import time
 
 class Algorithm:
-    def __init__(self, context: Context, instance: Instance):
+    def __init__(self, context: Context, instance: Instance, deadline: float = None):
+        self.IO = IO()
         self.context = context
         self.instance = instance
-        self.solutions_fitness = []
-        self.solutions = []
+        self.deadline = deadline if deadline is not None else math.inf # time.time() at which the algorithm stops
+        self.elite_pool = ElitePool(context, context.parameters.ELITE_POOL_SIZE, context.parameters.ELITE_MIN_DIVERSITY)
+        self.fitness_statistics = Statistics()
         self.best_solution = None
         self.best_fitness = 0x3f3f3f3f
+        self.start_time = time.time()
+        self.snapshot_time = 0
+        self.snapshot_pending = False
         self.execute_algorithm()
 
     
     def add_solution(self, solution: Solution):
         """
-        Add a solution to the algorithm
+        Add a solution to the algorithm: its fitness feeds the streaming statistics and the
+        solution is kept only if it enters the elite pool
 
         Args:
             solution (Solution): Solution to add
         """
-        self.solutions.append(solution)
-        self.solutions_fitness.append(solution.fitness)
+        self.fitness_statistics.add_value(solution.fitness)
+        self.elite_pool.add_solution(solution)
 
     
     def set_best_solution(self, solution: Solution):
@@ -32,14 +40,60 @@ class Algorithm:
         """
         self.best_solution = solution
         self.best_fitness = solution.fitness
+        self.snapshot_pending = True
+        self.flush_snapshot()
+
+
+    def flush_snapshot(self):
+        """
+        Write the pending snapshot once SNAPSHOT_INTERVAL has passed since the last one. Called after every
+        iteration, so that an improvement found right after a snapshot is written even if no other one follows
+        """
+        if self.snapshot_pending and time.time() - self.snapshot_time >= self.context.parameters.SNAPSHOT_INTERVAL:
+            self.save_snapshot()
+
+
+    def save_snapshot(self):
+        """
+        Write the best solution found so far to the output folder (best_solution.json), atomically
+        so that it can be read at any moment. Snapshots are written at most every SNAPSHOT_INTERVAL seconds
+        """
+        if not self.snapshot_pending or not self.context.parameters.SAVE_SNAPSHOTS or self.context.output_folder is None:
+            return
+        solution = self.best_solution
+        snapshot = {
+            'fitness': float(solution.fitness),
+            'total_distance': int(solution.total_distance),
+            'current_stock': float(solution.current_stock),
+            'storage_cost': float(solution.storage_cost),
+            'routes': solution.routes,
+            'unserved': sorted(solution.unserved),
+            'elapsed_time': time.time() - self.start_time,
+        }
+        self.IO.write_json_atomic(snapshot, self.context.output_folder + 'best_solution.json')
+        self.snapshot_time = time.time()
+        self.snapshot_pending = False
+
+
+    def get_remaining_time(self) -> float:
+        """
+        Seconds left until the deadline of the algorithm
+        """
+        return self.deadline - time.time()
 
 
     def execute_algorithm(self):
         """
-        Execute the algorithm
+        Execute the algorithm. It can be stopped at any moment (deadline or Ctrl+C) keeping the best solution found
         """
-        self.construct()
-        self.improve()
+        try:
+            self.construct()
+            self.improve()
+            if self.context.parameters.ALGORITHM_OPTION == 4 and self.best_solution is not None:
+                self.solve_exact(self.best_solution)
+        except KeyboardInterrupt:
+            self.context.logger.warning("Execution interrupted, keeping the best solution found so far")
+        self.save_snapshot()
 
 
     def construct(self):
@@ -47,12 +101,21 @@ class Algorithm:
         Construct the solutions
         """
         self.context.logger.info("Constructing solutions...")
+        if self.context.parameters.ALGORITHM_OPTION in (1, 4) and self.context.parameters.N_WORKERS != 1:
+            self.construct_parallel()
+            return
+        if self.context.parameters.ALGORITHM_OPTION == 3:
+            self.solve_exact()
+            return
+        if self.context.parameters.ALGORITHM_OPTION == 5:
+            self.construct_decomposition()
+            return
         start_time = time.time()
         iteration = 0
-        while iteration < self.context.parameters.MAX_ITERATIONS and time.time() - start_time < self.context.parameters.MAX_TIME:
+        while iteration < self.context.parameters.MAX_ITERATIONS and time.time() - start_time < self.context.parameters.MAX_TIME and self.get_remaining_time() > 0:
             start_time_iteration = time.time()
             # Create a new solution
-            if self.context.parameters.ALGORITHM_OPTION == 1:
+            if self.context.parameters.ALGORITHM_OPTION in (1, 4):
                 solution = Solution(self.context, self.instance)
             else:
                 solution = ExactSolution(self.context, self.instance)
@@ -63,15 +126,86 @@ class Algorithm:
             if solution.fitness < self.best_fitness:
                 self.set_best_solution(solution)
             self.context.logger.info(f"Iteration {iteration} - Solution fitness: {solution.fitness}, Time: {time.time() - start_time_iteration:.4f}s")
+            self.flush_snapshot()
             iteration += 1
-        self.context.logger.info(f"Solution fitness: {self.best_solution.fitness}, Total time: {time.time() - start_time:.2f}s")
+        self.context.logger.info(f"Solution fitness: {self.best_fitness}, Total time: {time.time() - start_time:.2f}s")
+        self.context.logger.info(f"Fitness statistics: {self.fitness_statistics}")
+        self.context.logger.info(f"Elite pool: {self.elite_pool}")
+
+
+    def solve_exact(self, initial_solution: Solution = None):
+        """
+        Solve the compact exact model once, within EXACT_TIME_LIMIT and EXACT_GAP
+
+        Args:
+            initial_solution (Solution): Heuristic solution used as MIP start and initial upper bound (hybrid mode)
+        """
+        self.context.logger.info("Solving exact model" + (f" from a solution of fitness {initial_solution.fitness}..." if initial_solution is not None else "..."))
+        start_time = time.time()
+        solution = CompactExactSolution(self.context, self.instance)
+        solution.solve(min(self.context.parameters.EXACT_TIME_LIMIT, self.get_remaining_time()), initial_solution)
+        self.add_solution(solution)
+        if solution.fitness < self.best_fitness:
+            self.set_best_solution(solution)
+        self.context.logger.info(f"Exact solution fitness: {solution.fitness}, Statistics: {solution.statistics}, Timings: {solution.timings}, Total time: {time.time() - start_time:.2f}s")
+
+
+    def construct_decomposition(self):
+        """
+        Construct a solution by decomposition: clusters solved in parallel processes, merged and repaired
+        """
+        start_time = time.time()
+        decomposition = Decomposition(self.context, self.instance)
+        solution = decomposition.solve(self.deadline)
+        self.add_solution(solution)
+        self.set_best_solution(solution)
+        self.context.logger.info(f"Decomposition solution fitness: {solution.fitness}, Unserved: {solution.n_unserved}, Statistics: {decomposition.statistics}, Total time: {time.time() - start_time:.2f}s")
+
+
+    def construct_parallel(self):
+        """
+        Construct the greedy solutions in parallel processes
+        """
+        start_time = time.time()
+        parallel_construction = ParallelConstruction(self.context, self.instance)
+        self.context.logger.info(f"Parallel construction with {parallel_construction.n_workers} workers")
+        for fitness_values, solutions in parallel_construction.construct(self.deadline):
+            for fitness in fitness_values:
+                self.fitness_statistics.add_value(fitness)
+            for solution in solutions:
+                self.elite_pool.add_solution(solution)
+                if solution.fitness < self.best_fitness:
+                    self.set_best_solution(solution)
+            self.flush_snapshot()
+            self.context.logger.info(f"Iterations {self.fitness_statistics.count} - Best fitness: {self.best_fitness}, Time: {time.time() - start_time:.2f}s")
+        self.context.logger.info(f"Solution fitness: {self.best_fitness}, Total time: {time.time() - start_time:.2f}s")
+        self.context.logger.info(f"Fitness statistics: {self.fitness_statistics}")
+        self.context.logger.info(f"Elite pool: {self.elite_pool}")
 
 
     def improve(self):
         """
-        Improve the solutions
+        Improve the elite solutions with local search, sharing LOCAL_SEARCH_TIME between them
         """
         self.context.logger.info("Improving solutions...")
+        solutions = [solution for solution in self.elite_pool.get_solutions() if isinstance(solution, Solution)]
+        time_limit = min(self.context.parameters.LOCAL_SEARCH_TIME, self.get_remaining_time())
+        if not solutions or time_limit <= 0:
+            return
+        start_time = time.time()
+        local_search = LocalSearch(self.context, self.instance)
+        for position, solution in enumerate(solutions):
+            self.flush_snapshot()
+            remaining_time = time_limit - (time.time() - start_time)
+            if remaining_time <= 0:
+                break
+            start_time_solution = time.time()
+            improved_solution = local_search.improve(solution.clone(), remaining_time / (len(solutions) - position))
+            self.elite_pool.add_solution(improved_solution)
+            if improved_solution.fitness < self.best_fitness:
+                self.set_best_solution(improved_solution)
+            self.context.logger.info(f"Local search - Solution fitness: {solution.fitness} -> {improved_solution.fitness}, Time: {time.time() - start_time_solution:.4f}s")
+        self.context.logger.info(f"Solution fitness: {self.best_fitness}, Evaluations: {local_search.evaluations}, Total time: {time.time() - start_time:.2f}s")
 
 
     def print_results(self):
@@ -0,0 +1,283 @@
+from algorithm import Context, Instance, Solution
+from utils import Random, MatrixModel
+from pulp import LpSolutionOptimal, LpSolutionIntegerFeasible
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import dijkstra
+import time
+
+class CompactExactSolution(Solution):
+    """
+    Exact engine on a two-index vehicle-flow formulation:
+        x[i, j]: binary, a vehicle travels the arc (i, j). Only a sparse candidate set of arcs is modelled:
+                 the k nearest neighbours of every customer plus the depot arcs
+        z[j]: binary, node j is served
+        f[i, j]: load of the vehicle on the arc (i, j), which handles the mixed pickup and delivery demand;
+                 the load on the depot arcs is the initial load drawn from the depot stock
+        g[i, j]: distance travelled by the vehicle at the end of the arc (i, j), bounded by MAX_DISTANCE
+    Subtours are forbidden with cuts added iteratively, re-solving until the routes are valid or the time
+    limit (EXACT_TIME_LIMIT) is reached. The distance flow already breaks the subtours of positive length,
+    so cuts are mainly needed for nodes at the same location
+    """
+    __slots__ = ('statistics', 'timings')
+
+    def __init__(self, context: Context, instance: Instance, random: Random = None):
+        super().__init__(context, instance, random)
+        self.statistics = {'rounds': 0, 'subtour_cuts': 0, 'arcs': 0, 'start': None}
+        self.timings = {'build': 0.0, 'write': 0.0, 'solve': 0.0, 'extract': 0.0} # Seconds spent in each stage of solve
+
+
+    def solve(self, time_limit: float = None, initial_solution: Solution = None):
+        """
+        Solve the problem adding subtour cuts until the routes are valid. A heuristic solution can be given
+        as MIP start: its arcs are added to the model and, once checked against the model (see get_feasible_start),
+        its objective is the initial upper bound (cutoff), so branch-and-bound prunes from the beginning.
+        The result is never worse than the initial solution
+
+        Args:
+            time_limit (float): Time limit in seconds, EXACT_TIME_LIMIT by default
+            initial_solution (Solution): Solution used as MIP start
+        """
+        parameters = self.context.parameters
+        deadline = time.time() + (time_limit if time_limit is not None else parameters.EXACT_TIME_LIMIT)
+        start_time = time.perf_counter()
+        initial_routes = [route for route in initial_solution.routes if route] if initial_solution is not None else []
+        nodes, arcs = self.get_candidate_arcs(initial_routes)
+        self.statistics['arcs'] = len(arcs)
+        problem, x, f, g, z = self.build_model(nodes, arcs)
+        initial_values, cutoff = None, None
+        if initial_solution is not None:
+            initial_values = self.get_feasible_start(problem, nodes, arcs, x, f, g, z, initial_routes)
+            if initial_values is not None:
+                cutoff = problem.get_objective(initial_values) - problem.objective_constant + 1e-6
+        self.timings['build'] += time.perf_counter() - start_time
+        routes = []
+        while time.time() < deadline:
+            problem.solve(deadline - time.time(), parameters.EXACT_GAP, initial_values, cutoff)
+            if problem.sol_status not in (LpSolutionOptimal, LpSolutionIntegerFeasible):
+                break
+            self.statistics['rounds'] += 1
+            start_time = time.perf_counter()
+            selected_arcs = [arcs[position] for position in np.flatnonzero(problem.get_values(x) > 0.5).tolist()]
+            routes, subtours = self.get_routes(selected_arcs)
+            self.timings['extract'] += time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            for subtour in subtours:
+                self.add_subtour_cut(problem, x, z, subtour, arcs, nodes)
+            self.timings['build'] += time.perf_counter() - start_time
+            if not subtours:
+                break
+        self.timings['write'] = problem.timings['write']
+        self.timings['solve'] = problem.timings['solve']
+
+        start_time = time.perf_counter()
+        routes = routes[:parameters.n_vehicles]
+        self.set_routes(routes + [[] for _ in range(parameters.n_vehicles - len(routes))])
+        self.evaluate_routes()
+        if initial_solution is not None and initial_solution.fitness < self.fitness:
+            self.set_routes(initial_solution.routes)
+            self.evaluate_routes()
+        self.timings['extract'] += time.perf_counter() - start_time
+
+
+    def get_candidate_arcs(self, initial_routes: list[list[int]] = ()) -> tuple[list[int], list[tuple[int, int]]]:
+        """
+        Sparse arc set: arcs between each customer and its nearest neighbours (both directions) and depot arcs.
+        Nodes that cannot be reached within MAX_DISTANCE and arcs that no feasible route can use are left out.
+        The arcs of the initial routes are always included so that they are a feasible MIP start
+
+        Args:
+            initial_routes (list): Routes of the initial solution
+        Returns:
+            tuple: Modelled customers and arcs
+        """
+        distances = self.instance.distances
+        max_distance = self.context.parameters.MAX_DISTANCE
+        initial_nodes = {node for route in initial_routes for node in route}
+        nodes = [node for node in range(1, len(self.instance.demands)) if int(distances[0, node]) + int(distances[node, 0]) <= max_distance or node in initial_nodes]
+        modelled = set(nodes)
+        arcs = set()
+        for i in nodes:
+            arcs.add((0, i))
+            arcs.add((i, 0))
+            for j in self.instance.neighbours[i].tolist():
+                if j in modelled and int(distances[0, i]) + int(distances[i, j]) + int(distances[j, 0]) <= max_distance:
+                    arcs.add((i, j))
+                    arcs.add((j, i))
+        for route in initial_routes:
+            arcs.update(zip(route[:-1], route[1:]))
+        return nodes, sorted(arcs)
+
+
+    def build_model(self, nodes: list[int], arcs: list[tuple[int, int]]) -> tuple:
+        """
+        Build the two-index model as sparse blocks of constraints
+
+        Returns:
+            tuple: Problem, arc, load, distance and service variables (column indices)
+        """
+        parameters = self.context.parameters
+        distances = self.instance.distances
+        demands = np.asarray(self.instance.demands, dtype=np.float64)
+        initial_stock = parameters.MAX_STOCK * 0.8
+        unserved_cost = self.instance.get_solution_value(0, initial_stock, 1) - self.instance.get_solution_value(0, initial_stock, 0)
+        arcs = np.asarray(arcs, dtype=np.int64).reshape(-1, 2)
+        tails, heads = arcs[:, 0], arcs[:, 1]
+        arc_distances = distances[tails, heads].astype(np.int64).astype(np.float64)
+        # Shortest distances from and to the depot over the modelled arcs. The rounded distances may not satisfy the
+        # triangle inequality, so the direct distances are not valid bounds of the distance flow
+        graph = sp.csr_matrix((arc_distances, (tails, heads)), shape=(len(demands), len(demands)))
+        depot_distances = dijkstra(graph, indices=0)
+        return_distances = dijkstra(graph.T.tocsr(), indices=0)
+        n_arcs, n_nodes = len(arcs), len(nodes)
+        positions = np.full(len(demands), -1, dtype=np.int64) # Position of each modelled node, -1 for the rest
+        positions[nodes] = np.arange(n_nodes)
+        from_depot, to_depot = tails == 0, heads == 0
+
+        # Transport cost plus the penalty of the unserved nodes (the storage cost is constant)
+        problem = MatrixModel('cash_pickup_delivery_compact')
+        x = problem.add_variables(n_arcs, upper_bound=1, integer=True, objective=self.instance.calculate_total_cost(arc_distances))
+        f = problem.add_variables(n_arcs, upper_bound=parameters.VEHICLE_CAPACITY)
+        g = problem.add_variables(n_arcs, upper_bound=parameters.MAX_DISTANCE)
+        z = problem.add_variables(n_nodes, upper_bound=1, integer=True, objective=-unserved_cost)
+        problem.objective_constant = unserved_cost * n_nodes
+
+        # Constraints of each node, in consecutive rows:
+        #   A served node is entered and left once
+        #   Load flow: the load grows by the demand of the node (decreases for deliveries)
+        #   Distance flow: the distance grows by the length of the arc leaving the node
+        inner_tails, inner_heads = np.flatnonzero(~from_depot), np.flatnonzero(~to_depot)
+        out_rows, in_rows, node_rows = 4 * positions[tails[inner_tails]], 4 * positions[heads[inner_heads]], 4 * np.arange(n_nodes)
+        rows = np.concatenate((in_rows, node_rows, out_rows + 1, node_rows + 1, out_rows + 2, in_rows + 2, node_rows + 2, out_rows + 3, in_rows + 3, out_rows + 3))
+        columns = np.concatenate((x[inner_heads], z, x[inner_tails], z, f[inner_tails], f[inner_heads], z, g[inner_tails], g[inner_heads], x[inner_tails]))
+        values = np.concatenate((np.ones(len(inner_heads)), -np.ones(n_nodes), np.ones(len(inner_tails)), -np.ones(n_nodes),
+                                 np.ones(len(inner_tails)), -np.ones(len(inner_heads)), -demands[nodes],
+                                 np.ones(len(inner_tails)), -np.ones(len(inner_heads)), -arc_distances[inner_tails]))
+        problem.add_constraints(rows, columns, values, 'E', np.zeros(4 * n_nodes))
+
+        # Load and distance only on used arcs, within the vehicle capacity and the mileage. A vehicle on the arc (i, j)
+        # has travelled at least the way from the depot and must still return to it.
+        # Load bounds: enough load to serve a delivery node j, the load collected at a pickup node i, and room for both
+        minimum_loads = np.maximum.reduce([np.zeros(n_arcs), -demands[heads], demands[tails]])
+        maximum_loads = parameters.VEHICLE_CAPACITY - np.maximum.reduce([np.zeros(n_arcs), demands[heads], -demands[tails]])
+        arc_rows = 4 * np.arange(n_arcs)
+        rows = np.concatenate((arc_rows, arc_rows, arc_rows + 1, arc_rows + 1, arc_rows + 2, arc_rows + 2, arc_rows + 3, arc_rows + 3))
+        columns = np.concatenate((f, x, f, x, g, x, g, x))
+        values = np.concatenate((np.ones(n_arcs), -minimum_loads, np.ones(n_arcs), -maximum_loads,
+                                 np.ones(n_arcs), -(depot_distances[tails] + arc_distances), np.ones(n_arcs), -(parameters.MAX_DISTANCE - return_distances[heads])))
+        problem.add_constraints(rows, columns, values, np.tile(['G', 'L', 'G', 'L'], n_arcs), np.zeros(4 * n_arcs))
+        depot_arcs = np.flatnonzero(from_depot)
+        problem.add_constraints(np.tile(np.arange(len(depot_arcs)), 2), np.concatenate((g[depot_arcs], x[depot_arcs])), np.concatenate((np.ones(len(depot_arcs)), -arc_distances[depot_arcs])), 'E', np.zeros(len(depot_arcs)))
+
+        # Two-cycles between customers
+        keys = tails * len(demands) + heads
+        reverse = np.searchsorted(keys, heads * len(demands) + tails)
+        pairs = np.flatnonzero((0 < tails) & (tails < heads) & (reverse < n_arcs))
+        pairs = pairs[keys[reverse[pairs]] == heads[pairs] * len(demands) + tails[pairs]]
+        rows = np.tile(np.arange(len(pairs)), 3)
+        for endpoints in (tails, heads):
+            problem.add_constraints(rows, np.concatenate((x[pairs], x[reverse[pairs]], z[positions[endpoints[pairs]]])), np.repeat([1, 1, -1], len(pairs)), 'L', np.zeros(len(pairs)))
+
+        # Fleet size and depot stock drawn as initial loads
+        problem.add_constraints(np.zeros(len(depot_arcs)), x[depot_arcs], 1, 'L', parameters.n_vehicles)
+        problem.add_constraints(np.zeros(len(depot_arcs)), f[depot_arcs], 1, 'L', initial_stock)
+        return problem, x, f, g, z
+
+
+    def get_feasible_start(self, problem: MatrixModel, nodes: list[int], arcs: list[tuple[int, int]], x: np.ndarray, f: np.ndarray,
+                           g: np.ndarray, z: np.ndarray, initial_routes: list[list[int]]) -> np.ndarray:
+        """
+        MIP start of the initial routes, checked against the model. The heuristic does not enforce every bound of the
+        model (load per arc, mileage, depot stock), and an infeasible start would be rejected by CBC while its objective
+        still pruned the search as cutoff. Such a start is discarded. Repairing it, leaving out the violating routes,
+        was tried: the partial start, with or without its cutoff, led CBC to worse solutions than no start at all
+
+        Returns:
+            np.ndarray: Value of every variable of the model, None if the start is infeasible (no start and no cutoff)
+        """
+        initial_values = self.get_initial_values(problem, nodes, arcs, x, f, g, z, initial_routes)
+        violated_variables, violated_constraints = problem.get_violations(initial_values)
+        if len(violated_variables) == 0 and len(violated_constraints) == 0:
+            self.statistics['start'] = 'initial'
+            return initial_values
+        self.statistics['start'] = 'discarded'
+        self.context.logger.warning(f"MIP start discarded: the initial solution violates {len(violated_variables)} bounds and {len(violated_constraints)} constraints "
+                                    f"of the model, solving without start nor cutoff")
+        return None
+
+
+    def get_initial_values(self, problem: MatrixModel, nodes: list[int], arcs: list[tuple[int, int]], x: np.ndarray, f: np.ndarray,
+                           g: np.ndarray, z: np.ndarray, initial_routes: list[list[int]]) -> np.ndarray:
+        """
+        Variable values of the initial routes: arcs used, load on each arc (initial load plus the demand collected so far)
+        and distance travelled at the end of each arc
+
+        Returns:
+            np.ndarray: Value of every variable of the model
+        """
+        distances = self.instance.distances
+        demands = np.asarray(self.instance.demands, dtype=np.int64)
+        arc_positions = {arc: position for position, arc in enumerate(arcs)}
+        values = np.zeros(problem.n_variables)
+        for route in initial_routes:
+            path = [0] + route + [0]
+            loads = np.cumsum(demands[path])
+            loads += max(0, -int(loads.min()))
+            travelled = np.cumsum(distances[path[:-1], path[1:]].astype(np.int64))
+            for position, arc in enumerate(zip(path[:-1], path[1:])):
+                arc_position = arc_positions[arc]
+                values[x[arc_position]] = 1
+                values[f[arc_position]] = loads[position]
+                values[g[arc_position]] = travelled[position]
+        values[z[np.searchsorted(nodes, [node for route in initial_routes for node in route])]] = 1
+        return values
+
+
+    def get_routes(self, selected_arcs: list[tuple[int, int]]) -> tuple[list[list[int]], list[list[int]]]:
+        """
+        Split the selected arcs into routes from the depot and subtours
+
+        Returns:
+            tuple: Routes and subtours
+        """
+        successors = {}
+        first_nodes = []
+        for i, j in selected_arcs:
+            if i == 0:
+                first_nodes.append(j)
+            else:
+                successors[i] = j
+
+        routes = []
+        visited = set()
+        for node in first_nodes:
+            route = []
+            while node != 0 and node not in visited:
+                visited.add(node)
+                route.append(node)
+                node = successors.get(node, 0)
+            routes.append(route)
+
+        subtours = []
+        for node in successors:
+            if node in visited:
+                continue
+            subtour = []
+            while node in successors and node not in visited:
+                visited.add(node)
+                subtour.append(node)
+                node = successors[node]
+            subtours.append(subtour)
+        return routes, subtours
+
+
+    def add_subtour_cut(self, problem: MatrixModel, x: np.ndarray, z: np.ndarray, subtour: list[int], arcs: list[tuple[int, int]], nodes: list[int]):
+        """
+        Generalized subtour elimination for optional nodes: sum(x[i, j] for i, j in S) <= sum(z[i] for i in S) - z[k]
+        """
+        subtour_nodes = set(subtour)
+        inner_arcs = [position for position, arc in enumerate(arcs) if arc[0] in subtour_nodes and arc[1] in subtour_nodes]
+        positions = np.searchsorted(nodes, subtour[1:])
+        problem.add_constraints(np.zeros(len(inner_arcs) + len(positions)), np.concatenate((x[inner_arcs], z[positions])),
+                                np.concatenate((np.ones(len(inner_arcs)), -np.ones(len(positions)))), 'L', 0)
+        self.statistics['subtour_cuts'] += 1
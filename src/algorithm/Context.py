@@ -9,6 +9,17 @@ class Context:
         self.logger = self.initialize_logger()
 
 
+    @classmethod
+    def from_parameters(cls, parameters: Parameters, output_folder: str = None) -> 'Context':
+        """ Context for worker processes: it neither creates the execution folder nor opens the log file
+        """
+        context = cls.__new__(cls)
+        context.parameters = parameters
+        context.output_folder = output_folder
+        context.logger = None
+        return context
+
+
     def create_execution_folder(self):
         """ Creates a directory to store execution data
         """
@@ -0,0 +1,185 @@
+from algorithm import Context, Instance, Solution, Parameters, LocalSearch
+from algorithm.ParallelConstruction import get_iteration_seed
+from utils import Random
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from sklearn.cluster import KMeans
+import numpy as np
+import copy
+import math
+import time
+import os
+
+# State of each worker process, set once by initialize_worker
+worker_state = {}
+
+
+def initialize_worker(parameters: Parameters, shared_memory_name: str, shape: tuple, dtype: str, demands: list[int]):
+    """
+    Attach the worker to the shared distances matrix of the full instance
+    """
+    distances_memory = shared_memory.SharedMemory(name=shared_memory_name)
+    worker_state['distances_memory'] = distances_memory
+    worker_state['distances'] = np.ndarray(shape, dtype=dtype, buffer=distances_memory.buf)
+    worker_state['demands'] = np.asarray(demands, dtype=np.int64)
+    worker_state['parameters'] = parameters
+
+
+def solve_cluster(nodes: list[int], n_vehicles: int, max_stock: float, time_limit: float, seed: int) -> tuple[list[list[int]], float, int]:
+    """
+    Solve the sub-problem of a cluster in a worker process: greedy constructions during half of the time limit
+    and local search on the best one during the rest
+
+    Args:
+        nodes (list): Nodes of the cluster in the full instance (depot excluded)
+        n_vehicles (int): Vehicles assigned to the cluster
+        max_stock (float): MAX_STOCK of the sub-problem, so that its initial stock is the share of the cluster
+        time_limit (float): Time limit in seconds
+        seed (int): Seed of the constructions
+    Returns:
+        tuple: Routes (nodes of the full instance), fitness of the sub-problem and number of constructions
+    """
+    deadline = time.time() + time_limit
+    parameters = copy.copy(worker_state['parameters'])
+    parameters.n_vehicles = n_vehicles
+    parameters.MAX_STOCK = max_stock
+    context = Context.from_parameters(parameters)
+    path = np.array([0] + list(nodes), dtype=np.int64)
+    instance = Instance.from_arrays(context, list(range(len(path))), worker_state['demands'][path].tolist(), worker_state['distances'][np.ix_(path, path)], seed)
+
+    best_solution = None
+    iteration = 0
+    while iteration < parameters.MAX_ITERATIONS and (iteration == 0 or time.time() < deadline - time_limit / 2):
+        solution = Solution(context, instance, Random(get_iteration_seed(seed, iteration)))
+        solution.solve()
+        if best_solution is None or solution.fitness < best_solution.fitness:
+            best_solution = solution
+        iteration += 1
+    best_solution = LocalSearch(context, instance).improve(best_solution, max(0, deadline - time.time()))
+    routes = [path[route].tolist() for route in best_solution.routes if route]
+    return routes, best_solution.fitness, iteration
+
+
+class Decomposition:
+    def __init__(self, context: Context, instance: Instance):
+        self.context = context
+        self.instance = instance
+        self.n_workers = self.context.parameters.N_WORKERS if self.context.parameters.N_WORKERS > 0 else os.cpu_count()
+        self.statistics = {'clusters': 0, 'cluster_time': 0.0, 'repair_time': 0.0, 'unserved_before_repair': 0}
+
+
+    def get_clusters(self) -> list[np.ndarray]:
+        """
+        Split the customers into clusters of about DECOMPOSITION_CLUSTER_SIZE nodes with DECOMPOSITION_METHOD:
+            kmeans: k-means on the coordinates
+            sweep: angular sectors around the depot
+            province: one cluster per province
+
+        Returns:
+            list: Nodes of each cluster
+        """
+        method = self.context.parameters.DECOMPOSITION_METHOD
+        customers = np.arange(1, len(self.instance.nodes_ids))
+        n_clusters = max(1, min(len(customers), math.ceil(len(customers) / self.context.parameters.DECOMPOSITION_CLUSTER_SIZE)))
+        latitudes = self.instance.latitudes
+        longitudes = self.instance.longitudes
+        # Equirectangular projection around the depot, so that both axes are in comparable units
+        x = (longitudes[customers] - longitudes[0]) * np.cos(np.radians(latitudes[0]))
+        y = latitudes[customers] - latitudes[0]
+
+        if method == 'kmeans':
+            labels = KMeans(n_clusters=n_clusters, n_init=3, random_state=self.context.parameters.seed).fit_predict(np.column_stack((x, y)))
+            clusters = [customers[labels == label] for label in range(n_clusters)]
+        elif method == 'sweep':
+            # Start the sweep at the widest angular gap, so that no sector is split across it
+            angles = np.arctan2(y, x)
+            order = np.argsort(angles)
+            gaps = np.diff(np.concatenate((angles[order], [angles[order[0]] + 2 * np.pi])))
+            order = np.roll(order, -(int(np.argmax(gaps)) + 1))
+            clusters = [customers[sector] for sector in np.array_split(order, n_clusters)]
+        elif method == 'province':
+            provinces = self.instance.nodes_df['Province'].to_numpy()[customers]
+            clusters = [customers[provinces == province] for province in np.unique(provinces)]
+        else:
+            raise ValueError(f"Unknown decomposition method: {method}")
+        return [cluster for cluster in clusters if len(cluster) > 0]
+
+
+    def get_shares(self, clusters: list[np.ndarray]) -> tuple[list[int], list[float]]:
+        """
+        Share the fleet in proportion to the nodes of each cluster (largest remainders, at least one vehicle per cluster
+        when there are enough) and the depot stock in proportion to the deliveries of each cluster
+
+        Args:
+            clusters (list): Nodes of each cluster
+        Returns:
+            tuple: Vehicles and initial stock of each cluster
+        """
+        n_vehicles = self.context.parameters.n_vehicles
+        sizes = np.array([len(cluster) for cluster in clusters], dtype=np.float64)
+        quotas = sizes / sizes.sum() * n_vehicles
+        vehicles = np.floor(quotas).astype(int)
+        if len(clusters) <= n_vehicles:
+            vehicles = np.maximum(1, vehicles)
+        while vehicles.sum() > n_vehicles:
+            vehicles[np.argmax(np.where(vehicles > 1, vehicles - quotas, -np.inf))] -= 1
+        for cluster in np.argsort(-(quotas - vehicles)):
+            if vehicles.sum() >= n_vehicles:
+                break
+            vehicles[cluster] += 1
+
+        demands = np.asarray(self.instance.demands, dtype=np.float64)
+        deliveries = np.array([-demands[cluster][demands[cluster] < 0].sum() for cluster in clusters])
+        initial_stock = self.context.parameters.MAX_STOCK * 0.8
+        stocks = deliveries / deliveries.sum() * initial_stock if deliveries.sum() > 0 else np.full(len(clusters), initial_stock / len(clusters))
+        return vehicles.tolist(), stocks.tolist()
+
+
+    def solve(self, deadline: float = None) -> Solution:
+        """
+        Solve the clusters in parallel processes, merge their routes into one solution of the full instance and
+        repair it with local search, which inserts the unserved nodes and improves the routes across clusters.
+        The clusters take 60% of the time (MAX_TIME or the deadline) and the repair the rest
+
+        Args:
+            deadline (float): Time (time.time()) at which the decomposition stops, besides MAX_TIME
+        Returns:
+            Solution: Merged solution
+        """
+        parameters = self.context.parameters
+        start_time = time.time()
+        deadline = min(start_time + parameters.MAX_TIME, deadline if deadline is not None else math.inf)
+        clusters = self.get_clusters()
+        vehicles, stocks = self.get_shares(clusters)
+        self.statistics['clusters'] = len(clusters)
+        # Clusters that do not get a vehicle (more clusters than vehicles) are left to the repair
+        tasks = [(cluster, n_vehicles, stock) for cluster, n_vehicles, stock in zip(clusters, vehicles, stocks) if n_vehicles > 0]
+        n_rounds = math.ceil(len(tasks) / min(self.n_workers, len(tasks)))
+        cluster_time = 0.6 * (deadline - time.time()) / n_rounds
+
+        distances = np.ascontiguousarray(self.instance.distances)
+        distances_memory = shared_memory.SharedMemory(create=True, size=max(1, distances.nbytes))
+        try:
+            np.ndarray(distances.shape, dtype=distances.dtype, buffer=distances_memory.buf)[:] = distances
+            initializer_arguments = (parameters, distances_memory.name, distances.shape, distances.dtype.str, list(self.instance.demands))
+            with ProcessPoolExecutor(max_workers=min(self.n_workers, len(tasks)), initializer=initialize_worker, initargs=initializer_arguments) as executor:
+                futures = [executor.submit(solve_cluster, cluster.tolist(), n_vehicles, stock / 0.8, cluster_time, get_iteration_seed(parameters.seed, position))
+                           for position, (cluster, n_vehicles, stock) in enumerate(tasks)]
+                routes = []
+                for future in futures:
+                    cluster_routes, _, _ = future.result()
+                    routes += cluster_routes
+        finally:
+            distances_memory.close()
+            distances_memory.unlink()
+        self.statistics['cluster_time'] = time.time() - start_time
+
+        # Merge and repair
+        start_time = time.time()
+        solution = Solution(self.context, self.instance)
+        solution.set_routes(routes + [[] for _ in range(parameters.n_vehicles - len(routes))])
+        solution.evaluate_routes()
+        self.statistics['unserved_before_repair'] = solution.n_unserved
+        solution = LocalSearch(self.context, self.instance).improve(solution, max(0, deadline - time.time()))
+        self.statistics['repair_time'] = time.time() - start_time
+        return solution
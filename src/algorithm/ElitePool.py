@@ -0,0 +1,108 @@
+from algorithm import Context, Solution
+import numpy as np
+
+class ElitePool:
+    def __init__(self, context: Context, max_size: int, min_diversity: float):
+        self.context = context
+        self.max_size = max_size
+        self.min_diversity = min_diversity
+        self.solutions = [] # Sorted by fitness, best first
+        self.solutions_edges = []
+
+
+    def add_solution(self, solution: Solution) -> bool:
+        """
+        Try to add a solution to the pool. A solution too similar to an elite one only replaces it
+        if it is better; otherwise, when the pool is full, the worst elite solution is evicted.
+
+        Args:
+            solution (Solution): Candidate solution
+        Returns:
+            bool: True if the solution entered the pool
+        """
+        if len(self.solutions) >= self.max_size and solution.fitness >= self.solutions[-1].fitness:
+            return False
+
+        edges = self.get_solution_edges(solution)
+        for position, elite_edges in enumerate(self.solutions_edges):
+            if self.calculate_distance(edges, elite_edges) < self.min_diversity:
+                if solution.fitness >= self.solutions[position].fitness:
+                    return False
+                self.remove_position(position)
+                break
+
+        if len(self.solutions) >= self.max_size:
+            self.remove_position(len(self.solutions) - 1)
+
+        position = 0
+        while position < len(self.solutions) and self.solutions[position].fitness <= solution.fitness:
+            position += 1
+        self.solutions.insert(position, solution)
+        self.solutions_edges.insert(position, edges)
+        return True
+
+
+    def remove_position(self, position: int):
+        """
+        Remove the elite solution in the given position
+
+        Args:
+            position (int): Position in the pool
+        """
+        del self.solutions[position]
+        del self.solutions_edges[position]
+
+
+    def get_solution_edges(self, solution: Solution) -> np.ndarray:
+        """
+        Sorted codes of the undirected edges used by the solution, depot legs included
+
+        Args:
+            solution (Solution): Solution
+        Returns:
+            np.ndarray: Edge codes
+        """
+        edges = []
+        for route in solution.routes:
+            if len(route) == 0:
+                continue
+            path = np.concatenate(([0], route, [0])).astype(np.int64)
+            edges.append((np.minimum(path[:-1], path[1:]) << 32) + np.maximum(path[:-1], path[1:]))
+        if not edges:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(edges))
+
+
+    def calculate_distance(self, edges_1: np.ndarray, edges_2: np.ndarray) -> float:
+        """
+        Broken-pairs distance between two solutions: share of edges not in common
+
+        Returns:
+            float: Distance in [0, 1]
+        """
+        size = max(len(edges_1), len(edges_2))
+        if size == 0:
+            return 0.0
+        return 1 - len(np.intersect1d(edges_1, edges_2, assume_unique=True)) / size
+
+
+    def get_best_solution(self) -> Solution:
+        """
+        Best solution of the pool
+        """
+        return self.solutions[0] if self.solutions else None
+
+
+    def get_solutions(self) -> list[Solution]:
+        """
+        Elite solutions sorted by fitness, best first
+        """
+        return list(self.solutions)
+
+
+    def __len__(self) -> int:
+        return len(self.solutions)
+
+
+    def __str__(self) -> str:
+        return f"ElitePool(size={len(self.solutions)}/{self.max_size}, fitness={[solution.fitness for solution in self.solutions]})"
@@ -1,9 +1,13 @@
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpBinary, LpContinuous
+from utils import MatrixModel
+from pulp import LpSolutionOptimal, LpSolutionIntegerFeasible
+import numpy as np
+import time
 
 class ExactSolution:
     def __init__(self, context, instance):
         self.context = context
         self.instance = instance
+        self.timings = {'build': 0.0, 'write': 0.0, 'solve': 0.0, 'extract': 0.0} # Seconds spent in each stage of solve
         self.initialize_solution()
 
 
@@ -21,9 +25,9 @@ class ExactSolution:
 
     def solve(self):
         # Include the depot
-        nodes = self.instance.nodes_df['Id'].astype(int).to_list()
+        nodes = list(self.instance.nodes_ids)
         distances = self.instance.distances
-        demands = self.instance.nodes_df['Items'].astype(int).to_list()
+        demands = list(self.instance.demands)
         n_vehicles = self.context.parameters.n_vehicles
         vehicle_capacity = self.context.parameters.VEHICLE_CAPACITY
         n_nodes = len(nodes)
@@ -32,68 +36,78 @@ class ExactSolution:
         k2 = 100
         penalty_cost = 1000000
 
-        # Set up the problem
-        problem = LpProblem('cash_pickup_delivery', LpMinimize)
+        # Set up the problem. Variables are column ranges and constraints blocks of sparse coefficients
+        start_time = time.perf_counter()
+        problem = MatrixModel('cash_pickup_delivery')
+        distance_matrix = np.asarray(distances, dtype=np.float64)
+        demands_array = np.asarray(demands, dtype=np.float64)
+        customers = np.arange(1, n_nodes)
+        vehicles = np.arange(n_vehicles)
 
         # Decision variables
-        x = LpVariable.dicts("x", ((i, j, k) for i in range(n_nodes)
-                                            for j in range(n_nodes)
-                                            for k in range(n_vehicles)),
-                            cat=LpBinary) # 1 if vehicle k travels from node i to node j, 0 otherwise
-        y = LpVariable.dicts("y", (k for k in range(n_vehicles)), cat=LpBinary) # 1 if vehicle k is used, 0 otherwise
-        u = LpVariable.dicts("u", (j for j in range(1, n_nodes)), lowBound=0, upBound=vehicle_capacity, cat=LpContinuous) # Amount of demand delivered to node j
-        z = LpVariable.dicts("z", (j for j in range(1, n_nodes)), cat=LpBinary) # 1 if node j is visited, 0 otherwise
+        # x[i, j, k] (column x[(i * n_nodes + j) * n_vehicles + k]): 1 if vehicle k travels from node i to node j, 0 otherwise
+        x = problem.add_variables(n_nodes * n_nodes * n_vehicles, upper_bound=1, integer=True, objective=np.repeat(distance_matrix.ravel(), n_vehicles))
+        y = problem.add_variables(n_vehicles, upper_bound=1, integer=True) # 1 if vehicle k is used, 0 otherwise
+        u = problem.add_variables(n_nodes - 1, upper_bound=vehicle_capacity) # Amount of demand delivered to node j
+        z = problem.add_variables(n_nodes - 1, upper_bound=1, integer=True, objective=-penalty_cost) # 1 if node j is visited, 0 otherwise
+        x_index = lambda i, j, k: (i * n_nodes + j) * n_vehicles + k
 
         # Objective function: Minimize total distance, storage cost, and maximize served nodes
-        problem += (
-            lpSum(distances[i][j] * x[i, j, k] for i in range(n_nodes) for j in range(n_nodes) for k in range(n_vehicles)) +
-            (k1 if self.current_stock <= max_stock else k2 * (self.current_stock - max_stock)) -
-            penalty_cost * lpSum(z[j] for j in range(1, n_nodes))
-        )
+        problem.objective_constant = k1 if self.current_stock <= max_stock else k2 * (self.current_stock - max_stock)
 
         # Constraints
         # Each node (except the depot) must be visited exactly once
-        for j in range(1, n_nodes):
-            problem += lpSum(x[i, j, k] for i in range(n_nodes) for k in range(n_vehicles)) == 1
+        i, j, k = np.meshgrid(np.arange(n_nodes), customers, vehicles, indexing='ij')
+        problem.add_constraints(j.ravel() - 1, x[x_index(i, j, k).ravel()], 1, 'E', np.ones(n_nodes - 1))
 
         # Each vehicle must start and end at the depot
-        for k in range(n_vehicles):
-            problem += lpSum(x[0, j, k] for j in range(1, n_nodes)) == 1
-            problem += lpSum(x[j, 0, k] for j in range(1, n_nodes)) == 1
-
-            # Capacity constraint: Ensure vehicle capacity is not exceeded
-            problem += lpSum(demands[j] * x[i, j, k] for i in range(n_nodes) for j in range(1, n_nodes)) <= vehicle_capacity * y[k]
-
-            # Mileage constraint: Ensure vehicle mileage is not exceeded
-            problem += lpSum(distances[i][j] * x[i, j, k] for i in range(n_nodes) for j in range(1, n_nodes)) <= self.context.parameters.MAX_DISTANCE * y[k]
+        j, k = np.meshgrid(customers, vehicles, indexing='ij')
+        problem.add_constraints(k.ravel(), x[x_index(0, j, k).ravel()], 1, 'E', np.ones(n_vehicles))
+        problem.add_constraints(k.ravel(), x[x_index(j, 0, k).ravel()], 1, 'E', np.ones(n_vehicles))
+
+        # Capacity constraint: Ensure vehicle capacity is not exceeded
+        # Mileage constraint: Ensure vehicle mileage is not exceeded
+        i, j, k = np.meshgrid(np.arange(n_nodes), customers, vehicles, indexing='ij')
+        rows = np.concatenate((k.ravel(), vehicles))
+        columns = np.concatenate((x[x_index(i, j, k).ravel()], y))
+        problem.add_constraints(rows, columns, np.concatenate((demands_array[j].ravel(), np.full(n_vehicles, -vehicle_capacity))), 'L', np.zeros(n_vehicles))
+        problem.add_constraints(rows, columns, np.concatenate((distance_matrix[i, j].ravel(), np.full(n_vehicles, -self.context.parameters.MAX_DISTANCE))), 'L', np.zeros(n_vehicles))
 
         # Flow conservation: If a vehicle enters a node, it must leave it
-        for k in range(n_vehicles):
-            for i in range(n_nodes):
-                problem += lpSum(x[i, j, k] for j in range(n_nodes)) == lpSum(x[j, i, k] for j in range(n_nodes))
-
-        # Eliminate subtours MTZ
-        for k in range(n_vehicles):
-            for i in range(1, n_nodes):
-                for j in range(1, n_nodes):
-                    if i != j:
-                        problem += u[j] >= u[i] + demands[j] * x[i, j, k] - vehicle_capacity * (1 - x[i, j, k])
+        i, j, k = np.meshgrid(np.arange(n_nodes), np.arange(n_nodes), vehicles, indexing='ij')
+        loops = (i != j).ravel()
+        flow_rows = (k * n_nodes + i).ravel()[loops]
+        problem.add_constraints(np.concatenate((flow_rows, flow_rows)), np.concatenate((x[x_index(i, j, k).ravel()[loops]], x[x_index(j, i, k).ravel()[loops]])),
+                                np.concatenate((np.ones(len(flow_rows)), -np.ones(len(flow_rows)))), 'E', np.zeros(n_vehicles * n_nodes))
+
+        # Eliminate subtours MTZ: u[j] - u[i] - (demands[j] + vehicle_capacity) * x[i, j, k] >= -vehicle_capacity
+        k, i, j = np.meshgrid(vehicles, customers, customers, indexing='ij')
+        pairs = (i != j).ravel()
+        k, i, j = k.ravel()[pairs], i.ravel()[pairs], j.ravel()[pairs]
+        n_rows = len(k)
+        rows = np.tile(np.arange(n_rows), 3)
+        columns = np.concatenate((u[j - 1], u[i - 1], x[x_index(i, j, k)]))
+        values = np.concatenate((np.ones(n_rows), -np.ones(n_rows), -(demands_array[j] + vehicle_capacity)))
+        problem.add_constraints(rows, columns, values, 'G', np.full(n_rows, -vehicle_capacity))
+        self.timings['build'] = time.perf_counter() - start_time
 
         # Solve the problem
-        status = problem.solve()
+        status = problem.solve(self.context.parameters.EXACT_TIME_LIMIT, self.context.parameters.EXACT_GAP)
+        self.timings['write'] = problem.timings['write']
+        self.timings['solve'] = problem.timings['solve']
 
         # Check solution status
-        if status != 1:
+        if status not in (LpSolutionOptimal, LpSolutionIntegerFeasible):
             print("Problem not solved successfully. Status:", status)
             return None
 
         # Extract routes
+        start_time = time.perf_counter()
+        x_values = problem.get_values(x).reshape(n_nodes, n_nodes, n_vehicles)
         self.routes = [[] for _ in range(n_vehicles)]
         for k in range(n_vehicles):
-            for i in range(n_nodes):
-                for j in range(n_nodes):
-                    if x[i, j, k].varValue > 0.5:
-                        self.routes[k].append(nodes[j])
+            for i, j in np.argwhere(x_values[:, :, k] > 0.5).tolist():
+                self.routes[k].append(nodes[j])
 
         # Determine unserved nodes
         served_nodes = {node for route in self.routes for node in route}
@@ -114,6 +128,8 @@ class ExactSolution:
         )
         self.storage_cost = self.instance.calculate_storage_cost(self.current_stock)
         self.fitness = self.instance.get_solution_value(self.total_distance, self.current_stock, len(self.unserved))
+        self.timings['extract'] = time.perf_counter() - start_time
+        self.context.logger.info(f"Exact model: {problem.n_variables} variables, {problem.n_constraints} constraints, Timings: " + ', '.join(f"{stage} {seconds:.4f}s" for stage, seconds in self.timings.items()))
 
         self.print_solution()
 
@@ -0,0 +1,97 @@
+from algorithm import Context, Instance
+import numpy as np
+
+class FeasibilityIndex:
+    def __init__(self, context: Context, instance: Instance):
+        self.context = context
+        self.instance = instance
+        self.distances = instance.distances
+        self.demands = np.asarray(instance.demands, dtype=np.int64)
+        self.max_demand = int(self.demands.max())
+        # On small instances a full scan costs as many NumPy calls as a neighbour lookup
+        self.use_neighbours = len(self.demands) > 8 * instance.neighbours.shape[1]
+        self.return_distances = np.asarray(instance.distances[:, 0], dtype=np.int64) # Distance from each node back to the depot
+        self.unserved = np.ones(len(self.demands), dtype=bool)
+        self.unserved[0] = False # Depot
+        self.reachable = self.unserved.copy()
+
+
+    def start_vehicle(self):
+        """
+        Reset the reachable candidates when a new vehicle starts its route from the depot
+        """
+        self.reachable = self.unserved.copy()
+
+
+    def remove_node(self, node: int):
+        """
+        Mark a node as served
+
+        Args:
+            node (int): Node served
+        """
+        self.unserved[node] = False
+        self.reachable[node] = False
+
+
+    def find_feasible_nodes(self, previous_node: int, current_distance: int, current_capacity: int, current_stock: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the feasible nodes for the current vehicle. Ensuring capacity, mileage, and stock constraints.
+
+        Only the reachable candidates of the vehicle are evaluated. A node that breaks the mileage
+        constraint can never become feasible again for the same vehicle (triangle inequality), so it
+        is dropped from the reachable mask. The slack of one meter per remaining candidate covers the
+        truncation of the integer distances.
+
+        Args:
+            previous_node (int): Previous node
+            current_distance (int): Distance travelled by the vehicle
+            current_capacity (int): Current load of the vehicle
+            current_stock (float): Current depot stock
+        Returns:
+            tuple: Candidate nodes and their distances from previous_node
+        """
+        candidates = np.flatnonzero(self.reachable)
+        distances = self.distances[previous_node, candidates]
+        route_distances = current_distance + distances.astype(np.int64) + self.return_distances[candidates]
+        max_distance = self.context.parameters.MAX_DISTANCE
+        self.reachable[candidates[route_distances > max_distance + len(candidates)]] = False
+
+        # Check capacity constraint. Delivery nodes also need enough stock at the depot
+        demands = self.demands[candidates]
+        values_to_add = current_capacity + demands
+        feasible = (route_distances <= max_distance) & (values_to_add <= self.context.parameters.VEHICLE_CAPACITY)
+        feasible &= (demands >= 0) | (values_to_add <= current_stock)
+        return candidates[feasible], distances[feasible]
+
+
+    def find_nearest_feasible_nodes(self, previous_node: int, current_distance: int, current_capacity: int, current_stock: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the feasible nodes among the k nearest neighbours of previous_node, in O(k).
+
+        Every node outside the neighbour list is at least as far as the last neighbour, so when a
+        feasible neighbour is strictly closer than it, the nearest feasible nodes are all in the list.
+        Otherwise the full scan of find_feasible_nodes is needed and None is returned.
+
+        Args:
+            previous_node (int): Previous node
+            current_distance (int): Distance travelled by the vehicle
+            current_capacity (int): Current load of the vehicle
+            current_stock (float): Current depot stock
+        Returns:
+            tuple: Candidate nodes (sorted by id) and their distances from previous_node, or None
+        """
+        if not self.use_neighbours:
+            return None
+        neighbours = self.instance.neighbours[previous_node]
+        candidates = neighbours[self.reachable[neighbours]]
+        distances = self.distances[previous_node, candidates]
+        route_distances = current_distance + distances.astype(np.int64) + self.return_distances[candidates]
+        demands = self.demands[candidates]
+        values_to_add = current_capacity + demands
+        feasible = (route_distances <= self.context.parameters.MAX_DISTANCE) & (values_to_add <= self.context.parameters.VEHICLE_CAPACITY)
+        feasible &= (demands >= 0) | (values_to_add <= current_stock)
+        if not feasible.any() or distances[feasible].min() >= self.distances[previous_node, neighbours[-1]]:
+            return None
+        order = np.argsort(candidates[feasible])
+        return candidates[feasible][order], distances[feasible][order]
@@ -1,34 +1,176 @@
-from algorithm import Context
+from algorithm import Context, MatrixCache
 from utils import Random, IO, Geo
 import numpy as np
+import os
+
+# Solver columns of the nodes file
+NODES_DTYPES = {'Id': 'int64', 'Items': 'int64', 'Latitude': 'float64', 'Longitude': 'float64'}
 
 class Instance:
-    def __init__(self, context: Context):
+    def __init__(self, context: Context, nodes_file_name: str = 'nodes'):
         self.random = Random()
         self.IO = IO()
         self.Geo = Geo()
         self.context = context
-        self.nodes_df = self.IO.read_csv(self.context.parameters.input_file_path + '/nodes.csv', separator=';', decimal=',', encoding='latin-1')
-        self.depot_df = self.nodes_df[self.nodes_df['Id'] == 0]
-        self.demands = self.load_demands()
-        self.nodes_ids = self.load_nodes_ids()
-        self.distances = self.load_distances()
+        self.matrix_cache = MatrixCache(context)
+        self.nodes_file_path = self.get_nodes_file_path(nodes_file_name)
+        self.arrays_file_path = self.context.parameters.input_file_path + '/' + nodes_file_name + '.npz'
+        self._nodes_df = None
+        # Only the solver columns are parsed here, the descriptive ones are loaded with nodes_df when needed
+        nodes_columns = self.read_nodes_columns()
+        self.latitudes = nodes_columns['Latitude']
+        self.longitudes = nodes_columns['Longitude']
+        self.demands = self.load_demands(nodes_columns)
+        self.nodes_ids = self.load_nodes_ids(nodes_columns)
+        if not self.load_arrays(self.arrays_file_path):
+            self.distances = self.load_distances()
+            self.load_neighbours(self.context.parameters.N_NEIGHBOURS)
         self.validate()
 
 
-    def load_demands(self):
+    @classmethod
+    def from_arrays(cls, context: Context, nodes_ids: list[int], demands: list[int], distances: np.ndarray, seed: int = None) -> 'Instance':
+        """
+        Lightweight instance built from the solver arrays only (no nodes file, no node descriptions).
+        Used by worker processes and sub-problems
+
+        Args:
+            context (Context): Context
+            nodes_ids (list): Nodes ids, the depot first
+            demands (list): Demand of each node
+            distances (np.ndarray): Distances matrix
+            seed (int): Seed of the random generator of the instance
+        Returns:
+            Instance: Instance
+        """
+        instance = cls.__new__(cls)
+        instance.random = Random(seed)
+        instance.IO = IO()
+        instance.Geo = Geo()
+        instance.context = context
+        instance.matrix_cache = None
+        instance.nodes_file_path = None
+        instance._nodes_df = None
+        instance.latitudes = None
+        instance.longitudes = None
+        instance.demands = list(demands)
+        instance.nodes_ids = list(nodes_ids)
+        instance.distances = distances
+        instance.load_neighbours(context.parameters.N_NEIGHBOURS)
+        return instance
+
+
+    @property
+    def nodes_df(self):
+        """
+        All the columns of the nodes file, read on first access (Results, Map). None for instances built from arrays
+        """
+        if self._nodes_df is None and self.nodes_file_path is not None:
+            if self.nodes_file_path.endswith('.parquet'):
+                self._nodes_df = self.IO.read_parquet(self.nodes_file_path)
+            else:
+                self._nodes_df = self.IO.read_csv(self.nodes_file_path, separator=';', decimal=',', encoding='latin-1')
+        return self._nodes_df
+
+
+    @property
+    def depot_df(self):
+        """
+        Row of the depot in the nodes file
+        """
+        nodes_df = self.nodes_df
+        return nodes_df[nodes_df['Id'] == 0] if nodes_df is not None else None
+
+
+    def get_nodes_file_path(self, nodes_file_name: str) -> str:
+        """
+        Path to the nodes file: the Parquet file written by convert_instance.py when it is at least as recent
+        as the CSV file, the CSV file otherwise
+
+        Args:
+            nodes_file_name (str): Name of the nodes file, without extension
+        Returns:
+            str: Path to the nodes file
+        """
+        csv_path = self.context.parameters.input_file_path + '/' + nodes_file_name + '.csv'
+        parquet_path = self.context.parameters.input_file_path + '/' + nodes_file_name + '.parquet'
+        if os.path.isfile(parquet_path) and (not os.path.isfile(csv_path) or os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path)):
+            return parquet_path
+        return csv_path
+
+
+    def read_nodes_columns(self) -> dict[str, np.ndarray]:
+        """
+        Read the solver columns of the nodes file as typed arrays
+        """
+        if self.nodes_file_path.endswith('.parquet'):
+            columns_df = self.IO.read_parquet(self.nodes_file_path, columns=list(NODES_DTYPES))
+            return {column: columns_df[column].to_numpy(dtype=dtype) for column, dtype in NODES_DTYPES.items()}
+        return self.IO.read_csv_columns(self.nodes_file_path, separator=';', decimal=',', encoding='latin-1', dtypes=NODES_DTYPES)
+
+
+    def load_arrays(self, file_path: str) -> bool:
+        """
+        Load the distances and neighbours precomputed by convert_instance.py. They are only used if they were
+        computed for the same nodes, demands, distance method and number of neighbours. The distances matrix
+        is stored apart (<name>.distances.npy) and memory-mapped, so it is not read at once
+
+        Args:
+            file_path (str): Path to the .npz file
+        Returns:
+            bool: True if the arrays were loaded
+        """
+        distances_file_path = self.get_distances_file_path(file_path)
+        if not os.path.isfile(file_path) or not os.path.isfile(distances_file_path):
+            return False
+        distances = np.asarray(np.load(distances_file_path, mmap_mode='r'))
+        with np.load(file_path) as arrays:
+            if (str(arrays['method']) != self.context.parameters.DISTANCE_METHOD or int(arrays['n_neighbours']) != self.context.parameters.N_NEIGHBOURS
+                    or not np.array_equal(arrays['nodes_ids'], self.nodes_ids) or not np.array_equal(arrays['demands'], self.demands)
+                    or not np.array_equal(arrays['latitudes'], self.latitudes) or not np.array_equal(arrays['longitudes'], self.longitudes)
+                    or distances.shape != (len(self.nodes_ids), len(self.nodes_ids))):
+                self.context.logger.warning(f"Instance arrays {file_path} do not match the nodes or the parameters, they are recomputed")
+                return False
+            self.distances = distances
+            self.neighbours = arrays['neighbours']
+        self.context.logger.info(f"Distances and neighbours loaded from {file_path}")
+        return True
+
+
+    def save_arrays(self, file_path: str):
+        """
+        Store the distances and neighbours, with the nodes and parameters they were computed for
+        """
+        with open(file_path + '.tmp', 'wb') as distances_file:
+            np.save(distances_file, np.ascontiguousarray(self.distances, dtype=np.int32))
+        os.replace(file_path + '.tmp', self.get_distances_file_path(file_path))
+        with open(file_path + '.tmp', 'wb') as arrays_file:
+            np.savez(arrays_file, method=np.array(self.context.parameters.DISTANCE_METHOD), n_neighbours=np.array(self.context.parameters.N_NEIGHBOURS),
+                     nodes_ids=np.asarray(self.nodes_ids, dtype=np.int64), demands=np.asarray(self.demands, dtype=np.int64),
+                     latitudes=self.latitudes, longitudes=self.longitudes, neighbours=self.neighbours)
+        os.replace(file_path + '.tmp', file_path)
+
+
+    def get_distances_file_path(self, file_path: str) -> str:
+        """
+        Path to the distances matrix stored next to the .npz file
+        """
+        return os.path.splitext(file_path)[0] + '.distances.npy'
+
+
+    def load_demands(self, nodes_columns: dict[str, np.ndarray]):
         """
         Load the demands vector
         """
-        demands = self.nodes_df['Items'].astype(int).to_list()
+        demands = nodes_columns['Items'].tolist()
         return demands
     
 
-    def load_nodes_ids(self):
+    def load_nodes_ids(self, nodes_columns: dict[str, np.ndarray]):
         """
         Load the nodes ids vector
         """
-        nodes_ids = self.nodes_df['Id'].astype(int).to_list()
+        nodes_ids = nodes_columns['Id'].tolist()
         return nodes_ids
     
     
@@ -36,20 +178,50 @@ class Instance:
         """
         Load the distances matrix
         """
-        # Create empty distances matrix
-        n = len(self.nodes_ids)
-        distances = np.zeros((n, n))
-        
-        # Calculate distances between all pairs of nodes using coordinates
-        for i in range(n):
-            for j in range(n):
-                if i != j:
-                    coord1 = (self.nodes_df.iloc[i]['Latitude'], self.nodes_df.iloc[i]['Longitude'])
-                    coord2 = (self.nodes_df.iloc[j]['Latitude'], self.nodes_df.iloc[j]['Longitude'])
-                    distances[i,j] = int(self.Geo.calculate_distance(coord1, coord2))
+        # Calculate distances between all pairs of nodes using coordinates (integer meters)
+        nodes_ids = np.asarray(self.nodes_ids, dtype=int)
+        if self.context.parameters.USE_DISTANCE_CACHE:
+            distances = self.matrix_cache.load_distances(nodes_ids, self.latitudes, self.longitudes, self.context.parameters.DISTANCE_METHOD)
+        else:
+            distances = self.Geo.calculate_distance_matrix(self.latitudes, self.longitudes, self.context.parameters.DISTANCE_METHOD)
         return distances
     
 
+    def load_neighbours(self, k: int):
+        """
+        Load the k nearest customers of every node (depot included), sorted by distance
+        """
+        customers = np.arange(1, len(self.demands))
+        self.neighbours = self.calculate_nearest_nodes(customers, k)
+
+
+    def calculate_nearest_nodes(self, candidates: np.ndarray, k: int, block_size: int = 1024) -> np.ndarray:
+        """
+        Calculate the k nearest candidates of every node, a node not being its own neighbour.
+        Rows are processed in blocks with np.argpartition, O(n) per row instead of a full sort
+
+        Args:
+            candidates (np.ndarray): Candidate nodes
+            k (int): Number of neighbours
+            block_size (int): Rows per block
+        Returns:
+            np.ndarray: Neighbours of each node (n_nodes x k), closest first
+        """
+        n_nodes = len(self.distances)
+        k = max(0, min(k, len(candidates) - 1))
+        neighbours = np.zeros((n_nodes, k), dtype=np.int32)
+        if k == 0:
+            return neighbours
+        for first in range(0, n_nodes, block_size):
+            rows = np.arange(first, min(n_nodes, first + block_size))
+            block = np.asarray(self.distances[rows][:, candidates], dtype=np.int64)
+            block[rows[:, None] == candidates[None, :]] = np.iinfo(np.int64).max # Itself
+            closest = np.argpartition(block, k - 1, axis=1)[:, :k]
+            order = np.argsort(np.take_along_axis(block, closest, axis=1), axis=1, kind='stable')
+            neighbours[rows] = candidates[np.take_along_axis(closest, order, axis=1)]
+        return neighbours
+
+
     def validate(self):
         """
         Validate the instance
@@ -0,0 +1,100 @@
+from algorithm import Context
+from utils import IO
+import numpy as np
+import pandas as pd
+
+class InstanceGenerator:
+    # Bounding box of the synthetic nodes (Andalusia) and depot of the real instances
+    MIN_LATITUDE, MAX_LATITUDE = 36.2, 38.5
+    MIN_LONGITUDE, MAX_LONGITUDE = -7.4, -1.8
+    DEPOT = ('Depot', 'Ctra. Nacional 331', 'Antequera', 'MALAGA', 29200, 37.0452693, -4.512310623)
+    PROVINCES = {
+        'ALMERIA': (36.84, -2.46, 4),
+        'CADIZ': (36.53, -6.29, 11),
+        'CORDOBA': (37.88, -4.78, 14),
+        'GRANADA': (37.18, -3.60, 18),
+        'HUELVA': (37.26, -6.94, 21),
+        'JAEN': (37.77, -3.79, 23),
+        'MALAGA': (36.72, -4.42, 29),
+        'SEVILLA': (37.39, -5.98, 41),
+    } # Latitude, longitude and zip code prefix of each capital
+
+    def __init__(self, context: Context):
+        self.IO = IO()
+        self.context = context
+
+
+    def generate_nodes(self, n_nodes: int, seed: int = 0, delivery_ratio: float = 0.5) -> pd.DataFrame:
+        """
+        Generate a random pickup and delivery instance with the schema of nodes.csv. The depot is node 0
+        and the total demand is kept under zero so that the instance passes Instance.validate
+
+        Args:
+            n_nodes (int): Number of nodes, depot included
+            seed (int): Seed of the generator
+            delivery_ratio (float): Share of delivery nodes
+        Returns:
+            pd.DataFrame: Nodes
+        """
+        rng = np.random.default_rng(seed)
+        n_customers = n_nodes - 1
+        latitudes = rng.uniform(self.MIN_LATITUDE, self.MAX_LATITUDE, n_customers)
+        longitudes = rng.uniform(self.MIN_LONGITUDE, self.MAX_LONGITUDE, n_customers)
+
+        # Demand magnitudes similar to the real instances, capped by the vehicle capacity
+        max_items = max(1, int(self.context.parameters.VEHICLE_CAPACITY * 0.6))
+        items = np.clip(np.rint(rng.lognormal(4.5, 1.0, n_customers)), 1, max_items).astype(np.int64)
+        items[rng.random(n_customers) < delivery_ratio] *= -1
+        for position in rng.permutation(n_customers):
+            if items.sum() <= 0:
+                break
+            items[position] = -abs(items[position])
+
+        # Province of the nearest capital
+        capitals = np.array([(latitude, longitude) for latitude, longitude, _ in self.PROVINCES.values()])
+        nearest_capitals = np.argmin((latitudes[:, None] - capitals[None, :, 0]) ** 2 + (longitudes[:, None] - capitals[None, :, 1]) ** 2, axis=1)
+        provinces = np.array(list(self.PROVINCES.keys()))[nearest_capitals]
+        zip_code_prefixes = np.array([prefix for _, _, prefix in self.PROVINCES.values()])[nearest_capitals]
+        zip_codes = zip_code_prefixes * 1000 + rng.integers(0, 1000, n_customers)
+
+        ids = np.arange(1, n_nodes)
+        name, address, location, province, zip_code, latitude, longitude = self.DEPOT
+        depot_df = pd.DataFrame([[0, name, address, location, province, zip_code, 0, 0, 'DEPOT', '0:00', '23:59', latitude, longitude, 'depot@depot.com', 954678584]],
+                                columns=self.get_columns())
+        nodes_df = pd.DataFrame({
+            'Id': ids,
+            'Name': ['NODE ' + str(node_id) for node_id in ids],
+            'Address': ['STREET ' + str(node_id) for node_id in ids],
+            'Location': provinces,
+            'Province': provinces,
+            'Zip_Code': zip_codes,
+            'Items': items,
+            'Weight': np.round(np.abs(items) * rng.uniform(100, 140, n_customers), 2),
+            'Node_Type': 'GENERAL',
+            'TW_Start': '3:00',
+            'TW_End': '23:59',
+            'Latitude': np.round(latitudes, 8),
+            'Longitude': np.round(longitudes, 8),
+            'Email': ['node' + str(node_id) + '@example.com' for node_id in ids],
+            'Phone': 900000000 + ids,
+        })
+        return pd.concat([depot_df, nodes_df], ignore_index=True)
+
+
+    def save_nodes(self, nodes_df: pd.DataFrame, folder_path: str):
+        """
+        Save the nodes as folder_path/nodes.csv, with the separator, decimal and encoding read by Instance
+
+        Args:
+            nodes_df (pd.DataFrame): Nodes
+            folder_path (str): Folder of the instance
+        """
+        self.IO.create_folder_if_not_exist(folder_path)
+        self.IO.create_csv(nodes_df, folder_path + 'nodes')
+
+
+    def get_columns(self) -> list[str]:
+        """
+        Columns of nodes.csv
+        """
+        return ['Id', 'Name', 'Address', 'Location', 'Province', 'Zip_Code', 'Items', 'Weight', 'Node_Type', 'TW_Start', 'TW_End', 'Latitude', 'Longitude', 'Email', 'Phone']
@@ -0,0 +1,411 @@
+from algorithm import Context, Instance, Solution
+import math
+import time
+
+class LocalSearch:
+    def __init__(self, context: Context, instance: Instance):
+        self.context = context
+        self.instance = instance
+        n_nodes = len(instance.nodes_ids)
+        # Nested lists index faster than NumPy scalars; keep the array for very large instances
+        self.distances = instance.distances.tolist() if n_nodes <= 2000 else instance.distances
+        self.demands = [int(demand) for demand in instance.demands]
+        self.vehicle_capacity = self.context.parameters.VEHICLE_CAPACITY
+        self.max_distance = self.context.parameters.MAX_DISTANCE
+        self.initial_stock = self.context.parameters.MAX_STOCK * 0.8
+        self.neighbours = instance.neighbours.tolist() # Granular neighbour lists
+        self.evaluations = 0
+
+
+    def improve(self, solution: Solution, time_limit: float) -> Solution:
+        """
+        Improve a solution with intra-route 2-opt and Or-opt, inter-route relocate, swap and 2-opt*,
+        and insertion of unserved nodes. First-improvement over the granular neighbourhood until a
+        local optimum or the time limit.
+
+        Args:
+            solution (Solution): Solution to improve (modified in place)
+            time_limit (float): Maximum time in seconds
+        Returns:
+            Solution: Improved solution
+        """
+        deadline = time.time() + time_limit
+        self.load_routes(solution.routes)
+        improved = True
+        while improved and time.time() < deadline:
+            improved = False
+            for node in range(1, len(self.demands)):
+                if self.route_of[node] < 0:
+                    improved |= self.insert_unserved_node(node)
+                else:
+                    improved |= self.improve_node(node)
+                if time.time() >= deadline:
+                    break
+        solution.set_routes([path[1:-1] for path in self.paths])
+        solution.evaluate_routes()
+        return solution
+
+
+    def load_routes(self, routes: list[list[int]]):
+        """
+        Build the route data used by the delta evaluation
+        """
+        n_nodes = len(self.demands)
+        self.paths = []
+        self.loads = []
+        self.cumulative_distances = []
+        self.min_tables = []
+        self.max_tables = []
+        self.initial_loads = []
+        self.excesses = []
+        self.route_of = [-1] * n_nodes
+        self.position_of = [-1] * n_nodes
+        for route in routes:
+            self.paths.append(None)
+            self.loads.append(None)
+            self.cumulative_distances.append(None)
+            self.min_tables.append(None)
+            self.max_tables.append(None)
+            self.initial_loads.append(0)
+            self.excesses.append(0)
+            self.set_route(len(self.paths) - 1, [0] + list(route) + [0])
+        self.total_distance = sum(cumulative[-1] for cumulative in self.cumulative_distances)
+        self.total_initial_load = sum(self.initial_loads)
+        self.n_unserved = sum(1 for node in range(1, n_nodes) if self.route_of[node] < 0)
+
+
+    def set_route(self, route: int, path: list[int]):
+        """
+        Store a route (depot at both ends) and rebuild its load prefix, cumulative distance and
+        range min/max tables
+        """
+        loads = [0] * len(path)
+        cumulative_distances = [0] * len(path)
+        for position in range(1, len(path)):
+            node = path[position]
+            loads[position] = loads[position - 1] + self.demands[node]
+            cumulative_distances[position] = cumulative_distances[position - 1] + self.distances[path[position - 1]][node]
+            self.route_of[node] = route
+            self.position_of[node] = position
+        self.paths[route] = path
+        self.loads[route] = loads
+        self.cumulative_distances[route] = cumulative_distances
+        self.min_tables[route] = self.build_sparse_table(loads, min)
+        self.max_tables[route] = self.build_sparse_table(loads, max)
+        self.initial_loads[route], self.excesses[route] = self.get_load_profile(min(loads), max(loads))
+
+
+    def build_sparse_table(self, values: list[int], function) -> list[list[int]]:
+        """
+        Sparse table for O(1) range min or max queries
+        """
+        table = [values]
+        width = 1
+        while 2 * width <= len(values):
+            previous = table[-1]
+            table.append([function(previous[i], previous[i + width]) for i in range(len(values) - 2 * width + 1)])
+            width *= 2
+        return table
+
+
+    def range_min(self, route: int, first: int, last: int) -> float:
+        """
+        Minimum load prefix of the route between two positions (both included)
+        """
+        if first > last:
+            return math.inf
+        level = (last - first + 1).bit_length() - 1
+        table = self.min_tables[route][level]
+        return min(table[first], table[last - (1 << level) + 1])
+
+
+    def range_max(self, route: int, first: int, last: int) -> float:
+        """
+        Maximum load prefix of the route between two positions (both included)
+        """
+        if first > last:
+            return -math.inf
+        level = (last - first + 1).bit_length() - 1
+        table = self.max_tables[route][level]
+        return max(table[first], table[last - (1 << level) + 1])
+
+
+    def get_load_profile(self, min_load: int, max_load: int) -> tuple[int, int]:
+        """
+        Initial load drawn from the depot and capacity excess of a route given the extreme values of its load prefix
+
+        Returns:
+            tuple: Initial load and capacity excess
+        """
+        initial_load = max(0, -min_load)
+        return initial_load, max(0, initial_load + max_load - self.vehicle_capacity)
+
+
+    def evaluate_move(self, delta_distance: int, changed_routes: list[tuple], delta_served: int = 0) -> float:
+        """
+        Delta evaluation of a move in O(1): cost variation, or None if the move is not feasible.
+        A move may not increase the capacity excess of the routes, exceed the mileage or draw
+        more stock than available. Moves that reduce the capacity excess are always accepted.
+
+        Args:
+            delta_distance (int): Total distance variation
+            changed_routes (list): (route, new distance, new min load prefix, new max load prefix) of every changed route
+            delta_served (int): Nodes served by the move
+        Returns:
+            float: Cost variation
+        """
+        self.evaluations += 1
+        delta_initial_load = 0
+        delta_excess = 0
+        for route, distance, min_load, max_load in changed_routes:
+            if distance > self.max_distance and distance > self.cumulative_distances[route][-1]:
+                return None
+            initial_load, excess = self.get_load_profile(min_load, max_load)
+            delta_initial_load += initial_load - self.initial_loads[route]
+            delta_excess += excess - self.excesses[route]
+        if delta_excess > 0:
+            return None
+        stock = self.initial_stock - self.total_initial_load - delta_initial_load
+        if stock < 0 and delta_initial_load > 0:
+            return None
+        current_value = self.instance.get_solution_value(self.total_distance, self.initial_stock - self.total_initial_load, self.n_unserved)
+        delta_cost = self.instance.get_solution_value(self.total_distance + delta_distance, stock, self.n_unserved - delta_served) - current_value
+        if delta_excess < 0:
+            return min(delta_cost, -1.0)
+        return delta_cost
+
+
+    def apply_move(self, new_paths: dict[int, list[int]], delta_served: int = 0):
+        """
+        Replace the changed routes and update the totals
+        """
+        for route, path in new_paths.items():
+            self.total_distance -= self.cumulative_distances[route][-1]
+            self.total_initial_load -= self.initial_loads[route]
+            self.set_route(route, path)
+            self.total_distance += self.cumulative_distances[route][-1]
+            self.total_initial_load += self.initial_loads[route]
+        self.n_unserved -= delta_served
+
+
+    def improve_node(self, node: int) -> bool:
+        """
+        Try the moves between node and each of its neighbours, applying the first improving one
+
+        Returns:
+            bool: True if the solution improved
+        """
+        for neighbour in self.neighbours[node]:
+            if self.route_of[neighbour] < 0:
+                continue
+            if self.route_of[neighbour] == self.route_of[node]:
+                if self.two_opt(node, neighbour) or self.or_opt(node, neighbour):
+                    return True
+            elif self.relocate(node, neighbour) or self.swap(node, neighbour) or self.two_opt_star(node, neighbour):
+                return True
+        return False
+
+
+    def relocate(self, node: int, neighbour: int) -> bool:
+        """
+        Inter-route relocate: move node next to neighbour (after it, then before it)
+        """
+        route_a, i = self.route_of[node], self.position_of[node]
+        route_b = self.route_of[neighbour]
+        path_a, loads_a, distances = self.paths[route_a], self.loads[route_a], self.distances
+        demand = self.demands[node]
+        a_previous, a_next = path_a[i - 1], path_a[i + 1]
+        delta_a = distances[a_previous][a_next] - distances[a_previous][node] - distances[node][a_next]
+        last_a = len(path_a) - 1
+        min_a = min(self.range_min(route_a, 0, i - 1), self.range_min(route_a, i + 1, last_a) - demand)
+        max_a = max(self.range_max(route_a, 0, i - 1), self.range_max(route_a, i + 1, last_a) - demand)
+        distance_a = self.cumulative_distances[route_a][-1] + delta_a
+        for j in (self.position_of[neighbour], self.position_of[neighbour] - 1):
+            delta_b, min_b, max_b = self.get_insertion(route_b, j, node)
+            distance_b = self.cumulative_distances[route_b][-1] + delta_b
+            delta_cost = self.evaluate_move(delta_a + delta_b, [(route_a, distance_a, min_a, max_a), (route_b, distance_b, min_b, max_b)])
+            if delta_cost is not None and delta_cost < -1e-9:
+                path_b = self.paths[route_b]
+                self.apply_move({route_a: path_a[:i] + path_a[i + 1:], route_b: path_b[:j + 1] + [node] + path_b[j + 1:]})
+                return True
+        return False
+
+
+    def get_insertion(self, route: int, j: int, node: int) -> tuple[int, int, int]:
+        """
+        Distance variation and new load prefix extremes of inserting node after position j
+
+        Returns:
+            tuple: Distance variation, min load prefix and max load prefix
+        """
+        path, loads, distances = self.paths[route], self.loads[route], self.distances
+        demand = self.demands[node]
+        delta = distances[path[j]][node] + distances[node][path[j + 1]] - distances[path[j]][path[j + 1]]
+        last = len(path) - 1
+        min_load = min(self.range_min(route, 0, j), loads[j] + demand, self.range_min(route, j + 1, last) + demand)
+        max_load = max(self.range_max(route, 0, j), loads[j] + demand, self.range_max(route, j + 1, last) + demand)
+        return delta, min_load, max_load
+
+
+    def swap(self, node: int, neighbour: int) -> bool:
+        """
+        Inter-route swap of node and neighbour
+        """
+        route_a, i = self.route_of[node], self.position_of[node]
+        route_b, j = self.route_of[neighbour], self.position_of[neighbour]
+        path_a, path_b, distances = self.paths[route_a], self.paths[route_b], self.distances
+        delta_a = distances[path_a[i - 1]][neighbour] + distances[neighbour][path_a[i + 1]] - distances[path_a[i - 1]][node] - distances[node][path_a[i + 1]]
+        delta_b = distances[path_b[j - 1]][node] + distances[node][path_b[j + 1]] - distances[path_b[j - 1]][neighbour] - distances[neighbour][path_b[j + 1]]
+        delta_demand = self.demands[neighbour] - self.demands[node]
+        last_a, last_b = len(path_a) - 1, len(path_b) - 1
+        min_a = min(self.range_min(route_a, 0, i - 1), self.range_min(route_a, i, last_a) + delta_demand)
+        max_a = max(self.range_max(route_a, 0, i - 1), self.range_max(route_a, i, last_a) + delta_demand)
+        min_b = min(self.range_min(route_b, 0, j - 1), self.range_min(route_b, j, last_b) - delta_demand)
+        max_b = max(self.range_max(route_b, 0, j - 1), self.range_max(route_b, j, last_b) - delta_demand)
+        distance_a = self.cumulative_distances[route_a][-1] + delta_a
+        distance_b = self.cumulative_distances[route_b][-1] + delta_b
+        delta_cost = self.evaluate_move(delta_a + delta_b, [(route_a, distance_a, min_a, max_a), (route_b, distance_b, min_b, max_b)])
+        if delta_cost is not None and delta_cost < -1e-9:
+            self.apply_move({route_a: path_a[:i] + [neighbour] + path_a[i + 1:], route_b: path_b[:j] + [node] + path_b[j + 1:]})
+            return True
+        return False
+
+
+    def two_opt_star(self, node: int, neighbour: int) -> bool:
+        """
+        Inter-route 2-opt*: exchange the tails of both routes so that node and neighbour become consecutive
+        """
+        route_a, route_b = self.route_of[node], self.route_of[neighbour]
+        # Edge node -> neighbour, then edge neighbour -> node
+        for i, j in ((self.position_of[node], self.position_of[neighbour] - 1), (self.position_of[node] - 1, self.position_of[neighbour])):
+            if self.two_opt_star_cut(route_a, i, route_b, j):
+                return True
+        return False
+
+
+    def two_opt_star_cut(self, route_a: int, i: int, route_b: int, j: int) -> bool:
+        """
+        2-opt* cutting route_a after position i and route_b after position j:
+        A' = A[..i] + B[j + 1..] and B' = B[..j] + A[i + 1..]
+        """
+        path_a, path_b, distances = self.paths[route_a], self.paths[route_b], self.distances
+        loads_a, loads_b = self.loads[route_a], self.loads[route_b]
+        cumulative_a, cumulative_b = self.cumulative_distances[route_a], self.cumulative_distances[route_b]
+        last_a, last_b = len(path_a) - 1, len(path_b) - 1
+        distance_a = cumulative_a[i] + distances[path_a[i]][path_b[j + 1]] + cumulative_b[-1] - cumulative_b[j + 1]
+        distance_b = cumulative_b[j] + distances[path_b[j]][path_a[i + 1]] + cumulative_a[-1] - cumulative_a[i + 1]
+        delta_distance = distance_a + distance_b - cumulative_a[-1] - cumulative_b[-1]
+        min_a = min(self.range_min(route_a, 0, i), loads_a[i] - loads_b[j] + self.range_min(route_b, j + 1, last_b))
+        max_a = max(self.range_max(route_a, 0, i), loads_a[i] - loads_b[j] + self.range_max(route_b, j + 1, last_b))
+        min_b = min(self.range_min(route_b, 0, j), loads_b[j] - loads_a[i] + self.range_min(route_a, i + 1, last_a))
+        max_b = max(self.range_max(route_b, 0, j), loads_b[j] - loads_a[i] + self.range_max(route_a, i + 1, last_a))
+        delta_cost = self.evaluate_move(delta_distance, [(route_a, distance_a, min_a, max_a), (route_b, distance_b, min_b, max_b)])
+        if delta_cost is not None and delta_cost < -1e-9:
+            self.apply_move({route_a: path_a[:i + 1] + path_b[j + 1:], route_b: path_b[:j + 1] + path_a[i + 1:]})
+            return True
+        return False
+
+
+    def two_opt(self, node: int, neighbour: int) -> bool:
+        """
+        Intra-route 2-opt: reverse the segment between node and neighbour so that they become consecutive
+        """
+        route = self.route_of[node]
+        position_node, position_neighbour = self.position_of[node], self.position_of[neighbour]
+        if position_node < position_neighbour:
+            i, j = position_node + 1, position_neighbour # New edge node -> neighbour
+        else:
+            i, j = position_neighbour, position_node - 1 # New edge neighbour -> node
+        if i >= j:
+            return False
+        path, loads, distances = self.paths[route], self.loads[route], self.distances
+        last = len(path) - 1
+        delta_distance = distances[path[i - 1]][path[j]] + distances[path[i]][path[j + 1]] - distances[path[i - 1]][path[i]] - distances[path[j]][path[j + 1]]
+        # Inside the reversed segment the load prefixes become loads[i - 1] + loads[j] - loads[k], k in [i - 1, j - 1]
+        reversed_offset = loads[i - 1] + loads[j]
+        min_load = min(self.range_min(route, 0, i - 1), reversed_offset - self.range_max(route, i - 1, j - 1), self.range_min(route, j, last))
+        max_load = max(self.range_max(route, 0, i - 1), reversed_offset - self.range_min(route, i - 1, j - 1), self.range_max(route, j, last))
+        distance = self.cumulative_distances[route][-1] + delta_distance
+        delta_cost = self.evaluate_move(delta_distance, [(route, distance, min_load, max_load)])
+        if delta_cost is not None and delta_cost < -1e-9:
+            self.apply_move({route: path[:i] + path[i:j + 1][::-1] + path[j + 1:]})
+            return True
+        return False
+
+
+    def or_opt(self, node: int, neighbour: int) -> bool:
+        """
+        Intra-route Or-opt: move the segment of 1 to 3 nodes starting at node next to neighbour
+        """
+        route = self.route_of[node]
+        path = self.paths[route]
+        i = self.position_of[node]
+        for length in (1, 2, 3):
+            if i + length - 1 > len(path) - 2:
+                break
+            for j in (self.position_of[neighbour], self.position_of[neighbour] - 1):
+                if i - 1 <= j <= i + length - 1:
+                    continue
+                if self.move_segment(route, i, length, j):
+                    return True
+        return False
+
+
+    def move_segment(self, route: int, i: int, length: int, j: int) -> bool:
+        """
+        Move the segment path[i..i + length - 1] after position j (outside the segment)
+        """
+        path, loads, distances = self.paths[route], self.loads[route], self.distances
+        last = len(path) - 1
+        end = i + length - 1
+        first_node, last_node = path[i], path[end]
+        delta_distance = (distances[path[i - 1]][path[end + 1]] - distances[path[i - 1]][first_node] - distances[last_node][path[end + 1]] +
+                          distances[path[j]][first_node] + distances[last_node][path[j + 1]] - distances[path[j]][path[j + 1]])
+        segment_load = loads[end] - loads[i - 1]
+        if j > end: # Forward
+            segment_offset = loads[j] - segment_load - loads[i - 1]
+            min_load = min(self.range_min(route, 0, i - 1), self.range_min(route, end + 1, j) - segment_load, segment_offset + self.range_min(route, i, end), self.range_min(route, j + 1, last))
+            max_load = max(self.range_max(route, 0, i - 1), self.range_max(route, end + 1, j) - segment_load, segment_offset + self.range_max(route, i, end), self.range_max(route, j + 1, last))
+            new_path = path[:i] + path[end + 1:j + 1] + path[i:end + 1] + path[j + 1:]
+        else: # Backward
+            segment_offset = loads[j] - loads[i - 1]
+            min_load = min(self.range_min(route, 0, j), segment_offset + self.range_min(route, i, end), self.range_min(route, j + 1, i - 1) + segment_load, self.range_min(route, end + 1, last))
+            max_load = max(self.range_max(route, 0, j), segment_offset + self.range_max(route, i, end), self.range_max(route, j + 1, i - 1) + segment_load, self.range_max(route, end + 1, last))
+            new_path = path[:j + 1] + path[i:end + 1] + path[j + 1:i] + path[end + 1:]
+        distance = self.cumulative_distances[route][-1] + delta_distance
+        delta_cost = self.evaluate_move(delta_distance, [(route, distance, min_load, max_load)])
+        if delta_cost is not None and delta_cost < -1e-9:
+            self.apply_move({route: new_path})
+            return True
+        return False
+
+
+    def insert_unserved_node(self, node: int) -> bool:
+        """
+        Best insertion of an unserved node next to one of its served neighbours or in an empty route
+
+        Returns:
+            bool: True if the node was inserted
+        """
+        candidates = []
+        for neighbour in self.neighbours[node]:
+            if self.route_of[neighbour] >= 0:
+                candidates.append((self.route_of[neighbour], self.position_of[neighbour]))
+                candidates.append((self.route_of[neighbour], self.position_of[neighbour] - 1))
+        empty_routes = [route for route, path in enumerate(self.paths) if len(path) == 2]
+        if empty_routes:
+            candidates.append((empty_routes[0], 0))
+
+        best_cost, best_candidate = -1e-9, None
+        for route, j in candidates:
+            delta_distance, min_load, max_load = self.get_insertion(route, j, node)
+            distance = self.cumulative_distances[route][-1] + delta_distance
+            delta_cost = self.evaluate_move(delta_distance, [(route, distance, min_load, max_load)], delta_served=1)
+            if delta_cost is not None and delta_cost < best_cost:
+                best_cost, best_candidate = delta_cost, (route, j)
+        if best_candidate is None:
+            return False
+        route, j = best_candidate
+        path = self.paths[route]
+        self.apply_move({route: path[:j + 1] + [node] + path[j + 1:]}, delta_served=1)
+        return True
@@ -1,14 +1,17 @@
 from algorithm import Context, Instance, Solution
-from utils import Folium, Geo, IO, Here, Thread
+from utils import Folium, Geo, IO, Here, HereCache, Thread
+import numpy as np
 import pandas as pd
+import math
+import time
 class Map:
     def __init__(self, context: Context, instance: Instance, solution: Solution, routes_df: pd.DataFrame, metrics_df: pd.DataFrame):
         self.IO = IO()
         self.Folium = Folium()
         self.Geo = Geo()
-        self.Here = Here()
-        self.Thread = Thread()
         self.context = context
+        self.Here = self.create_here()
+        self.Thread = Thread(max_workers=self.context.parameters.HERE_MAX_CONCURRENCY)
         self.instance = instance
         self.solution = solution
         self.routes_df = routes_df
@@ -21,10 +24,24 @@ class Map:
         self.map_object = self.Folium.initialize_folium_map(self.depot_coords, logo_img_file)
         self.colors = self.Folium.get_input_colors(colors_df, 0) # Lista desordenada de colores en hexadecimal
         self.colors_high_contrast = self.Folium.get_input_colors(colors_df, 1) # Lista desordenada de colores en hexadecimal
-        self.spain_zip_codes_data = self.Folium.get_spain_zip_codes(self.context.parameters.input_file_path + '/map/')
         self.create_map()
 
 
+    def create_here(self) -> Here:
+        """
+        HERE client of the map. With HERE_CACHE the responses are kept in cache/here.sqlite, so the routes that
+        did not change since a previous run are not requested again. With HERE_OFFLINE the API is never called and
+        the routes missing from the cache are drawn as straight lines. The connections are kept alive, one per
+        concurrent request, and the requests answered with 429 or 5xx are retried with exponential backoff
+        """
+        parameters = self.context.parameters
+        here_cache = None
+        if parameters.HERE_CACHE or parameters.HERE_OFFLINE:
+            here_cache = HereCache(parameters.cache_file_path + 'here.sqlite', ttl=parameters.HERE_CACHE_TTL_DAYS * 24 * 3600, max_entries=parameters.HERE_CACHE_MAX_ENTRIES)
+        return Here(here_cache, offline=parameters.HERE_OFFLINE, max_connections=parameters.HERE_MAX_CONCURRENCY,
+                    max_retries=parameters.HERE_MAX_RETRIES, backoff_factor=parameters.HERE_BACKOFF_FACTOR)
+
+
     def create_map(self):
         """
         Draws the Map of the result routes
@@ -51,22 +68,22 @@ class Map:
         dynamic = False
         zip_codes_layer = self.Folium.create_feature_group_folium(self.map_object, layer_color, layer_txt, initial_show, dynamic)
 
+        # Only the files drawn are read: the provinces of city_name_zip_code_list or, if there are none, those around the nodes.
+        # Geometries are simplified once and cached, and every province is drawn as a single layer
+        map_folder = self.context.parameters.input_file_path + '/map/'
+        cache_folder = self.context.parameters.cache_file_path + 'zip_codes/'
+        provinces = [province for province in self.Folium.get_spain_zip_codes_index(map_folder) if province in self.context.parameters.city_name_zip_code_list]
+        if provinces:
+            spain_zip_codes_data = self.Folium.get_simplified_spain_zip_codes(map_folder, cache_folder, provinces=provinces)
+        else:
+            latitudes = self.instance.nodes_df['Latitude']
+            longitudes = self.instance.nodes_df['Longitude']
+            spain_zip_codes_data = self.Folium.get_simplified_spain_zip_codes(map_folder, cache_folder, bounds=(longitudes.min(), latitudes.min(), longitudes.max(), latitudes.max()))
+
         index_color = 0
-        for file, geojson in self.spain_zip_codes_data.items():
-            if file in self.context.parameters.city_name_zip_code_list:
-                polygon_color, index_color = self.Folium.get_node_color(index_color, self.colors_high_contrast)
-                for position in range(len(geojson['features'])):
-                    single_geojson = geojson['features'][position]
-                    single_geojson_id = single_geojson['properties']['COD_POSTAL']
-                    tooltip = 'CP:' + str(single_geojson_id) + ' - ' + str(file)
-                    self.Folium.add_polygon_to_map(single_geojson, zip_codes_layer, polygon_color, tooltip, tooltip)
-            if file in self.context.parameters.city_name_zip_code_list:
-                polygon_color, index_color = self.Folium.get_node_color(index_color, self.colors_high_contrast)
-                for position in range(len(geojson['features'])):
-                    single_geojson = geojson['features'][position]
-                    single_geojson_id = single_geojson['properties']['COD_POSTAL']
-                    tooltip = 'CP:' + str(single_geojson_id) + ' - ' + str(file)
-                    self.Folium.add_polygon_to_map(single_geojson, zip_codes_layer, polygon_color, tooltip, tooltip)
+        for file, geojson in spain_zip_codes_data.items():
+            polygon_color, index_color = self.Folium.get_node_color(index_color, self.colors_high_contrast)
+            self.Folium.add_polygons_layer_to_map(geojson, zip_codes_layer, polygon_color, str(file), ['COD_POSTAL', 'PROVINCIA'], ['CP:', 'Province:'])
 
     
     def draw_heat_map(self):
@@ -93,70 +110,43 @@ class Map:
         initial_show = False
         dynamic = False               
         clients_layer = self.Folium.create_feature_group_folium(self.map_object, layer_color, layer_txt, initial_show, dynamic)
-        for index, row in self.instance.nodes_df.iterrows():
-            node_id = row['Id']
-            if node_id == 0:
-                continue
-            node_name = row['Name']
-            node_address = row['Address']
-            node_zip_code = row['Zip_Code']
-            node_lat = row['Latitude']
-            node_lon = row['Longitude']
-            node_demand = row['Items']
-            node_tw_start = row['TW_Start']
-            node_tw_end = row['TW_End']
-            node_type = row['Node_Type']
-            node_email = row['Email']
-            node_phone = row['Phone']
-            self.add_html_pop_up(node_id, node_name, node_address, node_zip_code, node_lat, node_lon, node_demand, node_tw_start, node_tw_end, node_type, node_email, node_phone, clients_layer)
-
-
-    def add_html_pop_up(self, node_id: int, node_name: str, node_address: str, node_zip_code: str, node_lat: float, node_lon: float, node_demand: float, node_tw_start: str, node_tw_end: str, node_type: str, node_email: str, node_phone: str, clients_layer):
+        self.add_nodes_markers(self.instance.nodes_df[self.instance.nodes_df['Id'] != 0], clients_layer)
+
+
+    def add_nodes_markers(self, nodes_df: pd.DataFrame, clients_layer):
         """
-        Adds the HTML Pop Up for the Client
+        Adds the markers of the Clients, with their HTML Pop Ups, as a single layer: the popup template is built once
+        and filled in the browser with the columns of each node
         Params:
-        - node_id: int - ID of the Client
-        - node_name: str - Name of the Client
-        - node_address: str - Address of the Client
-        - node_population: str - Population of the Client's location
-        - node_zip_code: str - Zip Code of the Client
-        - node_key: str - Key identifier for the Client
-        - node_lat: float - Latitude of the Client
-        - node_lon: float - Longitude of the Client
-        - node_demand: float - Demand of the Client
-        - node_tw_start: str - Time window start for the Client
-        - node_tw_end: str - Time window end for the Client
-        - node_type: str - Type of the Client
+        - nodes_df: DataFrame - Nodes to draw
         - clients_layer: FeatureGroup - Layer of the Clients on the map
         """
         left_col_color_1 = '#36454F' #'#2C3539' # Even row left color
         right_col_color_1 = '#FBFBF9' # Even row right color
         left_col_color_2 = '#36454F' # Odd row left color
         right_col_color_2 = '#FAF5EF' # Odd row right color
-        html = self.Folium.add_beggining_HTML_table(node_name)
-        html = html + self.Folium.add_row_to_HTML_table('Node Id:', node_id, None, left_col_color_1, right_col_color_1)
-        html = html + self.Folium.add_row_to_HTML_table('Name:', node_name, None, left_col_color_2, right_col_color_2)
-        html = html + self.Folium.add_row_to_HTML_table('Demand:', node_demand, '€', left_col_color_1, right_col_color_1)
-        html = html + self.Folium.add_row_to_HTML_table('TW Start:', node_tw_start, None, left_col_color_2, right_col_color_2)
-        html = html + self.Folium.add_row_to_HTML_table('Address:', node_address, None, left_col_color_1, right_col_color_1)
-        html = html + self.Folium.add_row_to_HTML_table('Zip Code:', node_zip_code, None, left_col_color_2, right_col_color_2)
-        html = html + self.Folium.add_row_to_HTML_table('TW End:', node_tw_end, None, left_col_color_1, right_col_color_1)
-        html = html + self.Folium.add_row_to_HTML_table('Email:', node_email, None, left_col_color_2, right_col_color_2)
-        html = html + self.Folium.add_row_to_HTML_table('Phone:', node_phone, None, left_col_color_1, right_col_color_1)
-        html = html + self.Folium.add_row_to_HTML_table('Latitud:', node_lat, None, left_col_color_2, right_col_color_2)
-        html = html + self.Folium.add_row_to_HTML_table('Longitud:', node_lon, None, left_col_color_1, right_col_color_1)
+        html = self.Folium.add_beggining_HTML_table('{Name}')
+        html = html + self.Folium.add_row_to_HTML_table('Node Id:', '{Id}', None, left_col_color_1, right_col_color_1)
+        html = html + self.Folium.add_row_to_HTML_table('Name:', '{Name}', None, left_col_color_2, right_col_color_2)
+        html = html + self.Folium.add_row_to_HTML_table('Demand:', '{Items}', '€', left_col_color_1, right_col_color_1)
+        html = html + self.Folium.add_row_to_HTML_table('TW Start:', '{TW_Start}', None, left_col_color_2, right_col_color_2)
+        html = html + self.Folium.add_row_to_HTML_table('Address:', '{Address}', None, left_col_color_1, right_col_color_1)
+        html = html + self.Folium.add_row_to_HTML_table('Zip Code:', '{Zip_Code}', None, left_col_color_2, right_col_color_2)
+        html = html + self.Folium.add_row_to_HTML_table('TW End:', '{TW_End}', None, left_col_color_1, right_col_color_1)
+        html = html + self.Folium.add_row_to_HTML_table('Email:', '{Email}', None, left_col_color_2, right_col_color_2)
+        html = html + self.Folium.add_row_to_HTML_table('Phone:', '{Phone}', None, left_col_color_1, right_col_color_1)
+        html = html + self.Folium.add_row_to_HTML_table('Latitud:', '{Latitude_Text}', None, left_col_color_2, right_col_color_2)
+        html = html + self.Folium.add_row_to_HTML_table('Longitud:', '{Longitude_Text}', None, left_col_color_1, right_col_color_1)
         html = html + self.Folium.add_end_HTML_table()
 
-        tooltip_folium = 'Node ID: ' + str(node_id) + ' - ' + str(node_name)
-        popup = self.Folium.create_pop_up(html)
-        if node_demand < 0:
-            icon_type = 'glyphicon-download'
-            node_color = '#FF0000'
-        else:
-            icon_type = 'glyphicon-upload'
-            node_color = '#008000'
-        icon = self.Folium.create_icon(icon_type, node_color, 'black')
-        self.Folium.create_marker( [node_lat, node_lon], popup, tooltip_folium, node_id, icon, clients_layer)
+        markers_df = nodes_df[['Id', 'Name', 'Items', 'TW_Start', 'Address', 'Zip_Code', 'TW_End', 'Email', 'Phone', 'Latitude', 'Longitude']].copy()
+        markers_df['Latitude_Text'] = nodes_df['Latitude'].astype(str)
+        markers_df['Longitude_Text'] = nodes_df['Longitude'].astype(str)
+        is_delivery = nodes_df['Items'].to_numpy() < 0
+        markers_df['icon'] = np.where(is_delivery, 'glyphicon-download', 'glyphicon-upload')
+        markers_df['icon_color'] = np.where(is_delivery, '#FF0000', '#008000')
+        markers_df['marker_color'] = 'black'
+        self.Folium.add_markers_layer(markers_df, html, 'Node ID: {Id} - {Name}', 'awesome', clients_layer)
 
 
     def draw_unserved_nodes(self):
@@ -171,33 +161,19 @@ class Map:
             initial_show = False
             dynamic = False               
             clients_layer = self.Folium.create_feature_group_folium(self.map_object, layer_color, layer_txt, initial_show, dynamic)
-            for index, row in unserved_nodes_df.iterrows():
-                node_id = row['Id']
-                node_name = row['Name']
-                node_address = row['Address']
-                node_zip_code = row['Zip_Code']
-                node_lat = row['Latitude']
-                node_lon = row['Longitude']
-                node_demand = row['Items']
-                node_tw_start = row['TW_Start']
-                node_tw_end = row['TW_End']
-                node_type = row['Node_Type']
-                node_email = row['Email']
-                node_phone = row['Phone']
-                self.add_html_pop_up(node_id, node_name, node_address, node_zip_code, node_lat, node_lon, node_demand, node_tw_start, node_tw_end, node_type, node_email, node_phone, clients_layer)
+            self.add_nodes_markers(unserved_nodes_df, clients_layer)
 
 
     def draw_routes(self):
         """
         Draws the Routes into the Folium Map
         """
-        routes_df_list = self.IO.cluster_dataframe_by_condition(self.routes_df, 'Vehicle')
         layer_color = '#25383C' # '#25383C'	DarkSlateGray or DarkSlateGrey (W3C)
         initial_show = False
         dynamic = False
         index_color = 0
-        for route_df in routes_df_list:
-            vehicle_name = route_df['Vehicle'].values[0]
+        routes_to_fetch = []
+        for vehicle_name, route_df in self.IO.iterate_dataframe_groups(self.routes_df, 'Vehicle'):
             route_load = route_df['Items'].sum()
             total_nodes = len(route_df) - 2
             layer_txt = 'Route ' + str(vehicle_name) + ' - Load: ' + str(route_load) + '€ Stops: ' + str(total_nodes)
@@ -205,69 +181,91 @@ class Map:
             node_color, index_color = self.Folium.get_node_color(index_color, self.colors_high_contrast)
             latitudes = [self.depot_coords[0]]
             longitudes = [self.depot_coords[1]]
-            stops_counter = 1
-            for index, node_df in route_df.iterrows():
-                node_id = node_df['Id']
-                node_name = node_df['Name']
-                order_type = node_df['Type']
-                address = node_df['Address']
-                location = node_df['Location']
-                province = node_df['Province']
-                zip_code = node_df['Zip_Code']
-                node_type = node_df['Node_Type']
-                items = node_df['Items']
-                lat = node_df['Latitude']
-                long = node_df['Longitude']
-
-                if order_type == '-':
-                    continue
-
-                latitudes.append(lat)
-                longitudes.append(long)
-                tooltip_folium = 'Node: ' + str(node_id) + '-' + str(node_name)
-                self.add_route_html_node(route_layer, node_color, tooltip_folium, node_id, node_name, address, location, province, zip_code, node_type, items, lat, long, stops_counter)
-                stops_counter = stops_counter + 1
+            stops_df = route_df[route_df['Type'] != '-']
+            latitudes += stops_df['Latitude'].tolist()
+            longitudes += stops_df['Longitude'].tolist()
+            self.add_route_markers(stops_df, node_color, route_layer)
 
             latitudes.append(self.depot_coords[0])
             longitudes.append(self.depot_coords[1])
             coordinates = self.Geo.create_list_of_list_coordinates(latitudes, longitudes)
             if len(coordinates) > 2:
-                route_info_here = self.Here.calculate_route_HERE(coordinates, 'car', self.context.parameters.here_API_key)
-                route_coordinates_here = route_info_here[0]
-                route_distance = route_info_here[1]
-                route_time = route_info_here[2]
-                print('Route:', layer_txt, ' has a distance of ', route_distance, ' and a duration of ', route_time)
-                self.Folium.add_route_to_map(route_coordinates_here, node_color, layer_txt, route_layer, 2)
-                # self.Folium.add_route_to_map(coordinates, node_color, layer_txt, route_layer, 2)
+                routes_to_fetch.append((coordinates, node_color, layer_txt, route_layer))
+
+        # All the routes are requested at once and drawn in order when every request has finished
+        routes_info_here = self.fetch_routes_HERE([coordinates for coordinates, _, _, _ in routes_to_fetch])
+        for (coordinates, node_color, layer_txt, route_layer), route_info_here in zip(routes_to_fetch, routes_info_here):
+            route_coordinates_here = route_info_here[0]
+            route_distance = route_info_here[1]
+            route_time = route_info_here[2]
+            print('Route:', layer_txt, ' has a distance of ', route_distance, ' and a duration of ', route_time)
+            self.Folium.add_route_to_map(route_coordinates_here, node_color, layer_txt, route_layer, 2)
+            # self.Folium.add_route_to_map(coordinates, node_color, layer_txt, route_layer, 2)
 
 
-    def add_route_html_node(self, route_layer, node_color, tooltip_folium, node_id, node_name, address, location, province, zip_code, node_type, items, lat, long, stops_counter):
+    def fetch_routes_HERE(self, routes_coordinates: list[list[list[float]]]) -> list[list]:
         """
-        Add node marker from route into route layer
+        Request the geometry of every route to HERE concurrently (at most HERE_MAX_CONCURRENCY requests at a time).
+        Results keep the order of the routes. A route whose request fails or does not finish in time is drawn
+        as straight lines between its stops, without distance and duration
+
+        Params:
+        - routes_coordinates: list - Coordinates of the stops of each route, depot included
+        Returns:
+        - list - [coordinates, distance (km), duration (h)] of each route
+        """
+        parameters = self.context.parameters
+        futures = [self.Thread.run_task(self.Here.calculate_route_HERE, coordinates, 'car', parameters.here_API_key, parameters.here_routes_URL, parameters.HERE_TIMEOUT)
+                   for coordinates in routes_coordinates]
+        # Every attempt has its own timeout. The overall limit covers the retries with their backoff and the requests
+        # queued behind the concurrency cap
+        request_time = parameters.HERE_TIMEOUT * (parameters.HERE_MAX_RETRIES + 1) + parameters.HERE_BACKOFF_FACTOR * (2 ** parameters.HERE_MAX_RETRIES - 1)
+        deadline = time.time() + request_time * math.ceil(len(futures) / parameters.HERE_MAX_CONCURRENCY) + parameters.HERE_TIMEOUT
+        routes_info = []
+        for coordinates, future in zip(routes_coordinates, futures):
+            try:
+                route_info = future.result(timeout=max(0, deadline - time.time()))
+                if not route_info[0]:
+                    raise ValueError('Empty route geometry')
+            except Exception as e:
+                future.cancel()
+                self.context.logger.warning(f"HERE route not available, drawn as straight lines: {e}")
+                route_info = [coordinates, None, None]
+            routes_info.append(route_info)
+        # Requests still queued or retrying after the deadline are not waited for nor started
+        self.Thread.shutdown(wait=False, cancel_futures=True)
+        self.context.logger.info(self.Here.get_requests_summary())
+        return routes_info
+
+
+    def add_route_markers(self, stops_df: pd.DataFrame, node_color: str, route_layer):
+        """
+        Add the markers of the stops of a route into the route layer, numbered in visit order, as a single layer
         """
         left_col_color_1 = '#36454F' #'#2C3539' # Even row left color
         right_col_color_1 = '#FBFBF9' # Even row right color
         left_col_color_2 = '#36454F' # Odd row left color
         right_col_color_2 = '#FAF5EF' # Odd row right color
 
-        html = self.Folium.add_beggining_HTML_table(node_name)
-        html = html + self.Folium.add_row_to_HTML_table('Node Id', node_id, None, left_col_color_1, right_col_color_1)
-        html = html + self.Folium.add_row_to_HTML_table('Name', node_name, None, left_col_color_2, right_col_color_2)
-        html = html + self.Folium.add_row_to_HTML_table('Address', address, None, left_col_color_1, right_col_color_1)
-        html = html + self.Folium.add_row_to_HTML_table('Location', location, None, left_col_color_2, right_col_color_2)
-        html = html + self.Folium.add_row_to_HTML_table('Province', province, None, left_col_color_1, right_col_color_1)
-        html = html + self.Folium.add_row_to_HTML_table('Zip Code', zip_code, None, left_col_color_2, right_col_color_2)
-        html = html + self.Folium.add_row_to_HTML_table('Node Type', node_type, None, left_col_color_1, right_col_color_1)
-        html = html + self.Folium.add_row_to_HTML_table('Items', items, None, left_col_color_2, right_col_color_2)
-        html = html + self.Folium.add_row_to_HTML_table('Latitude', lat, None, left_col_color_1, right_col_color_1)
-        html = html + self.Folium.add_row_to_HTML_table('Longitude', long, None, left_col_color_2, right_col_color_2)
+        html = self.Folium.add_beggining_HTML_table('{Name}')
+        html = html + self.Folium.add_row_to_HTML_table('Node Id', '{Id}', None, left_col_color_1, right_col_color_1)
+        html = html + self.Folium.add_row_to_HTML_table('Name', '{Name}', None, left_col_color_2, right_col_color_2)
+        html = html + self.Folium.add_row_to_HTML_table('Address', '{Address}', None, left_col_color_1, right_col_color_1)
+        html = html + self.Folium.add_row_to_HTML_table('Location', '{Location}', None, left_col_color_2, right_col_color_2)
+        html = html + self.Folium.add_row_to_HTML_table('Province', '{Province}', None, left_col_color_1, right_col_color_1)
+        html = html + self.Folium.add_row_to_HTML_table('Zip Code', '{Zip_Code}', None, left_col_color_2, right_col_color_2)
+        html = html + self.Folium.add_row_to_HTML_table('Node Type', '{Node_Type}', None, left_col_color_1, right_col_color_1)
+        html = html + self.Folium.add_row_to_HTML_table('Items', '{Items}', None, left_col_color_2, right_col_color_2)
+        html = html + self.Folium.add_row_to_HTML_table('Latitude', '{Latitude_Text}', None, left_col_color_1, right_col_color_1)
+        html = html + self.Folium.add_row_to_HTML_table('Longitude', '{Longitude_Text}', None, left_col_color_2, right_col_color_2)
         html = html + self.Folium.add_end_HTML_table()
 
-        location = [lat, long]
-        popup = self.Folium.create_pop_up(html)
-        tooltip_folium = 'Node: ' + str(node_id)
-        icon = self.Folium.create_circle_icon(node_color, stops_counter)
-        self.Folium.create_marker(location, popup, tooltip_folium, node_name, icon, route_layer)
+        markers_df = stops_df[['Id', 'Name', 'Address', 'Location', 'Province', 'Zip_Code', 'Node_Type', 'Items', 'Latitude', 'Longitude']].copy()
+        markers_df['Latitude_Text'] = stops_df['Latitude'].astype(str)
+        markers_df['Longitude_Text'] = stops_df['Longitude'].astype(str)
+        markers_df['color'] = node_color
+        markers_df['number'] = np.arange(1, len(stops_df) + 1)
+        self.Folium.add_markers_layer(markers_df, html, 'Node: {Id}', 'numbered', route_layer)
 
 
     def draw_depot(self):
@@ -0,0 +1,155 @@
+from algorithm import Context
+from utils import IO, Geo
+import numpy as np
+import hashlib
+import glob
+import os
+
+class MatrixCache:
+    def __init__(self, context: Context, max_entries: int = 20):
+        self.IO = IO()
+        self.Geo = Geo()
+        self.context = context
+        self.max_entries = max_entries
+        self.cache_folder = self.create_cache_folder()
+
+
+    def create_cache_folder(self) -> str:
+        """
+        Creates the folder where the distance matrices are stored
+
+        Returns:
+            str: Path to the cache folder
+        """
+        cache_folder = self.context.parameters.cache_file_path
+        self.IO.create_folder_if_not_exist(cache_folder)
+        cache_folder += 'distances/'
+        self.IO.create_folder_if_not_exist(cache_folder)
+        return cache_folder
+
+
+    def get_key(self, nodes_ids: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray, method: str) -> str:
+        """
+        Hash of the ordered (Id, Latitude, Longitude) set and the distance method
+
+        Returns:
+            str: Cache key
+        """
+        key = hashlib.sha256()
+        key.update(method.encode())
+        key.update(np.ascontiguousarray(nodes_ids, dtype=np.int64).tobytes())
+        key.update(np.ascontiguousarray(latitudes, dtype=np.float64).tobytes())
+        key.update(np.ascontiguousarray(longitudes, dtype=np.float64).tobytes())
+        return key.hexdigest()
+
+
+    def load_distances(self, nodes_ids: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray, method: str) -> np.ndarray:
+        """
+        Load the distances matrix from the cache. On a miss, the matrix is computed (reusing the rows
+        of the closest cached matrix when only a few nodes were added or moved) and stored.
+
+        Args:
+            nodes_ids (np.ndarray): Nodes ids
+            latitudes (np.ndarray): Nodes latitudes
+            longitudes (np.ndarray): Nodes longitudes
+            method (str): Distance method
+        Returns:
+            np.ndarray: Read-only, memory-mapped int32 distances matrix
+        """
+        key = self.get_key(nodes_ids, latitudes, longitudes, method)
+        matrix_path = self.cache_folder + key + '.npy'
+        if os.path.isfile(matrix_path):
+            self.context.logger.info(f"Distances matrix loaded from cache {matrix_path}")
+            return self.open_matrix(matrix_path)
+
+        distances = self.calculate_incremental_distances(nodes_ids, latitudes, longitudes, method)
+        if distances is None:
+            distances = self.Geo.calculate_distance_matrix(latitudes, longitudes, method)
+        self.save_matrix(key, distances, nodes_ids, latitudes, longitudes, method)
+        self.remove_old_entries()
+        return self.open_matrix(matrix_path)
+
+
+    def open_matrix(self, matrix_path: str) -> np.ndarray:
+        """
+        Memory-map a cached matrix. Returned as a plain ndarray view so indexing keeps ndarray speed
+        """
+        return np.asarray(np.load(matrix_path, mmap_mode='r'))
+
+
+    def calculate_incremental_distances(self, nodes_ids: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray, method: str):
+        """
+        Build the matrix from the cached entry sharing most nodes, computing only the rows and
+        columns of the nodes that are new or moved
+
+        Returns:
+            np.ndarray: Distances matrix, or None if no cached entry is worth reusing
+        """
+        n = len(nodes_ids)
+        best_positions = None
+        best_matrix_path = None
+        best_matches = 0
+        for nodes_path in glob.glob(self.cache_folder + '*.nodes.npz'):
+            with np.load(nodes_path) as cached_nodes:
+                if str(cached_nodes['method']) != method:
+                    continue
+                positions = self.match_nodes(nodes_ids, latitudes, longitudes, cached_nodes['nodes_ids'], cached_nodes['latitudes'], cached_nodes['longitudes'])
+            matches = int((positions >= 0).sum())
+            if matches > best_matches:
+                best_matches, best_positions = matches, positions
+                best_matrix_path = nodes_path[:-len('.nodes.npz')] + '.npy'
+
+        # Not worth it if more than half of the nodes must be recomputed
+        if best_matches == 0 or best_matches < n / 2 or not os.path.isfile(best_matrix_path):
+            return None
+
+        cached_distances = np.load(best_matrix_path, mmap_mode='r')
+        known = np.flatnonzero(best_positions >= 0)
+        new = np.flatnonzero(best_positions < 0)
+        distances = np.zeros((n, n), dtype=np.int32)
+        distances[np.ix_(known, known)] = cached_distances[np.ix_(best_positions[known], best_positions[known])]
+        if len(new) > 0:
+            new_rows = self.Geo.calculate_distances(latitudes[new, None], longitudes[new, None], latitudes[None, :], longitudes[None, :], method).astype(np.int32)
+            new_rows[np.arange(len(new)), new] = 0
+            distances[new, :] = new_rows
+            distances[:, new] = new_rows.T
+        self.context.logger.info(f"Distances matrix updated from cache: {len(known)} nodes reused, {len(new)} nodes computed")
+        return distances
+
+
+    def match_nodes(self, nodes_ids: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray, cached_ids: np.ndarray, cached_latitudes: np.ndarray, cached_longitudes: np.ndarray) -> np.ndarray:
+        """
+        Position of every node in the cached entry (-1 if it is new or its coordinates changed)
+
+        Returns:
+            np.ndarray: Cached positions
+        """
+        cached_positions = {(int(node_id), float(lat), float(lon)): position for position, (node_id, lat, lon) in enumerate(zip(cached_ids, cached_latitudes, cached_longitudes))}
+        return np.array([cached_positions.get((int(node_id), float(lat), float(lon)), -1) for node_id, lat, lon in zip(nodes_ids, latitudes, longitudes)], dtype=np.int64)
+
+
+    def save_matrix(self, key: str, distances: np.ndarray, nodes_ids: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray, method: str):
+        """
+        Store the matrix and the nodes it was computed for. Files are written to a temporary path
+        and renamed so a concurrent run never reads a partial matrix
+        """
+        matrix_path = self.cache_folder + key + '.npy'
+        nodes_path = self.cache_folder + key + '.nodes.npz'
+        with open(matrix_path + '.tmp', 'wb') as matrix_file:
+            np.save(matrix_file, np.ascontiguousarray(distances, dtype=np.int32))
+        os.replace(matrix_path + '.tmp', matrix_path)
+        with open(nodes_path + '.tmp', 'wb') as nodes_file:
+            np.savez(nodes_file, nodes_ids=np.asarray(nodes_ids, dtype=np.int64), latitudes=np.asarray(latitudes, dtype=np.float64), longitudes=np.asarray(longitudes, dtype=np.float64), method=np.array(method))
+        os.replace(nodes_path + '.tmp', nodes_path)
+
+
+    def remove_old_entries(self):
+        """
+        Keep only the max_entries most recently written matrices
+        """
+        matrix_paths = sorted(glob.glob(self.cache_folder + '*.npy'), key=os.path.getmtime, reverse=True)
+        for matrix_path in matrix_paths[self.max_entries:]:
+            nodes_path = matrix_path[:-len('.npy')] + '.nodes.npz'
+            for path in (matrix_path, nodes_path):
+                if os.path.isfile(path):
+                    os.remove(path)
@@ -12,32 +12,35 @@ class Metrics:
 
     def calculate_metrics(self):
         """
-        Calculate the metrics
+        Calculate the metrics of every vehicle in a single groupby pass over the routes:
+            Total Nodes, Total Picks Ups, Total Deliveries: nodes visited (depot rows excluded)
+            Current Load, Current Distance: load and distance at the end of the route, and what is left of the limits
+            Stock Drawn: load taken from the depot stock at the start of the route
+            Max Load: maximum load along the route
+            Load Utilisation, Distance Utilisation: Max Load / VEHICLE_CAPACITY and Current Distance / MAX_DISTANCE
+            Cost, Cost per km: transport cost of the route and its cost per km
         """
         self.context.logger.info("Calculating metrics...")
-        metrics = []
-        routes_by_vehicle_df_list = self.IO.cluster_dataframe_by_condition(self.routes_df, 'Vehicle')
-        for route_by_vehicle_df in routes_by_vehicle_df_list:
-            vehicle_id = route_by_vehicle_df['Vehicle'].values[0]
-            total_nodes = len(route_by_vehicle_df) - 2
-            total_picks_ups = sum(1 for _, row in route_by_vehicle_df.iterrows() if row['Type'] == 'Pick_Up')
-            total_deliveries = sum(1 for _, row in route_by_vehicle_df.iterrows() if row['Type'] == 'Delivery')
-            current_capacity = route_by_vehicle_df['Load'].iloc[-1]
-            current_distance = route_by_vehicle_df['Distance'].iloc[-1]
-            available_distance = self.context.parameters.MAX_DISTANCE - current_distance
-            available_capacity = self.context.parameters.VEHICLE_CAPACITY - current_capacity
-            metric_object = [
-                vehicle_id, 
-                total_nodes, 
-                total_picks_ups,
-                total_deliveries,
-                current_capacity, 
-                available_capacity, 
-                current_distance, 
-                available_distance
-            ]
-            metrics.append(metric_object)
-        columns_name =['Vehicle', 'Total Nodes', 'Total Picks Ups', 'Total Deliveries', 'Current Load', 'Available Load', 'Current Distance', 'Available Distance']
-        metrics = self.IO.create_dataframe(metrics, columns_name)
+        routes_df = self.routes_df.assign(Is_Pick_Up=self.routes_df['Type'] == 'Pick_Up', Is_Delivery=self.routes_df['Type'] == 'Delivery')
+        metrics = routes_df.groupby('Vehicle', sort=False).agg(**{
+            'Total Nodes': ('Id', 'size'),
+            'Total Picks Ups': ('Is_Pick_Up', 'sum'),
+            'Total Deliveries': ('Is_Delivery', 'sum'),
+            'Current Load': ('Load', 'last'),
+            'Current Distance': ('Distance', 'last'),
+            'Stock Drawn': ('Load', 'first'),
+            'Max Load': ('Load', 'max'),
+            'Cost': ('Cost', 'last'),
+        }).reset_index()
+        metrics['Total Nodes'] -= 2 # Route start and end
+        metrics['Available Load'] = self.context.parameters.VEHICLE_CAPACITY - metrics['Current Load']
+        metrics['Available Distance'] = self.context.parameters.MAX_DISTANCE - metrics['Current Distance']
+        metrics['Load Utilisation'] = metrics['Max Load'] / self.context.parameters.VEHICLE_CAPACITY
+        metrics['Distance Utilisation'] = metrics['Current Distance'] / self.context.parameters.MAX_DISTANCE
+        metrics['Cost per km'] = (metrics['Cost'] / (metrics['Current Distance'] / 1000)).where(metrics['Current Distance'] > 0, 0.0)
+
+        columns_name = ['Vehicle', 'Total Nodes', 'Total Picks Ups', 'Total Deliveries', 'Current Load', 'Available Load', 'Current Distance', 'Available Distance',
+                        'Stock Drawn', 'Max Load', 'Load Utilisation', 'Distance Utilisation', 'Cost', 'Cost per km']
+        metrics = metrics[columns_name]
         self.IO.create_csv(metrics, self.context.output_folder + 'metrics.csv')
         return metrics
@@ -0,0 +1,118 @@
+from algorithm import Context, Instance, Solution, Parameters
+from utils import Random
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import shared_memory
+import numpy as np
+import heapq
+import math
+import time
+import os
+
+# State of each worker process, set once by initialize_worker
+worker_state = {}
+
+
+def initialize_worker(parameters: Parameters, shared_memory_name: str, shape: tuple, dtype: str, nodes_ids: list[int], demands: list[int]):
+    """
+    Attach the worker to the shared distances matrix and build its lightweight context and instance
+    """
+    distances_memory = shared_memory.SharedMemory(name=shared_memory_name)
+    distances = np.ndarray(shape, dtype=dtype, buffer=distances_memory.buf)
+    context = Context.from_parameters(parameters)
+    worker_state['distances_memory'] = distances_memory
+    worker_state['context'] = context
+    worker_state['instance'] = Instance.from_arrays(context, nodes_ids, demands, distances, parameters.seed)
+
+
+def get_iteration_seed(seed: int, iteration: int) -> int:
+    """
+    Deterministic seed of a construction iteration, derived from the execution seed.
+    It does not depend on the worker that runs the iteration
+    """
+    return int(np.random.SeedSequence([seed, iteration]).generate_state(1)[0])
+
+
+def construct_batch(first_iteration: int, last_iteration: int, deadline: float, n_best: int) -> tuple[np.ndarray, list[tuple]]:
+    """
+    Construct the solutions of a batch of iterations in a worker process
+
+    Args:
+        first_iteration (int): First iteration of the batch
+        last_iteration (int): Last iteration of the batch (excluded)
+        deadline (float): Time (time.time()) after which no new iteration starts
+        n_best (int): Number of best solutions returned
+    Returns:
+        tuple: Fitness of every solution and the serialized best solutions
+    """
+    context = worker_state['context']
+    instance = worker_state['instance']
+    fitness_values = []
+    best_solutions = [] # Max-heap on fitness through negated values
+    for iteration in range(first_iteration, last_iteration):
+        if time.time() >= deadline:
+            break
+        solution = Solution(context, instance, Random(get_iteration_seed(context.parameters.seed, iteration)))
+        solution.solve()
+        fitness_values.append(solution.fitness)
+        if len(best_solutions) < n_best:
+            heapq.heappush(best_solutions, (-solution.fitness, iteration, solution.serialize()))
+        elif solution.fitness < -best_solutions[0][0]:
+            heapq.heapreplace(best_solutions, (-solution.fitness, iteration, solution.serialize()))
+    best_solutions = [(iteration, data) for _, iteration, data in sorted(best_solutions, reverse=True)]
+    return np.array(fitness_values, dtype=np.float64), best_solutions
+
+
+class ParallelConstruction:
+    def __init__(self, context: Context, instance: Instance):
+        self.context = context
+        self.instance = instance
+        self.n_workers = self.context.parameters.N_WORKERS if self.context.parameters.N_WORKERS > 0 else os.cpu_count()
+
+
+    def get_batch_size(self) -> int:
+        """
+        Iterations per task: small enough to balance the workers and honour MAX_TIME,
+        big enough to amortize the inter-process communication
+        """
+        return max(1, min(50, self.context.parameters.MAX_ITERATIONS // (8 * self.n_workers)))
+
+
+    def construct(self, deadline: float = None):
+        """
+        Run the randomized greedy constructions across a pool of processes.
+        The distances matrix is shared, not pickled, and only compact results come back.
+
+        Args:
+            deadline (float): Time (time.time()) after which no new iteration starts, besides MAX_TIME
+        Yields:
+            tuple: For each finished batch, the fitness of every solution and the best solutions (Solution objects)
+        """
+        parameters = self.context.parameters
+        distances = np.ascontiguousarray(self.instance.distances)
+        distances_memory = shared_memory.SharedMemory(create=True, size=max(1, distances.nbytes))
+        try:
+            np.ndarray(distances.shape, dtype=distances.dtype, buffer=distances_memory.buf)[:] = distances
+            initializer_arguments = (parameters, distances_memory.name, distances.shape, distances.dtype.str, list(self.instance.nodes_ids), list(self.instance.demands))
+            deadline = min(time.time() + parameters.MAX_TIME, deadline if deadline is not None else math.inf)
+            batch_size = self.get_batch_size()
+            next_iteration = 0
+            with ProcessPoolExecutor(max_workers=self.n_workers, initializer=initialize_worker, initargs=initializer_arguments) as executor:
+                pending = set()
+                while True:
+                    # Keep two batches per worker in flight while there is iteration and time budget left
+                    while len(pending) < 2 * self.n_workers and next_iteration < parameters.MAX_ITERATIONS and time.time() < deadline:
+                        last_iteration = min(parameters.MAX_ITERATIONS, next_iteration + batch_size)
+                        pending.add(executor.submit(construct_batch, next_iteration, last_iteration, deadline, parameters.ELITE_POOL_SIZE))
+                        next_iteration = last_iteration
+                    if not pending:
+                        break
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        fitness_values, best_solutions = future.result()
+                        # Each solution gets the generator of the iteration that built it, as in the worker
+                        solutions = [Solution.deserialize(self.context, self.instance, data, Random(get_iteration_seed(parameters.seed, iteration)))
+                                     for iteration, data in best_solutions]
+                        yield fitness_values, solutions
+        finally:
+            distances_memory.close()
+            distances_memory.unlink()
@@ -10,14 +10,38 @@ class Parameters:
         parameters_dict = dict(zip(parameters_df['Parameter'], parameters_df['Value']))
         self.input_file_path = str(parameters_dict['input_file_path'])
         self.output_file_path = str(parameters_dict['output_file_path'])
+        self.cache_file_path = str(parameters_dict['cache_file_path'])
         self.here_API_key = str(parameters_dict['here_API_key'])
+        self.here_routes_URL = str(parameters_dict['here_routes_URL'])
+        self.HERE_MAX_CONCURRENCY = int(parameters_dict['HERE_MAX_CONCURRENCY'])
+        self.HERE_TIMEOUT = float(parameters_dict['HERE_TIMEOUT'])
+        self.HERE_MAX_RETRIES = int(parameters_dict['HERE_MAX_RETRIES'])
+        self.HERE_BACKOFF_FACTOR = float(parameters_dict['HERE_BACKOFF_FACTOR'])
+        self.HERE_CACHE = str(parameters_dict['HERE_CACHE']) == 'True'
+        self.HERE_CACHE_TTL_DAYS = float(parameters_dict['HERE_CACHE_TTL_DAYS'])
+        self.HERE_CACHE_MAX_ENTRIES = int(parameters_dict['HERE_CACHE_MAX_ENTRIES'])
+        self.HERE_OFFLINE = str(parameters_dict['HERE_OFFLINE']) == 'True'
         self.city_name_zip_code_list = str(parameters_dict['city_name_zip_code_list'])
         self.MAX_ITERATIONS = int(parameters_dict['MAX_ITERATIONS'])
         self.MAX_TIME = int(parameters_dict['MAX_TIME'])
+        self.TIME_LIMIT = float(parameters_dict['TIME_LIMIT'])
+        self.N_WORKERS = int(parameters_dict['N_WORKERS'])
+        self.SAVE_SNAPSHOTS = str(parameters_dict['SAVE_SNAPSHOTS']) == 'True'
+        self.SNAPSHOT_INTERVAL = float(parameters_dict['SNAPSHOT_INTERVAL'])
         self.ALGORITHM_OPTION = int(parameters_dict['ALGORITHM_OPTION'])
+        self.EXACT_TIME_LIMIT = float(parameters_dict['EXACT_TIME_LIMIT'])
+        self.EXACT_GAP = float(parameters_dict['EXACT_GAP'])
+        self.DECOMPOSITION_METHOD = str(parameters_dict['DECOMPOSITION_METHOD'])
+        self.DECOMPOSITION_CLUSTER_SIZE = int(parameters_dict['DECOMPOSITION_CLUSTER_SIZE'])
+        self.ELITE_POOL_SIZE = int(parameters_dict['ELITE_POOL_SIZE'])
+        self.ELITE_MIN_DIVERSITY = float(parameters_dict['ELITE_MIN_DIVERSITY'])
+        self.LOCAL_SEARCH_TIME = float(parameters_dict['LOCAL_SEARCH_TIME'])
+        self.N_NEIGHBOURS = int(parameters_dict['N_NEIGHBOURS'])
         self.MAX_STOCK = int(parameters_dict['MAX_STOCK'])
         self.VEHICLE_CAPACITY = int(parameters_dict['VEHICLE_CAPACITY'])
         self.MAX_DISTANCE = int(parameters_dict['MAX_DISTANCE'])
+        self.DISTANCE_METHOD = str(parameters_dict['DISTANCE_METHOD'])
+        self.USE_DISTANCE_CACHE = str(parameters_dict['USE_DISTANCE_CACHE']) == 'True'
         self.USE_ALL_FLEET = bool(parameters_dict['USE_ALL_FLEET'])
         self.n_services = int(parameters_dict['n_services'])
         self.n_vehicles = int(parameters_dict['n_vehicles'])
@@ -40,14 +64,38 @@ class Parameters:
         class_str = 'Instance seed: ' + str(self.seed) + '\n'
         class_str += 'Instance input_file_path: ' + str(self.input_file_path) + '\n'
         class_str += 'Instance output_file_path: ' + str(self.output_file_path) + '\n'
+        class_str += 'Instance cache_file_path: ' + str(self.cache_file_path) + '\n'
         class_str += 'Instance here_API_key: ' + str(self.here_API_key) + '\n'
+        class_str += 'Instance here_routes_URL: ' + str(self.here_routes_URL) + '\n'
+        class_str += 'Instance HERE_MAX_CONCURRENCY: ' + str(self.HERE_MAX_CONCURRENCY) + '\n'
+        class_str += 'Instance HERE_TIMEOUT: ' + str(self.HERE_TIMEOUT) + '\n'
+        class_str += 'Instance HERE_MAX_RETRIES: ' + str(self.HERE_MAX_RETRIES) + '\n'
+        class_str += 'Instance HERE_BACKOFF_FACTOR: ' + str(self.HERE_BACKOFF_FACTOR) + '\n'
+        class_str += 'Instance HERE_CACHE: ' + str(self.HERE_CACHE) + '\n'
+        class_str += 'Instance HERE_CACHE_TTL_DAYS: ' + str(self.HERE_CACHE_TTL_DAYS) + '\n'
+        class_str += 'Instance HERE_CACHE_MAX_ENTRIES: ' + str(self.HERE_CACHE_MAX_ENTRIES) + '\n'
+        class_str += 'Instance HERE_OFFLINE: ' + str(self.HERE_OFFLINE) + '\n'
         class_str += 'Instance city_name_zip_code_list: ' + str(self.city_name_zip_code_list) + '\n'
         class_str += 'Instance ALGORITHM_OPTION: ' + str(self.ALGORITHM_OPTION) + '\n'
+        class_str += 'Instance EXACT_TIME_LIMIT: ' + str(self.EXACT_TIME_LIMIT) + '\n'
+        class_str += 'Instance EXACT_GAP: ' + str(self.EXACT_GAP) + '\n'
+        class_str += 'Instance DECOMPOSITION_METHOD: ' + str(self.DECOMPOSITION_METHOD) + '\n'
+        class_str += 'Instance DECOMPOSITION_CLUSTER_SIZE: ' + str(self.DECOMPOSITION_CLUSTER_SIZE) + '\n'
         class_str += 'Instance MAX_ITERATIONS: ' + str(self.MAX_ITERATIONS) + '\n'
         class_str += 'Instance MAX_TIME: ' + str(self.MAX_TIME) + '\n'
+        class_str += 'Instance TIME_LIMIT: ' + str(self.TIME_LIMIT) + '\n'
+        class_str += 'Instance N_WORKERS: ' + str(self.N_WORKERS) + '\n'
+        class_str += 'Instance SAVE_SNAPSHOTS: ' + str(self.SAVE_SNAPSHOTS) + '\n'
+        class_str += 'Instance SNAPSHOT_INTERVAL: ' + str(self.SNAPSHOT_INTERVAL) + '\n'
+        class_str += 'Instance ELITE_POOL_SIZE: ' + str(self.ELITE_POOL_SIZE) + '\n'
+        class_str += 'Instance ELITE_MIN_DIVERSITY: ' + str(self.ELITE_MIN_DIVERSITY) + '\n'
+        class_str += 'Instance LOCAL_SEARCH_TIME: ' + str(self.LOCAL_SEARCH_TIME) + '\n'
+        class_str += 'Instance N_NEIGHBOURS: ' + str(self.N_NEIGHBOURS) + '\n'
         class_str += 'Instance MAX_STOCK: ' + str(self.MAX_STOCK) + '\n'
         class_str += 'Instance VEHICLE_CAPACITY: ' + str(self.VEHICLE_CAPACITY) + '\n'
         class_str += 'Instance MAX_DISTANCE: ' + str(self.MAX_DISTANCE) + '\n'
+        class_str += 'Instance DISTANCE_METHOD: ' + str(self.DISTANCE_METHOD) + '\n'
+        class_str += 'Instance USE_DISTANCE_CACHE: ' + str(self.USE_DISTANCE_CACHE) + '\n'
         class_str += 'Instance USE_ALL_FLEET: ' + str(self.USE_ALL_FLEET) + '\n'
         class_str += 'Instance n_services: ' + str(self.n_services) + '\n'
         class_str += 'Instance n_vehicles: ' + str(self.n_vehicles) + '\n'
@@ -2,106 +2,71 @@ from utils import IO
 from algorithm import Context, Instance, Solution
 from .Metrics import Metrics
 from .Map import Map
+import numpy as np
+import pandas as pd
 
 class Results:
-    def __init__(self, context: Context, instance: Instance, solution: Solution):
+    def __init__(self, context: Context, instance: Instance, solution: Solution, draw_map: bool = True):
         self.IO = IO()
         self.context = context
         self.instance = instance
         self.solution = solution
         self.routes_df = self.save_solution_routes()
         self.metrics = Metrics(context, instance, self.routes_df).calculate_metrics()
-        self.map = Map(context, instance, solution, self.routes_df, self.metrics)
+        self.map = Map(context, instance, solution, self.routes_df, self.metrics) if draw_map else None
         self.solution_validation()
 
 
     def save_solution_routes(self):
         """
-        Save the solution routes
+        Save the solution routes. Every vehicle gets a start row, one row per visited node and an end row.
+        Node attributes are gathered by row position (Id -> row index) and the load and distance are
+        cumulated per vehicle, without any loop over the stops
         """
-        solution_routes = []
-        for v, vehicle in enumerate(self.solution.routes):
-            if not vehicle:  # Check if the route is empty
-                continue  # Skip to the next vehicle if the route is empty
-            distance = 0
-            vehicle_index = v + 1
-            last_node = 0
-            load = self.solution.vehicles_initial_load[v]
-            depot_start_object = [
-                vehicle_index,
-                'Route Start',
-                '-',
-                0,
-                self.instance.depot_df['Name'].values[0],
-                self.instance.depot_df['Address'].values[0],
-                self.instance.depot_df['Location'].values[0],
-                self.instance.depot_df['Province'].values[0],
-                self.instance.depot_df['Zip_Code'].values[0],
-                self.instance.depot_df['Node_Type'].values[0],
-                self.instance.depot_df['Latitude'].values[0],
-                self.instance.depot_df['Longitude'].values[0],
-                load,
-                distance,
-                0
-            ]
-            solution_routes.append(depot_start_object)
-            for node in vehicle:
-                node_df = self.instance.nodes_df[self.instance.nodes_df['Id'] == node].iloc[0]
-                order_id = node_df['Id']
-                distance += self.instance.distances[last_node, order_id]
-                load += node_df['Items']
-                order_items = node_df['Items']
-                order_type = 'Pick_Up' if order_items > 0 else 'Delivery'
-                node_name = node_df['Name']
-                node_address = node_df['Address']
-                node_location = node_df['Location']
-                node_province = node_df['Province']
-                node_zip_code = node_df['Zip_Code']
-                node_type = node_df['Node_Type']
-                node_latitude = node_df['Latitude']
-                node_longitude = node_df['Longitude']
-                route_object = [
-                    vehicle_index,
-                    order_id,
-                    order_type,
-                    order_items,
-                    node_name,
-                    node_address,
-                    node_location,
-                    node_province,
-                    node_zip_code,
-                    node_type,
-                    node_latitude,
-                    node_longitude,
-                    load,
-                    distance,
-                    0
-                ]
-                last_node = order_id
-                solution_routes.append(route_object)
-            distance += self.instance.distances[last_node, 0]
-            cost = self.instance.calculate_total_cost(distance)
-            depot_end_object = [
-                vehicle_index,
-                'Route End',
-                '-',
-                0,
-                self.instance.depot_df['Name'].values[0],
-                self.instance.depot_df['Address'].values[0],
-                self.instance.depot_df['Location'].values[0],
-                self.instance.depot_df['Province'].values[0],
-                self.instance.depot_df['Zip_Code'].values[0],
-                self.instance.depot_df['Node_Type'].values[0],
-                self.instance.depot_df['Latitude'].values[0],
-                self.instance.depot_df['Longitude'].values[0],
-                load,
-                distance,
-                cost
-            ]
-            solution_routes.append(depot_end_object)
-
         columns_name = ['Vehicle', 'Id', 'Type', 'Items', 'Name', 'Address', 'Location', 'Province', 'Zip_Code', 'Node_Type', 'Latitude', 'Longitude', 'Load', 'Distance', 'Cost']
-        routes_df = self.IO.create_dataframe(solution_routes, columns_name)
+        solution_routes = self.solution.routes
+        vehicles = [v for v, route in enumerate(solution_routes) if route]
+        routes = [np.asarray(solution_routes[v], dtype=np.int64) for v in vehicles]
+        route_lengths = np.array([len(route) for route in routes], dtype=np.int64) + 2 # Start and end rows
+        n_rows = int(route_lengths.sum())
+        starts = np.cumsum(route_lengths) - route_lengths
+        ends = starts + route_lengths - 1
+        is_node = np.ones(n_rows, dtype=bool)
+        is_node[starts] = False
+        is_node[ends] = False
+
+        # Stops (node ids, the depot on start and end rows) and their rows in nodes_df
+        stops = np.zeros(n_rows, dtype=np.int64)
+        stops[is_node] = np.concatenate(routes) if routes else []
+        nodes_df = self.instance.nodes_df
+        rows = pd.Index(nodes_df['Id']).get_indexer(stops)
+
+        # Cumulative load and distance per vehicle: global cumulative sums minus their value at the start row
+        items = np.where(is_node, nodes_df['Items'].to_numpy()[rows], 0)
+        legs = np.zeros(n_rows, dtype=np.int64)
+        legs[1:] = self.instance.distances[stops[:-1], stops[1:]]
+        legs[starts] = 0
+        cumulative_items = np.cumsum(items)
+        cumulative_legs = np.cumsum(legs)
+        load = np.repeat(np.asarray(self.solution.vehicles_initial_load)[vehicles], route_lengths) + cumulative_items - np.repeat(cumulative_items[starts], route_lengths)
+        distance = cumulative_legs - np.repeat(cumulative_legs[starts], route_lengths)
+        cost = np.zeros(n_rows)
+        cost[ends] = self.instance.calculate_total_cost(distance[ends])
+
+        order_ids = nodes_df['Id'].to_numpy().astype(object)[rows]
+        order_ids[starts] = 'Route Start'
+        order_ids[ends] = 'Route End'
+        routes_df = pd.DataFrame({
+            'Vehicle': np.repeat(np.asarray(vehicles, dtype=np.int64) + 1, route_lengths),
+            'Id': order_ids,
+            'Type': np.where(is_node, np.where(items > 0, 'Pick_Up', 'Delivery'), '-').tolist(),
+            'Items': items,
+        })
+        for column in columns_name[4:12]:
+            routes_df[column] = nodes_df[column].take(rows).reset_index(drop=True)
+        routes_df['Load'] = load
+        routes_df['Distance'] = distance
+        routes_df['Cost'] = cost
         self.IO.create_csv(routes_df, self.context.output_folder + 'solution_routes.csv')
         return routes_df
 
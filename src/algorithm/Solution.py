@@ -1,24 +1,187 @@
-from algorithm import Instance, Context
+from algorithm import Instance, Context, FeasibilityIndex
 from utils import Random
+import numpy as np
 
 class Solution:
-    def __init__(self, context: Context, instance: Instance):
-        self.random = Random()
+    __slots__ = ('random', 'context', 'instance', 'tour', 'route_offsets', 'unserved_mask', 'n_unserved', 'current_capacity', 'current_distance',
+                 'vehicles_initial_load', 'current_stock', 'total_distance', 'storage_cost', 'fitness', 'feasibility_index')
+
+    def __init__(self, context: Context, instance: Instance, random: Random = None):
+        self.random = random if random is not None else Random()
         self.context = context
         self.instance = instance
         self.initialize_solution()
 
 
     def initialize_solution(self):
-        self.routes = [[] for _ in range(self.context.parameters.n_vehicles)]
-        self.unserved = set(self.instance.nodes_ids[1:])
-        self.current_capacity = [0] * self.context.parameters.n_vehicles
-        self.current_distance = [0] * self.context.parameters.n_vehicles
-        self.vehicles_initial_load = [0] * self.context.parameters.n_vehicles
+        """
+        Routes are stored as a giant tour: the nodes of vehicle v are tour[route_offsets[v]:route_offsets[v + 1]]
+        """
+        n_nodes = len(self.instance.nodes_ids)
+        n_vehicles = self.context.parameters.n_vehicles
+        self.tour = np.zeros(n_nodes - 1, dtype=np.int32)
+        self.route_offsets = np.zeros(n_vehicles + 1, dtype=np.int32)
+        self.unserved_mask = np.ones(n_nodes, dtype=bool)
+        self.unserved_mask[0] = False # Depot
+        self.n_unserved = n_nodes - 1
+        self.current_capacity = np.zeros(n_vehicles, dtype=np.int64)
+        self.current_distance = np.zeros(n_vehicles, dtype=np.int64)
+        self.vehicles_initial_load = np.zeros(n_vehicles, dtype=np.int64)
         self.current_stock = self.context.parameters.MAX_STOCK * 0.8
         self.total_distance = 0
         self.storage_cost = 0
         self.fitness = 0
+        self.feasibility_index = None
+
+
+    @property
+    def routes(self) -> list[list[int]]:
+        """
+        Routes per vehicle as lists of nodes
+        """
+        return [self.get_route(vehicle).tolist() for vehicle in range(len(self.route_offsets) - 1)]
+
+
+    @property
+    def unserved(self) -> set[int]:
+        """
+        Set of unserved nodes
+        """
+        return set(np.flatnonzero(self.unserved_mask).tolist())
+
+
+    def get_route(self, vehicle: int) -> np.ndarray:
+        """
+        Nodes of the route of a vehicle (view over the giant tour)
+
+        Args:
+            vehicle (int): Vehicle index
+        Returns:
+            np.ndarray: Route nodes
+        """
+        return self.tour[self.route_offsets[vehicle]:self.route_offsets[vehicle + 1]]
+
+
+    def get_route_length(self, vehicle: int) -> int:
+        """
+        Number of nodes in the route of a vehicle
+
+        Args:
+            vehicle (int): Vehicle index
+        Returns:
+            int: Route length
+        """
+        return int(self.route_offsets[vehicle + 1] - self.route_offsets[vehicle])
+
+
+    def set_routes(self, routes: list[list[int]]):
+        """
+        Replace the routes of the solution, updating the giant tour and the unserved nodes
+
+        Args:
+            routes (list): Nodes of each vehicle route
+        """
+        lengths = [len(route) for route in routes]
+        self.route_offsets[0] = 0
+        self.route_offsets[1:] = np.cumsum(lengths)
+        served = np.concatenate([np.asarray(route, dtype=np.int32) for route in routes]) if routes else np.zeros(0, dtype=np.int32)
+        self.tour[:len(served)] = served
+        self.unserved_mask[:] = True
+        self.unserved_mask[0] = False
+        self.unserved_mask[served] = False
+        self.n_unserved = int(self.unserved_mask.sum())
+
+
+    def evaluate_routes(self):
+        """
+        Recalculate loads, distances, stock and fitness from the current routes
+        """
+        distances = self.instance.distances
+        demands = np.asarray(self.instance.demands, dtype=np.int64)
+        self.current_stock = self.context.parameters.MAX_STOCK * 0.8
+        self.total_distance = 0
+        for vehicle in range(len(self.route_offsets) - 1):
+            path = np.concatenate(([0], self.get_route(vehicle), [0]))
+            loads = np.cumsum(demands[path])
+            initial_load = max(0, -int(loads.min()))
+            self.vehicles_initial_load[vehicle] = initial_load
+            self.current_capacity[vehicle] = initial_load + int(loads[-1])
+            self.current_distance[vehicle] = int(distances[path[:-1], path[1:]].astype(np.int64).sum()) if len(path) > 2 else 0
+            self.current_stock -= initial_load
+            self.total_distance += int(self.current_distance[vehicle])
+        self.storage_cost = self.instance.calculate_storage_cost(self.current_stock)
+        self.fitness = self.instance.get_solution_value(self.total_distance, self.current_stock, self.n_unserved)
+
+
+    def clone(self) -> 'Solution':
+        """
+        Copy of the solution sharing context, instance and random but not the route arrays
+
+        Returns:
+            Solution: Cloned solution
+        """
+        solution = Solution.__new__(Solution)
+        solution.random = self.random
+        solution.context = self.context
+        solution.instance = self.instance
+        solution.tour = self.tour.copy()
+        solution.route_offsets = self.route_offsets.copy()
+        solution.unserved_mask = self.unserved_mask.copy()
+        solution.n_unserved = self.n_unserved
+        solution.current_capacity = self.current_capacity.copy()
+        solution.current_distance = self.current_distance.copy()
+        solution.vehicles_initial_load = self.vehicles_initial_load.copy()
+        solution.current_stock = self.current_stock
+        solution.total_distance = self.total_distance
+        solution.storage_cost = self.storage_cost
+        solution.fitness = self.fitness
+        solution.feasibility_index = None
+        return solution
+
+
+    def serialize(self) -> tuple:
+        """
+        Compact, picklable representation of the solution (no context nor instance)
+
+        Returns:
+            tuple: Solution data
+        """
+        length = int(self.route_offsets[-1])
+        return (self.tour[:length].copy(), self.route_offsets.copy(), self.current_capacity.copy(), self.current_distance.copy(), self.vehicles_initial_load.copy(),
+                self.current_stock, self.total_distance, self.storage_cost, self.fitness)
+
+
+    @classmethod
+    def deserialize(cls, context: Context, instance: Instance, data: tuple, random: Random = None) -> 'Solution':
+        """
+        Rebuild a solution from the output of serialize
+
+        Args:
+            context (Context): Context
+            instance (Instance): Instance
+            data (tuple): Serialized solution
+            random (Random): Random generator of the solution, a new one if None
+        Returns:
+            Solution: Solution
+        """
+        solution = cls.__new__(cls)
+        solution.random = random if random is not None else Random()
+        solution.context = context
+        solution.instance = instance
+        solution.initialize_solution()
+        tour, route_offsets, current_capacity, current_distance, vehicles_initial_load, current_stock, total_distance, storage_cost, fitness = data
+        solution.tour[:len(tour)] = tour
+        solution.route_offsets[:] = route_offsets
+        solution.unserved_mask[tour] = False
+        solution.n_unserved = int(solution.unserved_mask.sum())
+        solution.current_capacity[:] = current_capacity
+        solution.current_distance[:] = current_distance
+        solution.vehicles_initial_load[:] = vehicles_initial_load
+        solution.current_stock = current_stock
+        solution.total_distance = total_distance
+        solution.storage_cost = storage_cost
+        solution.fitness = fitness
+        return solution
 
 
     def solve(self):
@@ -26,12 +189,14 @@ class Solution:
         Solve the cash pickup and delivery problem using a greedy approach.
         """
         # Assign routes using a greedy approach
+        self.feasibility_index = FeasibilityIndex(self.context, self.instance)
         for vehicle in range(self.context.parameters.n_vehicles):
             previous_node = 0
-            while self.unserved:
+            self.feasibility_index.start_vehicle()
+            while self.n_unserved > 0:
                 # Find the nearest feasible node
                 candidate_nodes = self.find_feasible_nodes(previous_node, vehicle)
-                if not candidate_nodes:
+                if len(candidate_nodes[0]) == 0:
                     break  # No more feasible nodes for this vehicle
 
                 # Select the next node to visit
@@ -41,59 +206,51 @@ class Solution:
                 previous_node = self.add_node_to_route(node, vehicle, distance, self.instance.demands[node])
                     
             # Return to depot
-            if self.routes[vehicle]:
-                self.total_distance += self.instance.distances[previous_node][0]
-                self.current_distance[vehicle] += self.instance.distances[previous_node][0]
+            if self.get_route_length(vehicle) > 0:
+                self.total_distance += int(self.instance.distances[previous_node][0])
+                self.current_distance[vehicle] += int(self.instance.distances[previous_node][0])
                 # print(f"Vehicle {vehicle}, nodes: {self.routes[vehicle]}, distance: {self.current_distance[vehicle]}, capacity: {self.current_capacity[vehicle]}, stock: {self.current_stock}")
 
         # Calculate storage stock and total cost
+        self.feasibility_index = None
         self.storage_cost = self.instance.calculate_storage_cost(self.current_stock)
-        self.fitness = self.instance.get_solution_value(self.total_distance, self.current_stock, len(self.unserved))
+        self.fitness = self.instance.get_solution_value(self.total_distance, self.current_stock, self.n_unserved)
         # self.print_solution()
 
 
-    def find_feasible_nodes(self, previous_node , vehicle) -> list:
+    def find_feasible_nodes(self, previous_node , vehicle) -> tuple[np.ndarray, np.ndarray]:
         """
-        Find the feasible nodes for a given vehicle. Ensuring capacity, mileage, and stock constraints
+        Find the feasible nodes for a given vehicle. Ensuring capacity, mileage, and stock constraints.
+        Once the route has started, the next node is the closest feasible one unless the stock penalty
+        can apply, so only the nearest neighbours of previous_node need to be checked
 
         Args:
             previous_node (int): Previous node
             vehicle (int): Vehicle index
         Returns:
-            list: Candidate nodes
-        """
-        candidate_nodes = []
-        depot_node = 0  # Assuming the depot is node 0
-        for node in self.unserved:
-            # Check distance constraint
-            distance = self.instance.distances[previous_node][node]
-            if self.current_distance[vehicle] + distance + self.instance.distances[node][depot_node] <= self.context.parameters.MAX_DISTANCE:
-                # Check capacity constraint
-                demand = self.instance.demands[node]
-                value_to_add = self.current_capacity[vehicle] + demand
-                if demand < 0: # Delivery node
-                    if value_to_add <= self.current_stock and value_to_add <= self.context.parameters.VEHICLE_CAPACITY: # Check if the depot has enough stock to deliver the demand:
-                        candidate_nodes.append((node, distance))
-                else: # Pickup node
-                    if value_to_add <= self.context.parameters.VEHICLE_CAPACITY:
-                        candidate_nodes.append((node, distance))
-        return candidate_nodes
+            tuple: Candidate nodes and their distances from previous_node
+        """
+        if self.get_route_length(vehicle) > 0 and self.current_stock + self.feasibility_index.max_demand <= self.context.parameters.MAX_STOCK:
+            candidate_nodes = self.feasibility_index.find_nearest_feasible_nodes(previous_node, self.current_distance[vehicle], self.current_capacity[vehicle], self.current_stock)
+            if candidate_nodes is not None:
+                return candidate_nodes
+        return self.feasibility_index.find_feasible_nodes(previous_node, self.current_distance[vehicle], self.current_capacity[vehicle], self.current_stock)
         
 
-    def select_next_node(self, candidate_nodes: list, vehicle: int) -> tuple:
+    def select_next_node(self, candidate_nodes: tuple[np.ndarray, np.ndarray], vehicle: int) -> tuple:
         """
         Select the next node to visit: prioritize nodes that minimize storage cost and maximize service completion
 
         Args:
-            candidate_nodes (list): Candidate nodes
+            candidate_nodes (tuple): Candidate nodes and their distances
             vehicle (int): Vehicle index
         Returns:
             tuple: Next node and distance
         """
-
-        if len(self.routes[vehicle]) == 0:
-            node, distance = self.random.get_random_choice(candidate_nodes)
-            return node, distance
+        nodes, distances = candidate_nodes
+        if self.get_route_length(vehicle) == 0:
+            position = self.random.get_random_choice(range(len(nodes)))
+            return int(nodes[position]), int(distances[position])
 
         # Define weights for each factor
         weight_distance = self.random.get_random_float(0.3, 0.8)
@@ -113,25 +270,22 @@ class Solution:
         weight_stock_penalty_normalized = weight_stock_penalty / total_weight
         dynamic_weight_return_to_depot_normalized = dynamic_weight_return_to_depot / total_weight
 
-        def evaluate_candidate(node_distance_tuple):
-            node, distance = node_distance_tuple  # Node and distance
-            stock_after_visit = self.current_stock + self.instance.demands[node]  # Stock after visit
-            stock_penalty = max(0, stock_after_visit - self.context.parameters.MAX_STOCK)  # Stock penalty
-            
-            # Combine factors with weights
-            return (
-                weight_distance_normalized * distance +
-                weight_stock_penalty_normalized * stock_penalty +
-                dynamic_weight_return_to_depot_normalized * distance
-            )
-
-        node, distance = min(candidate_nodes, key=evaluate_candidate)
-        return node, distance
+        # Combine factors with weights
+        stock_after_visit = self.current_stock + self.feasibility_index.demands[nodes]  # Stock after visit
+        stock_penalty = np.maximum(0, stock_after_visit - self.context.parameters.MAX_STOCK)  # Stock penalty
+        scores = (
+            weight_distance_normalized * distances +
+            weight_stock_penalty_normalized * stock_penalty +
+            dynamic_weight_return_to_depot_normalized * distances
+        )
+        position = np.argmin(scores)
+        return int(nodes[position]), int(distances[position])
     
     
     def add_node_to_route(self, node: int, vehicle: int, distance: float, demand: int):
         """
-        Add a node to the route of a vehicle
+        Add a node to the route of a vehicle. Routes are built one vehicle after another,
+        so the node is appended at the end of the giant tour
 
         Args:
             node (int): Node to add
@@ -143,9 +297,13 @@ class Solution:
         """
         self.current_capacity[vehicle] += demand
         self.current_distance[vehicle] += distance
-        self.routes[vehicle].append(node)
+        end = self.route_offsets[vehicle + 1]
+        self.tour[end] = node
+        self.route_offsets[vehicle + 1:] = end + 1
         self.total_distance += distance
-        self.unserved.remove(node)
+        self.unserved_mask[node] = False
+        self.n_unserved -= 1
+        self.feasibility_index.remove_node(node)
 
         # Delivery node
         if demand < 0:
@@ -172,9 +330,9 @@ class Solution:
         print(f"Fitness: {self.fitness}")
         print(f"Current stock: {self.current_stock}")
         print(f"Unserved: {self.unserved}")
-        print(f"Current capacity: {self.current_capacity}")
-        print(f"Current distance: {self.current_distance}")
-        print(f"Vehicles initial load: {self.vehicles_initial_load}")
+        print(f"Current capacity: {self.current_capacity.tolist()}")
+        print(f"Current distance: {self.current_distance.tolist()}")
+        print(f"Vehicles initial load: {self.vehicles_initial_load.tolist()}")
         print("-----------------------------------------------------------------------------------")
     
 
@@ -1,8 +1,16 @@
 from .Parameters import Parameters
 from .Context import Context
+from .MatrixCache import MatrixCache
 from .Instance import Instance
+from .InstanceGenerator import InstanceGenerator
+from .FeasibilityIndex import FeasibilityIndex
 from .Solution import Solution
 from .ExactSolution import ExactSolution
+from .CompactExactSolution import CompactExactSolution
+from .ElitePool import ElitePool
+from .LocalSearch import LocalSearch
+from .ParallelConstruction import ParallelConstruction
+from .Decomposition import Decomposition
 from .Algorithm import Algorithm
 from .Results import Results
 from .Map import Map
@@ -0,0 +1,269 @@
+import argparse
+import datetime
+import json
+import logging
+import math
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+from algorithm import Context, Instance, InstanceGenerator, Algorithm, Solution, ExactSolution, CompactExactSolution, LocalSearch, Results, Map
+from utils import IO, Random
+
+
+def get_peak_rss_mb() -> float:
+    """
+    Peak resident memory of the process in MB since it started (Linux reports KB, macOS bytes)
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 2 ** 20 if platform.system() == 'Darwin' else peak_rss / 2 ** 10
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak resident memory of the process (VmHWM) to its current resident memory. Linux only
+
+    Returns:
+        bool: True if the peak was reset
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def get_stage_peak_rss_mb() -> float:
+    """
+    Peak resident memory of the process in MB since the last reset_peak_rss
+    """
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 2 ** 10
+    return None
+
+
+def get_git_commit() -> str:
+    """
+    Current git commit, None outside a git repository
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure_stage(stage_function, trace_memory: bool) -> tuple:
+    """
+    Run a benchmark stage measuring its wall time and memory: the peak resident memory during the stage (Linux,
+    it includes the memory already in use when the stage starts) and the peak of the whole process so far.
+    tracemalloc slows down pure Python code, so traced memory is only measured on demand
+
+    Args:
+        stage_function (function): Stage to run
+        trace_memory (bool): Measure the peak of the memory allocated by the stage
+    Returns:
+        tuple: Stage result and measures
+    """
+    if trace_memory:
+        tracemalloc.start()
+    peak_rss_reset = reset_peak_rss()
+    start_time = time.perf_counter()
+    result = stage_function()
+    measures = {'wall_time': time.perf_counter() - start_time, 'stage_peak_rss_mb': get_stage_peak_rss_mb() if peak_rss_reset else None,
+                'process_peak_rss_mb': get_peak_rss_mb()}
+    if trace_memory:
+        measures['peak_traced_mb'] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return result, measures
+
+
+def add_stage_result(report_results: list, n_nodes: int, stage: str, measures: dict, iterations: int = None, best_fitness: float = None):
+    """
+    Add the measures of a stage to the report and print them
+    """
+    stage_result = {'n_nodes': n_nodes, 'stage': stage}
+    stage_result.update(measures)
+    stage_result['iterations'] = iterations
+    stage_result['iterations_per_second'] = iterations / measures['wall_time'] if iterations is not None and measures['wall_time'] > 0 else None
+    stage_result['best_fitness'] = float(best_fitness) if best_fitness is not None else None
+    report_results.append(stage_result)
+    print(f"n={n_nodes:<6} {stage:<13} {measures['wall_time']:10.4f}s  rss={measures['stage_peak_rss_mb'] or measures['process_peak_rss_mb']:9.1f}MB  iterations={iterations}  fitness={stage_result['best_fitness']}")
+
+
+def configure_context(context: Context, n_nodes: int, folder_path: str, arguments: argparse.Namespace):
+    """
+    Adapt the parameters to a synthetic instance. The fleet keeps the ratio of the real instance (15 vehicles, 115 nodes)
+    """
+    parameters = context.parameters
+    parameters.input_file_path = folder_path
+    parameters.n_vehicles = max(1, math.ceil(n_nodes * 15 / 115))
+    parameters.MAX_ITERATIONS = arguments.iterations
+    parameters.MAX_TIME = arguments.max_time
+    parameters.N_WORKERS = arguments.workers
+    parameters.ALGORITHM_OPTION = 1
+    parameters.LOCAL_SEARCH_TIME = 0 # Measured in its own stage
+    parameters.USE_DISTANCE_CACHE = arguments.use_cache
+    parameters.SAVE_SNAPSHOTS = False
+    context.output_folder = folder_path
+
+
+def benchmark_size(context: Context, n_nodes: int, arguments: argparse.Namespace, report_results: list):
+    """
+    Benchmark every stage of the solver on a synthetic instance of n_nodes nodes
+    """
+    benchmark_folder = context.parameters.output_file_path + 'benchmark/'
+    folder_path = benchmark_folder + 'n_' + str(n_nodes) + '/'
+    IO().create_folder_if_not_exist(folder_path)
+    generator = InstanceGenerator(context)
+    generator.save_nodes(generator.generate_nodes(n_nodes, arguments.seed), folder_path)
+    configure_context(context, n_nodes, folder_path, arguments)
+    Random(arguments.seed)
+
+    instance, measures = measure_stage(lambda: Instance(context), arguments.trace_memory)
+    add_stage_result(report_results, n_nodes, 'instance', measures)
+
+    def solve():
+        solution = Solution(context, instance, Random(arguments.seed))
+        solution.solve()
+        return solution
+    solution, measures = measure_stage(solve, arguments.trace_memory)
+    add_stage_result(report_results, n_nodes, 'solve', measures, 1, solution.fitness)
+
+    algorithm, measures = measure_stage(lambda: Algorithm(context, instance), arguments.trace_memory)
+    add_stage_result(report_results, n_nodes, 'construct', measures, algorithm.fitness_statistics.count, algorithm.best_fitness)
+    best_solution = algorithm.best_solution
+
+    if arguments.local_search_time > 0:
+        local_search = LocalSearch(context, instance)
+        best_solution, measures = measure_stage(lambda: local_search.improve(algorithm.best_solution.clone(), arguments.local_search_time), arguments.trace_memory)
+        add_stage_result(report_results, n_nodes, 'local_search', measures, local_search.evaluations, best_solution.fitness)
+
+    if n_nodes <= arguments.exact_max_nodes:
+        def solve_exact():
+            exact_solution = ExactSolution(context, instance)
+            exact_solution.solve()
+            return exact_solution
+        exact_solution, measures = measure_stage(solve_exact, arguments.trace_memory)
+        measures.update({stage + '_time': seconds for stage, seconds in exact_solution.timings.items()})
+        add_stage_result(report_results, n_nodes, 'exact', measures, 1, exact_solution.fitness)
+
+    if n_nodes <= arguments.compact_exact_max_nodes:
+        def solve_compact_exact():
+            compact_exact_solution = CompactExactSolution(context, instance)
+            compact_exact_solution.solve()
+            return compact_exact_solution
+        compact_exact_solution, measures = measure_stage(solve_compact_exact, arguments.trace_memory)
+        measures.update({stage + '_time': seconds for stage, seconds in compact_exact_solution.timings.items()})
+        add_stage_result(report_results, n_nodes, 'compact_exact', measures, compact_exact_solution.statistics['rounds'], compact_exact_solution.fitness)
+
+    results, measures = measure_stage(lambda: Results(context, instance, best_solution, draw_map=False), arguments.trace_memory)
+    add_stage_result(report_results, n_nodes, 'results', measures)
+
+    if arguments.map:
+        _, measures = measure_stage(lambda: Map(context, instance, best_solution, results.routes_df, results.metrics), arguments.trace_memory)
+        add_stage_result(report_results, n_nodes, 'map', measures)
+
+
+def check_algorithm_options(context: Context, arguments: argparse.Namespace) -> bool:
+    """
+    Run the algorithm and the results of every ALGORITHM_OPTION on a small synthetic instance, so that every
+    kind of solution (greedy, exact, compact exact, hybrid, decomposition) goes through Results
+
+    Returns:
+        bool: True if every option succeeded
+    """
+    n_nodes = arguments.check_nodes
+    folder_path = context.parameters.output_file_path + 'benchmark/check_' + str(n_nodes) + '/'
+    IO().create_folder_if_not_exist(folder_path)
+    generator = InstanceGenerator(context)
+    generator.save_nodes(generator.generate_nodes(n_nodes, arguments.seed), folder_path)
+    configure_context(context, n_nodes, folder_path, arguments)
+    parameters = context.parameters
+    parameters.DECOMPOSITION_CLUSTER_SIZE = max(2, n_nodes // 2)
+    instance = Instance(context)
+    succeeded = True
+    for option in range(1, 6):
+        parameters.ALGORITHM_OPTION = option
+        start_time = time.perf_counter()
+        try:
+            algorithm = Algorithm(context, instance)
+            results = Results(context, instance, algorithm.best_solution, draw_map=False)
+            print(f"ALGORITHM_OPTION {option}: OK, {len(results.routes_df)} route rows, fitness={algorithm.best_fitness}, {time.perf_counter() - start_time:.2f}s")
+        except Exception as e:
+            succeeded = False
+            print(f"ALGORITHM_OPTION {option}: FAILED, {type(e).__name__}: {e}")
+    return succeeded
+
+
+def compare_reports(previous_report: dict, report: dict):
+    """
+    Print the speedup of every stage with respect to a previous report
+    """
+    previous_times = {(result['n_nodes'], result['stage']): result['wall_time'] for result in previous_report['results']}
+    print(f"Comparison with commit {previous_report['metadata'].get('commit')}:")
+    for result in report['results']:
+        previous_time = previous_times.get((result['n_nodes'], result['stage']))
+        if previous_time is not None and result['wall_time'] > 0:
+            print(f"n={result['n_nodes']:<6} {result['stage']:<13} {previous_time:10.4f}s -> {result['wall_time']:10.4f}s  speedup={previous_time / result['wall_time']:.2f}x")
+
+
+def execute(arguments: argparse.Namespace):
+    """
+    Executes the benchmark suite and writes the JSON report
+    """
+    context = Context()
+    context.logger.set_log_level(logging.WARNING)
+    report = {
+        'metadata': {
+            'commit': get_git_commit(),
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'arguments': vars(arguments),
+        },
+        'results': [],
+    }
+    IO().create_folder_if_not_exist(context.parameters.output_file_path + 'benchmark/')
+    if arguments.check_options:
+        if not check_algorithm_options(context, arguments):
+            raise SystemExit(1)
+        return
+    for n_nodes in arguments.sizes:
+        benchmark_size(context, n_nodes, arguments, report['results'])
+
+    output_path = arguments.output or context.parameters.output_file_path + 'benchmark/benchmark_' + str(report['metadata']['commit']) + '.json'
+    IO().write_json_atomic(report, output_path)
+    print(f"Benchmark report saved in {output_path}")
+    if arguments.compare:
+        with open(arguments.compare, encoding='utf-8') as file:
+            compare_reports(json.load(file), report)
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Benchmark of the solver stages on synthetic instances. Run from the repository root.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000], help='Instance sizes (nodes, depot included)')
+    parser.add_argument('--iterations', type=int, default=50, help='Greedy constructions of the construct stage')
+    parser.add_argument('--max-time', type=int, default=300, help='Time limit of the construct stage (s)')
+    parser.add_argument('--local-search-time', type=float, default=10, help='Time limit of the local search stage (s), 0 to skip it')
+    parser.add_argument('--workers', type=int, default=1, help='Construction workers (N_WORKERS)')
+    parser.add_argument('--exact-max-nodes', type=int, default=10, help='Largest instance solved by ExactSolution')
+    parser.add_argument('--compact-exact-max-nodes', type=int, default=100, help='Largest instance solved by CompactExactSolution (EXACT_TIME_LIMIT applies)')
+    parser.add_argument('--map', action='store_true', help='Benchmark the map (calls the HERE API)')
+    parser.add_argument('--use-cache', action='store_true', help='Use the distances cache')
+    parser.add_argument('--trace-memory', action='store_true', help='Measure the peak memory of each stage with tracemalloc (slower)')
+    parser.add_argument('--check-options', action='store_true', help='Only check that the algorithm and the results run with every ALGORITHM_OPTION')
+    parser.add_argument('--check-nodes', type=int, default=8, help='Instance size of --check-options (nodes, depot included)')
+    parser.add_argument('--seed', type=int, default=1234567, help='Seed of the instances and the solver')
+    parser.add_argument('--output', help='Report path (default: <output_file_path>/benchmark/benchmark_<commit>.json)')
+    parser.add_argument('--compare', help='Previous report to compare with')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    execute(parse_arguments())
@@ -0,0 +1,60 @@
+import argparse
+import glob
+import os
+import time
+from algorithm import Context, Instance
+from utils import IO, Folium
+
+
+def convert_nodes_file(context: Context, csv_path: str, compute_arrays: bool):
+    """
+    Convert a nodes CSV file into the binary instance format: <name>.parquet with all the node attributes
+    and <name>.npz with the neighbours (<name>.distances.npy with the distances), next to the CSV file
+
+    Args:
+        context (Context): Context
+        csv_path (str): Path to the nodes CSV file
+        compute_arrays (bool): Also compute and store the distances and neighbours
+    """
+    start_time = time.perf_counter()
+    folder_path, file_name = os.path.split(csv_path)
+    nodes_file_name = os.path.splitext(file_name)[0]
+    nodes_df = IO().read_csv(csv_path, separator=';', decimal=',', encoding='latin-1')
+    IO().create_parquet(nodes_df, os.path.join(folder_path, nodes_file_name))
+
+    if compute_arrays:
+        context.parameters.input_file_path = folder_path
+        instance = Instance(context, nodes_file_name)
+        instance.save_arrays(instance.arrays_file_path)
+    print(f"{csv_path}: {len(nodes_df)} nodes converted in {time.perf_counter() - start_time:.2f}s")
+
+
+def execute(arguments: argparse.Namespace):
+    """
+    Converts the nodes files of the input folder
+    """
+    context = Context()
+    input_folder = arguments.input_folder or context.parameters.input_file_path
+    csv_paths = sorted(glob.glob(os.path.join(input_folder, arguments.pattern)))
+    if not csv_paths:
+        print(f"No files match {os.path.join(input_folder, arguments.pattern)}")
+    for csv_path in csv_paths:
+        convert_nodes_file(context, csv_path, not arguments.no_arrays)
+    if arguments.zip_codes:
+        # The map reads the simplified zip codes from the cache, building them the first time they are drawn
+        start_time = time.perf_counter()
+        zip_codes_data = Folium().get_simplified_spain_zip_codes(os.path.join(input_folder, 'map/'), context.parameters.cache_file_path + 'zip_codes/', check_modified=True)
+        print(f"{len(zip_codes_data)} zip codes provinces simplified in {time.perf_counter() - start_time:.2f}s")
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Convert the nodes CSV files into the binary instance format (Parquet and npz). Run from the repository root.')
+    parser.add_argument('--input-folder', help='Folder of the nodes files (default: input_file_path)')
+    parser.add_argument('--pattern', default='nodes.csv', help='Nodes files to convert, glob patterns allowed (e.g. "nodes*.csv")')
+    parser.add_argument('--no-arrays', action='store_true', help='Only write the Parquet files, without distances and neighbours')
+    parser.add_argument('--zip-codes', action='store_true', help='Also simplify the zip codes geojsons of every province for the map')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    execute(parse_arguments())
@@ -41,9 +41,13 @@ def execute():
     context.logger.info("Instance created with the following details:")
     context.logger.info(instance)
 
-    # Algorithm
-    algorithm = Algorithm(context, instance)
+    # Algorithm, stopped at the TIME_LIMIT of the execution (anytime mode)
+    deadline = start_time + context.parameters.TIME_LIMIT if context.parameters.TIME_LIMIT > 0 else None
+    algorithm = Algorithm(context, instance, deadline)
     context.logger.info("Algorithm initialized. Starting execution...")
+    if algorithm.best_solution is None:
+        context.logger.warning("No solution was found before the execution stopped")
+        return
     algorithm.print_results()
 
     # Results
@@ -1,12 +1,64 @@
 import os
 import json
+import numpy as np
 import pandas as pd
+import shapely
 import random
 import folium
 import base64
+from branca.element import MacroElement
+from folium.elements import JSCSSMixin
+from folium.template import Template
 from folium.plugins import MarkerCluster, Search, MeasureControl, LocateControl, MiniMap, FeatureGroupSubGroup, Fullscreen, AntPath, PolyLineOffset, HeatMap, StripePattern, Geocoder, BeautifyIcon, MousePosition
 
 
+class GeoJsonMarkers(JSCSSMixin, MacroElement):
+    """
+    Markers of a FeatureCollection of points drawn as a single Leaflet GeoJSON layer. Icons, tooltips and popups are
+    built in the browser from the properties of each feature: '{column}' in the templates is replaced by its value,
+    and popups are only rendered when opened
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson({{ this.data|tojson }}, {
+            pointToLayer: function(feature, latlng) {
+                var properties = feature.properties;
+                {% if this.icon_type == 'numbered' %}
+                var icon = L.BeautifyIcon.icon({borderWidth: 3, borderColor: properties.color, textColor: properties.color, backgroundColor: '#FFF',
+                                                innerIconStyle: 'margin-top:0;', isAlphaNumericIcon: true, text: properties.number});
+                {% else %}
+                var icon = L.AwesomeMarkers.icon({markerColor: properties.marker_color, iconColor: properties.icon_color, icon: properties.icon,
+                                                  prefix: 'glyphicon', extraClasses: 'fa-rotate-0'});
+                {% endif %}
+                return L.marker(latlng, {icon: icon});
+            },
+            onEachFeature: function(feature, layer) {
+                var escapes = {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'};
+                var fill = function(template) {
+                    return template.replace(/[{]([A-Za-z0-9_]+)[}]/g, function(match, column) {
+                        var value = feature.properties[column];
+                        return value === undefined ? match : String(value === null ? '' : value).replace(/[&<>"]/g, function(character) { return escapes[character]; });
+                    });
+                };
+                layer.bindTooltip(fill({{ this.tooltip_template|tojson }}));
+                layer.bindPopup(function() { return fill({{ this.popup_template|tojson }}); }, {maxWidth: 500});
+            }
+        }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+        """)
+
+    default_js = [("beautify_icon_js", "https://cdn.jsdelivr.net/gh/marslan390/BeautifyMarker/leaflet-beautify-marker-icon.min.js")]
+    default_css = [("beautify_icon_css", "https://cdn.jsdelivr.net/gh/marslan390/BeautifyMarker/leaflet-beautify-marker-icon.min.css")]
+
+    def __init__(self, data: dict, popup_template: str, tooltip_template: str, icon_type: str):
+        super().__init__()
+        self._name = 'GeoJsonMarkers'
+        self.data = data
+        self.popup_template = popup_template
+        self.tooltip_template = tooltip_template
+        self.icon_type = icon_type
+
+
 class Folium:
     def __init__(self):
         pass
@@ -96,6 +148,27 @@ class Folium:
         folium.Marker(location=location, popup=popup, tooltip=tooltip_folium, name=node_name, icon=icon).add_to(folium_layer)
 
 
+    def add_markers_layer(self, markers_df: pd.DataFrame, popup_template: str, tooltip_template: str, icon_type: str, folium_layer: folium.FeatureGroup):
+        """
+        Adds all the markers of a DataFrame to a Folium layer as a single GeoJSON FeatureCollection, with popups and
+        tooltips templated in the browser, instead of one Marker, Popup and Icon object per row
+
+        Parameters:
+        markers_df -- DataFrame with Latitude and Longitude columns, the columns used by the templates and the icon columns:
+                      icon, icon_color and marker_color for 'awesome' icons, color and number for 'numbered' icons
+        popup_template -- HTML of the popups, '{column}' is replaced by the value of the column
+        tooltip_template -- Text of the tooltips, '{column}' is replaced by the value of the column
+        icon_type -- 'awesome' (folium.Icon) or 'numbered' (BeautifyIcon with a number)
+        folium_layer -- Folium layer
+        """
+        properties_df = markers_df.drop(columns=['Latitude', 'Longitude'])
+        properties_df = properties_df.astype(object).where(properties_df.notna(), None)
+        coordinates = zip(markers_df['Longitude'].tolist(), markers_df['Latitude'].tolist())
+        features = [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]}, 'properties': properties}
+                    for (longitude, latitude), properties in zip(coordinates, properties_df.to_dict('records'))]
+        GeoJsonMarkers({'type': 'FeatureCollection', 'features': features}, popup_template, tooltip_template, icon_type).add_to(folium_layer)
+
+
     def create_circle_marker(self, location: tuple[float, float], popup: folium.Popup, tooltip: str, node_color: str, folium_layer: folium.FeatureGroup):
         """
         Creates a Folium Circle Marker
@@ -304,6 +377,31 @@ class Folium:
         folium.GeoJson(feature_collection, tooltip=tooltip_folium, style_function=style_function, highlight_function=highlight_function, name=polygon_id, zoom_on_click=True).add_to(folium_layer)
 
 
+    def add_polygons_layer_to_map(self, feature_collection: dict, folium_layer: folium.FeatureGroup, polygon_color: str, layer_name: str, tooltip_fields: list[str], tooltip_aliases: list[str]):
+        """Adds all the polygons of a FeatureCollection to a Folium object as a single GeoJson layer.
+
+        Parameters:
+        feature_collection -- FeatureCollection object
+        folium_layer -- Folium layer
+        polygon_color -- Color of the polygons
+        layer_name -- Name of the layer
+        tooltip_fields -- Properties shown in the tooltip of each polygon
+        tooltip_aliases -- Labels of the tooltip properties
+        """
+        style_function=lambda x, fillColor=polygon_color: {
+            "fillColor": fillColor,
+            "color": "black",
+            "weight": 0.8,
+            "fillOpacity": 0.3}
+
+        highlight_function=lambda feature: {
+            "fillOpacity": 0.8,
+            "weight": 0.9}
+
+        tooltip = folium.GeoJsonTooltip(fields=tooltip_fields, aliases=tooltip_aliases)
+        folium.GeoJson(feature_collection, tooltip=tooltip, style_function=style_function, highlight_function=highlight_function, name=layer_name, zoom_on_click=True).add_to(folium_layer)
+
+
     def create_feature_group_folium(self, map_object: folium.Map, layer_color: str, layer_txt: str, initial_show: bool, dynamic: bool) -> folium.FeatureGroup:
         """Creates a Folium layer
 
@@ -384,30 +482,143 @@ class Folium:
             PolyLineOffset(coordinates, dash_array="5,10", color=line_color, weight=5, tooltip=tooltip_folium, opacity=1).add_to(folium_layer)
 
 
-    def get_spain_zip_codes(self, folder_path: str) -> dict[str, dict]:
+    def select_spain_zip_code_files(self, zip_codes_index: dict[str, list[float]], provinces: list[str] = None, bounds: tuple[float, float, float, float] = None) -> list[str]:
         """
-        Lee los ficheros de los códigos postales de España y los almacena en un diccionario
+        Selects the zip codes files of the requested provinces, or those whose bounding box intersects the given bounds
 
         Parameters:
-            folder_path -- (str) Path to the file
+            zip_codes_index -- (dict) Bounding box of each zip codes file (see get_spain_zip_codes_index)
+            provinces -- (list[str]) Provinces (file names without extension) to read, None for all
+            bounds -- (tuple) (min_longitude, min_latitude, max_longitude, max_latitude) the provinces must intersect, None for all
 
         Return:
-            spain_zip_codes_data -- (dict) Dictionary with the Spain zip codes
+            file_names -- (list[str]) Names of the selected files, without extension
         """
-        folder_path = folder_path + 'SPAIN_geojsons'
-        files = os.listdir(folder_path) # List all files in the specified folder
-        #print("Files in the folder:") # Print the list of files
-        #print(files)
+        file_names = list()
+        for file_name, bounding_box in zip_codes_index.items():
+            if provinces is not None and file_name not in provinces:
+                continue
+            if bounds is not None and (bounding_box[0] > bounds[2] or bounding_box[2] < bounds[0] or bounding_box[1] > bounds[3] or bounding_box[3] < bounds[1]):
+                continue
+            file_names.append(file_name)
+        return file_names
+
+
+    def get_simplified_spain_zip_codes(self, folder_path: str, cache_folder: str, provinces: list[str] = None, bounds: tuple[float, float, float, float] = None,
+                                       tolerance: float = 0.0005, precision: int = 5, check_modified: bool = False) -> dict[str, dict]:
+        """
+        Zip codes of the selected provinces (see select_spain_zip_code_files) with simplified geometries, for drawing.
+        Each province is simplified once and stored in cache_folder as a compact GeoJSON, which is rebuilt when the source file changes
+
+        Parameters:
+            folder_path -- (str) Path to the folder with SPAIN_geojsons
+            cache_folder -- (str) Folder of the simplified files
+            provinces -- (list[str]) Provinces (file names without extension) to read, None for all
+            bounds -- (tuple) (min_longitude, min_latitude, max_longitude, max_latitude) the provinces must intersect, None for all
+            tolerance -- (float) Simplification tolerance in degrees (0.0005, about 50 m, is invisible up to zoom 13)
+            precision -- (int) Decimals kept in the coordinates
+            check_modified -- (bool) Also update the index entries of the files modified after it (see get_spain_zip_codes_index)
+
+        Return:
+            spain_zip_codes_data -- (dict) Dictionary with the simplified Spain zip codes
+        """
+        zip_codes_index = self.get_spain_zip_codes_index(folder_path, check_modified)
+        if not os.path.isdir(cache_folder):
+            os.makedirs(cache_folder)
         spain_zip_codes_data = dict()
-        for file in files:  # Process each file in the folder        
-            file_path = os.path.join(folder_path, file) # Construct the full file path
-            if os.path.isfile(file_path): # Check if the path is a file (not a directory)           
-                with open(file_path, 'r') as geojson_file:  # Perform operations on the file, for example, read its content
+        for file_name in self.select_spain_zip_code_files(zip_codes_index, provinces, bounds):
+            source_path = os.path.join(folder_path, 'SPAIN_geojsons', file_name + '.geojson')
+            simplified_path = os.path.join(cache_folder, f"{file_name}_{tolerance}_{precision}.geojson")
+            if not os.path.isfile(simplified_path) or os.path.getmtime(simplified_path) < os.path.getmtime(source_path):
+                with open(source_path, 'r') as geojson_file:
                     zip_codes_geojson = json.load(geojson_file)
-                    file_name = file.split('.')[0]
-                    spain_zip_codes_data[file_name] = zip_codes_geojson
+                simplified_geojson = self.simplify_zip_codes(zip_codes_geojson, file_name, tolerance, precision)
+                with open(simplified_path + '.tmp', 'w') as simplified_file:
+                    json.dump(simplified_geojson, simplified_file, separators=(',', ':'))
+                os.replace(simplified_path + '.tmp', simplified_path)
+            with open(simplified_path, 'r') as simplified_file:
+                spain_zip_codes_data[file_name] = json.load(simplified_file)
         return spain_zip_codes_data
-    
+
+
+    def simplify_zip_codes(self, zip_codes_geojson: dict, province: str, tolerance: float, precision: int) -> dict:
+        """
+        Simplify the geometries of a zip codes FeatureCollection (topology preserving) and round their coordinates.
+        Only the zip code and the province are kept in the properties
+
+        Parameters:
+            zip_codes_geojson -- (dict) FeatureCollection of the zip codes of a province
+            province -- (str) Province name
+            tolerance -- (float) Simplification tolerance in degrees
+            precision -- (int) Decimals kept in the coordinates
+
+        Return:
+            simplified_geojson -- (dict) Simplified FeatureCollection
+        """
+        features = [feature for feature in zip_codes_geojson['features'] if feature['geometry']]
+        geometries = shapely.from_geojson([json.dumps(feature['geometry']) for feature in features])
+        geometries = shapely.simplify(geometries, tolerance, preserve_topology=True)
+        geometries = shapely.transform(geometries, lambda coordinates: np.round(coordinates, precision))
+        simplified_features = [{'type': 'Feature', 'properties': {'COD_POSTAL': feature['properties']['COD_POSTAL'], 'PROVINCIA': province}, 'geometry': json.loads(geometry)}
+                               for feature, geometry in zip(features, shapely.to_geojson(geometries)) if geometry is not None]
+        return {'type': 'FeatureCollection', 'features': simplified_features}
+
+
+    def get_spain_zip_codes_index(self, folder_path: str, check_modified: bool = False) -> dict[str, list[float]]:
+        """
+        Bounding box of every zip codes file, read from SPAIN_geojsons_index.json. The index is trusted by its file names,
+        as the modification times follow the checkout order after a clone: only the files it does not list are read
+        (or every file when it is missing), and the files no longer present are removed from it
+
+        Parameters:
+            folder_path -- (str) Path to the folder with SPAIN_geojsons
+            check_modified -- (bool) Also read again the files modified after the index (preprocessing)
+
+        Return:
+            zip_codes_index -- (dict) [min_longitude, min_latitude, max_longitude, max_latitude] of each province
+        """
+        geojsons_folder = os.path.join(folder_path, 'SPAIN_geojsons')
+        index_path = os.path.join(folder_path, 'SPAIN_geojsons_index.json')
+        file_paths = {file.split('.')[0]: os.path.join(geojsons_folder, file) for file in sorted(os.listdir(geojsons_folder)) if file.endswith('.geojson')}
+        zip_codes_index = dict()
+        if os.path.isfile(index_path):
+            with open(index_path, 'r') as index_file:
+                zip_codes_index = json.load(index_file)
+            if check_modified:
+                index_time = os.path.getmtime(index_path)
+                zip_codes_index = {file_name: bounding_box for file_name, bounding_box in zip_codes_index.items()
+                                   if file_name in file_paths and os.path.getmtime(file_paths[file_name]) <= index_time}
+        missing_files = [file_name for file_name in file_paths if file_name not in zip_codes_index]
+        if not missing_files and len(zip_codes_index) == len(file_paths):
+            return zip_codes_index
+
+        for file_name in missing_files:
+            with open(file_paths[file_name], 'r') as geojson_file:
+                features = json.load(geojson_file)['features']
+            coordinates = [point for feature in features if feature['geometry'] for point in self.get_geometry_points(feature['geometry']['coordinates'])]
+            longitudes = [point[0] for point in coordinates]
+            latitudes = [point[1] for point in coordinates]
+            zip_codes_index[file_name] = [min(longitudes), min(latitudes), max(longitudes), max(latitudes)]
+        zip_codes_index = {file_name: zip_codes_index[file_name] for file_name in file_paths}
+        with open(index_path + '.tmp', 'w') as index_file:
+            json.dump(zip_codes_index, index_file)
+        os.replace(index_path + '.tmp', index_path)
+        return zip_codes_index
+
+
+    def get_geometry_points(self, coordinates: list):
+        """
+        Iterate over the points of the (nested) coordinates of a geometry
+
+        Parameters:
+            coordinates -- (list) Coordinates of a Polygon, MultiPolygon, LineString...
+        """
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            yield coordinates
+        else:
+            for item in coordinates:
+                yield from self.get_geometry_points(item)
+
 
     def get_spain_provinces(self, folder_path: str) -> dict[str, dict]:
         """
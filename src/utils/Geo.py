@@ -1,4 +1,5 @@
 import math
+import numpy as np
 import pandas as pd
 from geopy.distance import geodesic
 from shapely.geometry import Point, LineString, Polygon, LinearRing
@@ -21,6 +22,125 @@ class Geo:
         return int(geodesic(coord1, coord2).meters)
     
 
+    def calculate_distances(self, latitudes_1: np.ndarray, longitudes_1: np.ndarray, latitudes_2: np.ndarray, longitudes_2: np.ndarray, method: str = 'geodesic') -> np.ndarray:
+        """
+        Calculates the element-wise distance between two arrays of coordinates
+
+        Parameters:
+        latitudes_1 -- Latitudes of the origin points
+        longitudes_1 -- Longitudes of the origin points
+        latitudes_2 -- Latitudes of the destination points
+        longitudes_2 -- Longitudes of the destination points
+        method -- 'haversine' (sphere) or 'geodesic' (WGS-84 ellipsoid, Vincenty)
+
+        Returns:
+        Distances in meters (float64)
+        """
+        latitudes_1 = np.radians(np.asarray(latitudes_1, dtype=np.float64))
+        longitudes_1 = np.radians(np.asarray(longitudes_1, dtype=np.float64))
+        latitudes_2 = np.radians(np.asarray(latitudes_2, dtype=np.float64))
+        longitudes_2 = np.radians(np.asarray(longitudes_2, dtype=np.float64))
+        latitudes_1, longitudes_1, latitudes_2, longitudes_2 = np.broadcast_arrays(latitudes_1, longitudes_1, latitudes_2, longitudes_2)
+        if method == 'haversine':
+            return self.haversine_distances(latitudes_1, longitudes_1, latitudes_2, longitudes_2)
+        elif method == 'geodesic':
+            return self.vincenty_distances(latitudes_1, longitudes_1, latitudes_2, longitudes_2)
+        raise ValueError(f"Unknown distance method '{method}', expected 'haversine' or 'geodesic'")
+
+
+    def haversine_distances(self, latitudes_1: np.ndarray, longitudes_1: np.ndarray, latitudes_2: np.ndarray, longitudes_2: np.ndarray) -> np.ndarray:
+        """
+        Great-circle distance on the mean Earth sphere. Coordinates in radians
+
+        Returns:
+        Distances in meters
+        """
+        earth_radius = 6371008.8 # Mean Earth radius (IUGG)
+        sin_delta_latitude = np.sin((latitudes_2 - latitudes_1) / 2)
+        sin_delta_longitude = np.sin((longitudes_2 - longitudes_1) / 2)
+        h = sin_delta_latitude ** 2 + np.cos(latitudes_1) * np.cos(latitudes_2) * sin_delta_longitude ** 2
+        return 2 * earth_radius * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+    def vincenty_distances(self, latitudes_1: np.ndarray, longitudes_1: np.ndarray, latitudes_2: np.ndarray, longitudes_2: np.ndarray, tolerance: float = 1e-12, max_iterations: int = 200) -> np.ndarray:
+        """
+        Vincenty inverse formula on the WGS-84 ellipsoid. Coordinates in radians.
+        Agrees with geopy's geodesic (Karney) to well under a millimeter; the rare
+        nearly-antipodal pairs where the iteration does not converge fall back to geopy.
+
+        Returns:
+        Distances in meters
+        """
+        a = 6378137.0
+        f = 1 / 298.257223563
+        b = (1 - f) * a
+
+        L = longitudes_2 - longitudes_1
+        U1 = np.arctan((1 - f) * np.tan(latitudes_1))
+        U2 = np.arctan((1 - f) * np.tan(latitudes_2))
+        sin_U1, cos_U1 = np.sin(U1), np.cos(U1)
+        sin_U2, cos_U2 = np.sin(U2), np.cos(U2)
+
+        lambda_ = L.copy()
+        converged = np.zeros(L.shape, dtype=bool)
+        for _ in range(max_iterations):
+            sin_lambda, cos_lambda = np.sin(lambda_), np.cos(lambda_)
+            sin_sigma = np.hypot(cos_U2 * sin_lambda, cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lambda)
+            cos_sigma = sin_U1 * sin_U2 + cos_U1 * cos_U2 * cos_lambda
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                sin_alpha = np.where(sin_sigma == 0, 0.0, cos_U1 * cos_U2 * sin_lambda / sin_sigma)
+                cos_sq_alpha = 1 - sin_alpha ** 2
+                cos_2sigma_m = np.where(cos_sq_alpha == 0, 0.0, cos_sigma - 2 * sin_U1 * sin_U2 / cos_sq_alpha) # Equatorial line
+            C = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+            lambda_previous = lambda_
+            lambda_ = L + (1 - C) * f * sin_alpha * (sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = np.abs(lambda_ - lambda_previous) <= tolerance
+            if converged.all():
+                break
+
+        u_sq = cos_sq_alpha * (a ** 2 - b ** 2) / b ** 2
+        A = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+        B = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        distances = b * A * (sigma - delta_sigma)
+
+        for position in np.flatnonzero(~converged):
+            coord1 = (math.degrees(latitudes_1.flat[position]), math.degrees(longitudes_1.flat[position]))
+            coord2 = (math.degrees(latitudes_2.flat[position]), math.degrees(longitudes_2.flat[position]))
+            distances.flat[position] = geodesic(coord1, coord2).meters
+        return distances
+
+
+    def calculate_distance_matrix(self, latitudes: np.ndarray, longitudes: np.ndarray, method: str = 'geodesic', chunk_size: int = 1000000) -> np.ndarray:
+        """
+        Calculates the full symmetric distance matrix between all the given points.
+        Only the upper triangle is computed, by blocks of rows to bound memory, and then mirrored.
+
+        Parameters:
+        latitudes -- Latitudes of the points
+        longitudes -- Longitudes of the points
+        method -- 'haversine' or 'geodesic'
+        chunk_size -- Approximate maximum number of pairs evaluated at once
+
+        Returns:
+        Distance matrix in integer meters (int32), truncated like calculate_distance
+        """
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        n = len(latitudes)
+        distances = np.zeros((n, n), dtype=np.int32)
+        start = 0
+        while start < n - 1:
+            block_size = max(1, chunk_size // (n - start))
+            end = min(n - 1, start + block_size)
+            block = self.calculate_distances(latitudes[start:end, None], longitudes[start:end, None], latitudes[None, start:], longitudes[None, start:], method)
+            distances[start:end, start:] = np.triu(block, k=1) # Lower triangle of the block is filled by the mirror
+            start = end
+        distances += distances.T
+        return distances
+
+
     def signed_polygon_area(self, vertices: list[tuple[float, float]]) -> float:
         """Calculates the area of a polygon using its list of vertices.
         
@@ -1,46 +1,155 @@
 import flexpolyline as fp
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import Timeout
+from urllib3.util.retry import Retry
+from urllib.parse import urlsplit
+from .Statistics import Statistics
+import threading
+import time
 
 class Here:
-    def __init__(self):
-        i = 0
+    def __init__(self, cache=None, offline=False, max_connections=10, max_retries=3, backoff_factor=0.5):
+        """
+        Parameters:
+        cache -- HereCache where the responses are stored and looked up before calling the API (optional)
+        offline -- Only serve responses from the cache, expired ones included, without calling the API
+        max_connections -- Connections kept alive per host, one per concurrent request
+        max_retries -- Retries of a request answered with 429 or 5xx, or whose connection fails
+        backoff_factor -- Exponential backoff between retries: backoff_factor * 2^(retry - 1) seconds, unless HERE sends Retry-After
+        """
+        self.cache = cache
+        self.offline = offline
+        self.session = self.create_session(max_connections, max_retries, backoff_factor)
+        self.latency_statistics = {} # Statistics of the latency (s) of the calls to each endpoint
+        self.requests_statistics = {'calls': 0, 'errors': 0, 'retries': 0}
+        self.statistics_lock = threading.Lock()
+
 
-    def request_url_HERE(self, url_query):
+    def create_session(self, max_connections, max_retries, backoff_factor):
+        """
+        Session shared by every call: keeps the connections alive (no new TCP/TLS handshake per request),
+        asks for gzip responses and retries with exponential backoff when HERE is overloaded or fails
+
+        Returns:
+        The session
+        """
+        retry = Retry(total=max_retries, connect=max_retries, read=max_retries, status=max_retries, backoff_factor=backoff_factor, backoff_max=30,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=frozenset(['GET']), respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_connections, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Accept-Encoding': 'gzip, deflate', 'Accept': 'application/json'})
+        return session
+
+
+    def send_request(self, url_query, timeout=None):
+        """
+        GET through the shared session, recording the latency (retries included) of the call per endpoint
+
+        Parameters:
+        url_query -- Request URL
+        timeout -- Maximum seconds of each attempt (None for no limit)
+
+        Returns:
+        The response
+        """
+        endpoint = urlsplit(url_query).path
+        start_time = time.perf_counter()
+        error = False
+        retries = 0
+        try:
+            response = self.session.get(url_query, timeout=timeout)
+            retries = len(response.raw.retries.history) if getattr(response.raw, 'retries', None) is not None else 0
+            error = response.status_code != requests.codes.ok
+            return response
+        except requests.RequestException:
+            error = True
+            raise
+        finally:
+            latency = time.perf_counter() - start_time
+            with self.statistics_lock:
+                self.latency_statistics.setdefault(endpoint, Statistics()).add_value(latency)
+                self.requests_statistics['calls'] += 1
+                self.requests_statistics['errors'] += int(error)
+                self.requests_statistics['retries'] += retries
+
+
+    def get_requests_summary(self):
+        """
+        Summary of the calls made to the API: number of calls, errors and retries, and latency per endpoint
+
+        Returns:
+        The summary (str)
+        """
+        with self.statistics_lock:
+            summary = f"HERE calls={self.requests_statistics['calls']}, errors={self.requests_statistics['errors']}, retries={self.requests_statistics['retries']}"
+            for endpoint, latency in self.latency_statistics.items():
+                summary += f"\n{endpoint} latency (s): {latency}"
+        return summary
+
+
+    def get_response(self, url_query, request):
+        """
+        Response of a HERE request, served from the cache when it is there and requested to the API otherwise.
+        Error responses of the API (with an error or status field) are not stored
+
+        Parameters:
+        url_query -- Request URL
+        request -- Function that requests the URL to the API and returns the json response
+
+        Returns:
+        The json response
+        """
+        if self.cache is not None:
+            data = self.cache.get(url_query, allow_expired=self.offline)
+            if data is not None:
+                return data
+        if self.offline:
+            raise LookupError("Respuesta no disponible en la cache de HERE (modo offline).")
+        data = request(url_query)
+        if self.cache is not None and not (isinstance(data, dict) and ('error' in data or 'status' in data)):
+            self.cache.set(url_query, data)
+        return data
+
+
+    def request_url_HERE(self, url_query, timeout=5):
         # """Hace GET al endpoint representado por la url dado hasta que devuelva 200. Despues devuelve un json que representa la respuesta."""
         # response = requests.get(url_query)
         # while response.status_code != requests.codes.ok:  # para respuesta de json distintas de 200
         #     response = requests.get(url_query)
         # data = response.json()
         # return data
-        """Hace GET al endpoint representado por la url dado hasta que devuelva 200 o hasta un máximo de 5 segundos. Devuelve un json que representa la respuesta."""
+        """Hace GET al endpoint representado por la url dado, con reintentos si HERE devuelve 429 o 5xx, con un máximo de timeout segundos por intento. Devuelve un json que representa la respuesta."""
         try:
-            response = requests.get(url_query, timeout=5)
+            response = self.send_request(url_query, timeout=timeout)
             if response.status_code == requests.codes.ok:  # para respuesta de json igual a 200
-                return requests.get(url_query).json()
+                return response.json()
             else:
                 # Manejo de otros códigos de estado HTTP aquí, si es necesario
                 response.raise_for_status()
         except Timeout:
             # Manejar el error de tiempo de espera aquí
-            raise TimeoutError("La solicitud excedió el tiempo máximo de 5 segundos.")
+            raise TimeoutError(f"La solicitud excedió el tiempo máximo de {timeout} segundos.")
         except requests.RequestException as e:
             # Manejar otros errores de solicitudes aquí
             raise SystemError(f"Error en la solicitud: {e}")
 
 
-    def calculate_route_HERE(self, coordinates, vehicle, here_API_key):
+    def calculate_route_HERE(self, coordinates, vehicle, here_API_key, url="https://router.hereapi.com/v8/routes?", timeout=5):
         """Funcion que llama a la API de HERE usando una lista de nodos y un tipo de vehiculo.
 
         Parametros:
         coordinates -- Lista de nodos
         vehicle -- Tipo de vehiculo: car, truck
         here_API_key -- Here API KEY
+        url -- URL del endpoint de rutas
+        timeout -- Tiempo maximo de la solicitud en segundos
 
         Devuelve:
         Las coordenadas de la ruta junto a su distancia en KM y su tiempo en horas.
         """
-        url = "https://router.hereapi.com/v8/routes?"
         origin_point = coordinates[0]
         origin = "&origin=" + str(origin_point[0]) + "," + str(origin_point[1])  # Punto origen
         destination_point = coordinates[len(coordinates) - 1]
@@ -52,7 +161,7 @@ class Here:
 
         transport_mode = "&transportMode=" + str(vehicle)
         url_query = url + origin + transport_mode + destination + via + "&return=polyline,summary" + "&apikey=" + here_API_key
-        data_route_response = self.request_url_HERE(url_query)
+        data_route_response = self.get_response(url_query, lambda url: self.request_url_HERE(url, timeout))
 
         route_info = list()
         coords_list = self.get_coordinates_list_from_HERE(data_route_response)
@@ -153,7 +262,7 @@ class Here:
             )
         #print("URL ENVIADA HERE:", url) # TODO BORRAR
         #print("-----") # TODO BORRAR
-        result = self.get_url(url)
+        result = self.get_response(url, self.get_url)
         #print("RESPUESTAS HERE GEOCODE:", result)
         return result
 
@@ -213,7 +322,7 @@ class Here:
             )
         #print("URL ENVIADA HERE:", url) # TODO BORRAR
         #print("-----") # TODO BORRAR
-        result = self.get_url(url)
+        result = self.get_response(url, self.get_url)
         #print("RESPUESTAS HERE GEOCODE:", result)
         return result
 
@@ -242,7 +351,7 @@ class Here:
         )
         #print("URL ENVIADA HERE:", url) # TODO BORRAR
         #print("-----") # TODO BORRAR
-        result = self.get_url(url)
+        result = self.get_response(url, self.get_url)
         #print("RESPUESTAS HERE REVGEOCODE:", result)
         return result
 
@@ -382,6 +491,6 @@ class Here:
         """
         Make HERE API call
         """
-        response = requests.get(str(url))
+        response = self.send_request(str(url))
         data = response.json()
         return data
\ No newline at end of file
@@ -0,0 +1,112 @@
+from urllib.parse import urlsplit, parse_qsl
+import threading
+import sqlite3
+import hashlib
+import json
+import time
+import os
+
+class HereCache:
+    def __init__(self, file_path, ttl=30 * 24 * 3600, max_entries=10000):
+        """
+        Disk-backed cache of the HERE API responses, stored in a SQLite database
+
+        Parameters:
+        file_path -- Path to the SQLite database, created if it does not exist
+        ttl -- Seconds a response is valid
+        max_entries -- Maximum number of responses kept, the least recently used are removed first
+        """
+        folder_path = os.path.dirname(file_path)
+        if folder_path:
+            os.makedirs(folder_path, exist_ok=True)
+        self.file_path = file_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # The connection is shared by the threads that fetch the routes, one statement at a time
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_path, timeout=30, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, url TEXT, response TEXT, created REAL, last_access REAL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+
+    def get_key(self, url):
+        """
+        Key of a request: endpoint and query parameters, without the API key and with the parameters sorted
+        by name (the order of repeated parameters, as the via points of a route, is kept)
+
+        Parameters:
+        url -- Request URL
+
+        Returns:
+        Cache key
+        """
+        url_parts = urlsplit(url)
+        parameters = [(name, value.strip()) for name, value in parse_qsl(url_parts.query, keep_blank_values=True) if name.lower() != 'apikey']
+        parameters.sort(key=lambda parameter: parameter[0])
+        normalized = json.dumps([url_parts.netloc.lower(), url_parts.path.rstrip('/'), parameters], ensure_ascii=False)
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+    def get(self, url, allow_expired=False):
+        """
+        Cached response of a request
+
+        Parameters:
+        url -- Request URL
+        allow_expired -- Also return responses older than the TTL (offline mode)
+
+        Returns:
+        The response (json) or None if it is not cached
+        """
+        key = self.get_key(url)
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (not allow_expired and now - row[1] > self.ttl):
+                return None
+            self.connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+
+    def set(self, url, response):
+        """
+        Store the response of a request, removing the least recently used responses over max_entries
+
+        Parameters:
+        url -- Request URL
+        response -- Response (json)
+        """
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO responses (key, url, response, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                                    (self.get_key(url), self.remove_api_key(url), json.dumps(response), now, now))
+            self.connection.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+
+    def remove_expired(self):
+        """
+        Remove the responses older than the TTL
+
+        Returns:
+        Number of responses removed
+        """
+        with self.lock, self.connection:
+            return self.connection.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)).rowcount
+
+
+    def remove_api_key(self, url):
+        """
+        URL stored next to the response, for inspection, without the API key
+        """
+        url_parts = urlsplit(url)
+        parameters = [parameter for parameter in url_parts.query.split('&') if parameter.split('=')[0].lower() != 'apikey']
+        return url_parts._replace(query='&'.join(parameters)).geturl()
+
+
+    def close(self):
+        """
+        Close the database
+        """
+        with self.lock:
+            self.connection.close()
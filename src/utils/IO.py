@@ -1,6 +1,14 @@
 import pandas as pd
+import numpy as np
+import json
 import os
 import unicodedata
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError: # Optional, read_csv_columns falls back to pandas
+    pa_csv = None
 
 class IO:
     def __init__(self):
@@ -20,8 +28,56 @@ class IO:
         Dataframe object
         """
         return pd.read_csv(file_path, sep=separator, decimal=decimal, encoding=encoding)
+
+
+    def read_csv_columns(self, file_path: str, separator: str, decimal: str, encoding: str, dtypes: dict[str, str]) -> dict[str, np.ndarray]:
+        """
+        Read only the given columns of a CSV file into typed NumPy arrays, skipping the rest of the file.
+        Uses the multithreaded pyarrow reader when it is installed and pandas otherwise
+
+        Parameters:
+        file_path -- Path to the CSV file
+        separator -- Separator used in the CSV file
+        decimal -- Decimal used in the CSV file
+        encoding -- Encoding used in the CSV file
+        dtypes -- NumPy dtype of each column to read
+
+        Returns:
+        Dictionary with the column names as keys and arrays as values
+        """
+        if pa_csv is None:
+            columns_df = pd.read_csv(file_path, sep=separator, decimal=decimal, encoding=encoding, usecols=list(dtypes), dtype=dtypes)
+            return {column: columns_df[column].to_numpy() for column in dtypes}
+
+        # Decimal numbers are read as text and converted after replacing the decimal separator, which pyarrow does not support
+        is_float = {column: np.dtype(dtype).kind == 'f' for column, dtype in dtypes.items()}
+        column_types = {column: pa.string() if is_float[column] and decimal != '.' else pa.from_numpy_dtype(np.dtype(dtype)) for column, dtype in dtypes.items()}
+        table = pa_csv.read_csv(file_path, read_options=pa_csv.ReadOptions(encoding=encoding),
+                                parse_options=pa_csv.ParseOptions(delimiter=separator),
+                                convert_options=pa_csv.ConvertOptions(include_columns=list(dtypes), column_types=column_types))
+        columns = {}
+        for column, dtype in dtypes.items():
+            values = table.column(column)
+            if is_float[column] and decimal != '.':
+                values = pc.cast(pc.replace_substring(values, decimal, '.'), pa.float64())
+            columns[column] = values.to_numpy().astype(dtype, copy=False)
+        return columns
     
 
+    def read_parquet(self, file_path: str, columns: list[str] = None) -> pd.DataFrame:
+        """
+        Read Parquet file from given path
+
+        Parameters:
+        file_path -- Path to the Parquet file
+        columns -- Columns to read, None for all
+
+        Returns:
+        Dataframe object
+        """
+        return pd.read_parquet(file_path, columns=columns)
+
+
     def read_excel(self, file_path: str) -> pd.DataFrame:
         """
         Read CSV file from given path
@@ -72,6 +128,17 @@ class IO:
             output_df.to_excel(file_name + '.xlsx') 
 
 
+    def create_parquet(self, output_df: pd.DataFrame, file_name: str):
+        """
+        Creates Parquet file from dataframe
+
+        Parameters:
+        output_df -- Dataframe object
+        file_name -- Name of the file
+        """
+        output_df.to_parquet(file_name + '.parquet', index=False)
+
+
     def create_CSV_from_list(self, list_of_objects: list[list], columns_name: list[str], file_name: str) -> pd.DataFrame:
         """Create a CSV file using a list of objects using pandas. Utilizes ';' as a separator.
 
@@ -145,11 +212,36 @@ class IO:
         Output:
         Una lista con los DataFrame que cumplen la condicion.
         """
-        clustered_dataframes_list = list()
-        for i in input_dataframe[condition].unique():
-            clustered_dataframes_list.append(input_dataframe[input_dataframe[condition] == i])
-        return clustered_dataframes_list
-    
+        return [group_df for _, group_df in self.iterate_dataframe_groups(input_dataframe, condition)]
+
+
+    def iterate_dataframe_groups(self, input_dataframe: pd.DataFrame, column: str):
+        """
+        Iterate lazily over the groups of rows sharing the same value of a column, in order of first appearance.
+        The groups are found in a single pass (factorize and stable sort) and each one is a slice of the
+        DataFrame: no copy is made when the rows of every group are already contiguous, as in routes_df,
+        otherwise the rows are reordered once
+
+        Parameters:
+        input_dataframe -- Input DataFrame
+        column -- Column to group by
+
+        Returns:
+        Generator of (value, DataFrame) pairs
+        """
+        codes, values = pd.factorize(input_dataframe[column], sort=False)
+        if len(codes) == 0:
+            return
+        order = np.argsort(codes, kind='stable')
+        boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+        starts = np.concatenate(([0], boundaries)).tolist()
+        ends = np.concatenate((boundaries, [len(order)])).tolist()
+        if codes[order[0]] < 0: # Missing values are not a group
+            starts, ends = starts[1:], ends[1:]
+        sorted_dataframe = input_dataframe if np.array_equal(order, np.arange(len(order))) else input_dataframe.take(order)
+        for start, end in zip(starts, ends):
+            yield values[codes[order[start]]], sorted_dataframe.iloc[start:end]
+
 
     def remove_accents(self, input_str: str) -> str:
         """
@@ -191,4 +283,18 @@ class IO:
         path = os.path.join(folder_path)
         isExist = os.path.exists(path)
         if not isExist:
-            os.mkdir(path)
\ No newline at end of file
+            os.mkdir(path)
+
+
+    def write_json_atomic(self, data: dict, file_path: str):
+        """
+        Write a JSON file atomically: readers see either the previous or the new file, never a partial one
+
+        Parameters:
+        data -- JSON serializable object
+        file_path -- Path to the JSON file
+        """
+        temporary_path = file_path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, separators=(',', ':'))
+        os.replace(temporary_path, file_path)
@@ -0,0 +1,298 @@
+from pulp import PULP_CBC_CMD, LpSolutionOptimal, LpSolutionIntegerFeasible, LpSolutionInfeasible, LpSolutionNoSolutionFound
+import numpy as np
+import scipy.sparse as sp
+import os
+import subprocess
+import tempfile
+import time
+
+class MatrixModel:
+    """
+    Mixed integer model stored as NumPy arrays: variables are column ranges and constraints are blocks of
+    COO triplets. The model is written straight to an MPS file and solved with the CBC binary bundled with PuLP,
+    without creating one Python object per term
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.n_variables = 0
+        self.n_constraints = 0
+        self.objective_constant = 0.0
+        self.objective = []
+        self.lower_bounds = []
+        self.upper_bounds = []
+        self.integer = []
+        self.rows = []
+        self.columns = []
+        self.values = []
+        self.senses = []
+        self.rhs = []
+        self.values_solution = None
+        self.objective_value = None
+        self.sol_status = LpSolutionNoSolutionFound
+        self.timings = {'write': 0.0, 'solve': 0.0}
+
+
+    def add_variables(self, count: int, lower_bound: float = 0, upper_bound: float = np.inf, integer: bool = False, objective=0) -> np.ndarray:
+        """
+        Add a block of variables
+
+        Parameters:
+        count -- Number of variables
+        lower_bound -- Lower bound (scalar or array)
+        upper_bound -- Upper bound (scalar or array)
+        integer -- Integer variables
+        objective -- Objective coefficients (scalar or array)
+
+        Returns:
+        Column indices of the new variables
+        """
+        self.objective.append(np.broadcast_to(np.asarray(objective, dtype=np.float64), (count,)))
+        self.lower_bounds.append(np.broadcast_to(np.asarray(lower_bound, dtype=np.float64), (count,)))
+        self.upper_bounds.append(np.broadcast_to(np.asarray(upper_bound, dtype=np.float64), (count,)))
+        self.integer.append(np.full(count, integer, dtype=bool))
+        indices = np.arange(self.n_variables, self.n_variables + count)
+        self.n_variables += count
+        return indices
+
+
+    def add_constraints(self, rows, columns, values, sense, rhs) -> np.ndarray:
+        """
+        Add a block of constraints given as COO triplets. Rows are numbered from 0 inside the block
+        and repeated (row, column) pairs are summed
+
+        Parameters:
+        rows -- Row of each coefficient, inside the block
+        columns -- Column of each coefficient
+        values -- Coefficients (scalar or array)
+        sense -- 'L' (<=), 'G' (>=) or 'E' (==), for all the rows or for each row
+        rhs -- Right hand side of each row (its length is the number of rows of the block)
+
+        Returns:
+        Row indices of the new constraints
+        """
+        rhs = np.atleast_1d(np.asarray(rhs, dtype=np.float64))
+        rows = np.asarray(rows, dtype=np.int64)
+        self.rows.append(rows + self.n_constraints)
+        self.columns.append(np.asarray(columns, dtype=np.int64))
+        self.values.append(np.broadcast_to(np.asarray(values, dtype=np.float64), rows.shape))
+        self.senses.append(np.broadcast_to(np.asarray(sense), rhs.shape))
+        self.rhs.append(rhs)
+        indices = np.arange(self.n_constraints, self.n_constraints + len(rhs))
+        self.n_constraints += len(rhs)
+        return indices
+
+
+    def get_matrix(self) -> sp.csc_matrix:
+        """
+        Constraint matrix in CSC format, with duplicate entries summed and zeros removed
+        """
+        matrix = sp.coo_matrix((np.concatenate(self.values), (np.concatenate(self.rows), np.concatenate(self.columns))),
+                               shape=(self.n_constraints, self.n_variables)).tocsc()
+        matrix.sum_duplicates()
+        matrix.eliminate_zeros()
+        return matrix
+
+
+    def write_mps(self, file_path: str):
+        """
+        Write the model in MPS format (the fixed layout written by PuLP). Variables are named C<index> and constraints R<index>
+
+        Parameters:
+        file_path -- Path to the MPS file
+        """
+        matrix = self.get_matrix()
+        objective = np.concatenate(self.objective)
+        lower_bounds = np.concatenate(self.lower_bounds)
+        upper_bounds = np.concatenate(self.upper_bounds)
+        integer = np.concatenate(self.integer)
+        senses = np.concatenate(self.senses)
+        rhs = np.concatenate(self.rhs)
+
+        # Column entries in column order, the objective row first. Every column gets an objective entry so that it exists
+        column_counts = np.diff(matrix.indptr) + 1
+        entry_columns = np.repeat(np.arange(self.n_variables), column_counts)
+        starts = np.concatenate(([0], np.cumsum(column_counts)[:-1]))
+        is_objective = np.zeros(len(entry_columns), dtype=bool)
+        is_objective[starts] = True
+        entry_rows = np.empty(len(entry_columns), dtype=np.int64)
+        entry_values = np.empty(len(entry_columns))
+        entry_rows[is_objective] = -1
+        entry_values[is_objective] = objective
+        entry_rows[~is_objective] = matrix.indices
+        entry_values[~is_objective] = matrix.data
+
+        # Lines are formatted with NumPy string operations. Integer columns are wrapped in markers
+        names = np.char.ljust(np.char.add('C', entry_columns.astype(str)), 8)
+        row_names = np.char.add('R', entry_rows.astype(str))
+        row_names[is_objective] = 'OBJ'
+        row_names = np.char.ljust(row_names, 8)
+        lines = np.char.add(np.char.add('    ', names), np.char.add(np.char.add('  ', row_names), np.char.add('  ', entry_values.astype(str))))
+        entry_integer = integer[entry_columns]
+        boundaries = np.flatnonzero(np.diff(entry_integer.astype(np.int8))) + 1
+        column_lines = []
+        for start, block in zip(np.concatenate(([0], boundaries)).tolist(), np.split(lines, boundaries)):
+            if entry_integer[start]:
+                column_lines += ["    MARKER                 'MARKER'                 'INTORG'"] + block.tolist() + ["    MARKER                 'MARKER'                 'INTEND'"]
+            else:
+                column_lines += block.tolist()
+
+        row_lines = [f" {sense}  R{row}" for row, sense in enumerate(senses.tolist())]
+        rhs_lines = [f"    RHS       {'R' + str(row):<8}  {value: .12e}" for row, value in zip(np.flatnonzero(rhs).tolist(), rhs[rhs != 0].tolist())]
+
+        # Bounds: binaries, then explicit lower and upper bounds where they differ from [0, inf)
+        binary = integer & (lower_bounds == 0) & (upper_bounds == 1)
+        bound_lines = [f" BV BND       C{column}" for column in np.flatnonzero(binary).tolist()]
+        general = ~binary
+        free = general & np.isneginf(lower_bounds) & np.isposinf(upper_bounds)
+        bound_lines += [f" FR BND       C{column}" for column in np.flatnonzero(free).tolist()]
+        lower = general & ~free & (lower_bounds != 0)
+        bound_lines += [f" MI BND       C{column}" for column in np.flatnonzero(lower & np.isneginf(lower_bounds)).tolist()]
+        lower &= np.isfinite(lower_bounds)
+        bound_lines += [f" LO BND       {'C' + str(column):<8}  {value: .12e}" for column, value in zip(np.flatnonzero(lower).tolist(), lower_bounds[lower].tolist())]
+        upper = general & ~free & (np.isfinite(upper_bounds) | integer)
+        bound_lines += [f" PL BND       C{column}" for column in np.flatnonzero(upper & np.isposinf(upper_bounds)).tolist()]
+        upper &= np.isfinite(upper_bounds)
+        bound_lines += [f" UP BND       {'C' + str(column):<8}  {value: .12e}" for column, value in zip(np.flatnonzero(upper).tolist(), upper_bounds[upper].tolist())]
+
+        with open(file_path, 'w') as file:
+            file.write(f"NAME {self.name}\nROWS\n N OBJ\n")
+            file.write('\n'.join(row_lines + ['COLUMNS'] + column_lines + ['RHS'] + rhs_lines + ['BOUNDS'] + bound_lines + ['ENDATA']) + '\n')
+
+
+    def solve(self, time_limit: float = None, gap: float = None, initial_values: np.ndarray = None, cutoff: float = None, msg: bool = False) -> int:
+        """
+        Solve the model with CBC in a subprocess
+
+        Parameters:
+        time_limit -- Time limit in seconds, None for no limit
+        gap -- Relative gap at which the search stops, None for CBC's default
+        initial_values -- Values of all the variables used as MIP start
+        cutoff -- Initial upper bound of the objective (without the constant): nodes that cannot improve it are pruned
+        msg -- Show the solver log
+
+        Returns:
+        Solution status (PuLP constants): optimal, integer feasible, infeasible or no solution found
+        """
+        with tempfile.TemporaryDirectory() as folder_path:
+            mps_path = os.path.join(folder_path, self.name + '.mps')
+            solution_path = os.path.join(folder_path, self.name + '.sol')
+            start_path = os.path.join(folder_path, self.name + '.mst')
+            start_time = time.perf_counter()
+            self.write_mps(mps_path)
+            if initial_values is not None:
+                self.write_initial_values(initial_values, start_path)
+            self.timings['write'] += time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            arguments = [PULP_CBC_CMD().path, mps_path]
+            if initial_values is not None:
+                arguments += ['-mips', start_path]
+            if time_limit is not None:
+                arguments += ['-sec', str(max(1, int(time_limit))), '-timeMode', 'elapsed']
+            if gap is not None:
+                arguments += ['-ratio', str(gap)]
+            if cutoff is not None:
+                arguments += ['-cutoff', repr(float(cutoff))]
+            arguments += ['-solve', '-solution', solution_path]
+            output = None if msg else subprocess.DEVNULL
+            subprocess.run(arguments, stdout=output, stderr=output, stdin=subprocess.DEVNULL, check=True)
+            self.timings['solve'] += time.perf_counter() - start_time
+            self.read_solution(solution_path)
+        return self.sol_status
+
+
+    def write_initial_values(self, values: np.ndarray, file_path: str):
+        """
+        Write a MIP start in the format of the CBC solution files
+
+        Parameters:
+        values -- Value of each variable
+        file_path -- Path to the MIP start file
+        """
+        lines = [f"{column:>7} C{column} {value:>15} {0:>23}" for column, value in enumerate(np.asarray(values, dtype=np.float64).tolist())]
+        with open(file_path, 'w') as file:
+            file.write("Stopped on time - objective value 0\n" + '\n'.join(lines) + '\n')
+
+
+    def get_objective(self, values: np.ndarray) -> float:
+        """
+        Objective value of the given variable values, constant included
+
+        Parameters:
+        values -- Value of each variable
+
+        Returns:
+        Objective value
+        """
+        return float(np.concatenate(self.objective) @ np.asarray(values, dtype=np.float64)) + self.objective_constant
+
+
+    def get_violations(self, values: np.ndarray, matrix: sp.csc_matrix = None, tolerance: float = 1e-6) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Variables and constraints violated by the given variable values (bounds, integrality and constraint rows)
+
+        Parameters:
+        values -- Value of each variable
+        matrix -- Constraint matrix (get_matrix), built if not given
+        tolerance -- Absolute tolerance
+
+        Returns:
+        Column indices of the violated variables and row indices of the violated constraints
+        """
+        values = np.asarray(values, dtype=np.float64)
+        integer = np.concatenate(self.integer)
+        violated_variables = np.flatnonzero((values < np.concatenate(self.lower_bounds) - tolerance) | (values > np.concatenate(self.upper_bounds) + tolerance)
+                                            | (integer & (np.abs(values - np.round(values)) > tolerance)))
+        activities = (matrix if matrix is not None else self.get_matrix()) @ values
+        senses = np.concatenate(self.senses)
+        rhs = np.concatenate(self.rhs)
+        violated_constraints = np.flatnonzero(((senses == 'L') & (activities > rhs + tolerance)) | ((senses == 'G') & (activities < rhs - tolerance))
+                                              | ((senses == 'E') & (np.abs(activities - rhs) > tolerance)))
+        return violated_variables, violated_constraints
+
+
+    def read_solution(self, file_path: str):
+        """
+        Read a CBC solution file. Only the nonzero columns are listed, infeasible ones marked with '**'
+
+        Parameters:
+        file_path -- Path to the solution file
+        """
+        self.values_solution = None
+        self.objective_value = None
+        self.sol_status = LpSolutionNoSolutionFound
+        if not os.path.exists(file_path):
+            return
+        with open(file_path) as file:
+            status_line = file.readline()
+            lines = file.read().replace('**', '').split('\n')
+        words = status_line.split()
+        if not words or words[0] in ('Infeasible', 'Integer'):
+            self.sol_status = LpSolutionInfeasible
+            return
+        if words[0] == 'Optimal':
+            self.sol_status = LpSolutionOptimal
+        elif len(words) >= 5 and words[4] == 'objective':
+            self.sol_status = LpSolutionIntegerFeasible # Stopped with a feasible solution
+        else:
+            return
+        self.objective_value = float(words[-1]) + self.objective_constant
+
+        values = np.zeros(self.n_variables)
+        entries = [line.split() for line in lines if line.strip()]
+        columns = np.array([int(entry[1][1:]) for entry in entries if entry[1][0] == 'C'], dtype=np.int64)
+        values[columns] = [float(entry[2]) for entry in entries if entry[1][0] == 'C']
+        self.values_solution = values
+
+
+    def get_values(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Values of the given variables in the last solution
+
+        Parameters:
+        indices -- Column indices
+
+        Returns:
+        Values of the variables
+        """
+        return self.values_solution[indices]
@@ -0,0 +1,134 @@
+import math
+
+class Statistics:
+    def __init__(self, quantiles: tuple[float, ...] = (0.1, 0.5, 0.9)):
+        self.quantiles = quantiles
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # Sum of squared differences from the mean (Welford)
+        self.min = math.inf
+        self.max = -math.inf
+        self.markers = [None for _ in quantiles] # P-square markers per quantile
+        self.first_values = []
+
+
+    def add_value(self, value: float):
+        """
+        Add a value to the stream. Constant time and memory.
+
+        Parameters:
+        value -- New observation
+        """
+        value = float(value)
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        if self.count <= 5:
+            self.first_values.append(value)
+            if self.count == 5:
+                for position, quantile in enumerate(self.quantiles):
+                    self.markers[position] = self.initialize_markers(sorted(self.first_values), quantile)
+            return
+        for markers in self.markers:
+            self.update_markers(markers, value)
+
+
+    def initialize_markers(self, first_values: list[float], quantile: float) -> dict:
+        """
+        Initial P-square markers (Jain & Chlamtac, 1985) from the first five sorted observations
+
+        Parameters:
+        first_values -- First five observations, sorted
+        quantile -- Quantile to estimate
+
+        Returns:
+        Marker heights, positions, desired positions and increments
+        """
+        return {
+            'heights': list(first_values),
+            'positions': [0, 1, 2, 3, 4],
+            'desired': [0, 2 * quantile, 4 * quantile, 2 + 2 * quantile, 4],
+            'increments': [0, quantile / 2, quantile, (1 + quantile) / 2, 1],
+        }
+
+
+    def update_markers(self, markers: dict, value: float):
+        """
+        P-square update of the markers of one quantile
+
+        Parameters:
+        markers -- Markers of the quantile
+        value -- New observation
+        """
+        heights, positions, desired = markers['heights'], markers['positions'], markers['desired']
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            desired[i] += markers['increments'][i]
+
+        for i in range(1, 4):
+            difference = desired[i] - positions[i]
+            if (difference >= 1 and positions[i + 1] - positions[i] > 1) or (difference <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if difference > 0 else -1
+                height = self.parabolic_height(heights, positions, i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+
+    def parabolic_height(self, heights: list[float], positions: list[int], i: int, step: int) -> float:
+        """
+        Piecewise-parabolic prediction of the height of marker i after moving it by step
+        """
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + step) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i]) +
+            (positions[i + 1] - positions[i] - step) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+
+
+    def get_quantile(self, quantile: float) -> float:
+        """
+        Estimated quantile. Exact while fewer than five values were added.
+
+        Parameters:
+        quantile -- One of the tracked quantiles
+
+        Returns:
+        Quantile estimate
+        """
+        if self.count == 0:
+            return math.nan
+        if self.count < 5:
+            values = sorted(self.first_values)
+            return values[min(len(values) - 1, int(quantile * len(values)))]
+        return self.markers[self.quantiles.index(quantile)]['heights'][2]
+
+
+    def get_std(self) -> float:
+        """
+        Sample standard deviation
+        """
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.m2 / (self.count - 1))
+
+
+    def __str__(self) -> str:
+        class_str = f"count={self.count}, min={self.min:.4f}, mean={self.mean:.4f}, std={self.get_std():.4f}, max={self.max:.4f}"
+        for quantile in self.quantiles:
+            class_str += f", q{int(quantile * 100)}={self.get_quantile(quantile):.4f}"
+        return class_str
@@ -22,11 +22,15 @@ class Thread:
         self.futures.append(future)
         return future
 
-    def shutdown(self, wait=True):
+    def shutdown(self, wait=True, cancel_futures=False):
         """
         Shuts down the thread pool
+
+        Parameters:
+        wait -- Wait for the running tasks to finish
+        cancel_futures -- Cancel the tasks that have not started yet
         """
-        self.executor.shutdown(wait=wait)
+        self.executor.shutdown(wait=wait, cancel_futures=cancel_futures)
 
     def check_status(self):
         """
@@ -5,3 +5,6 @@ from .IO import IO
 from .Folium import Folium
 from .Geo import Geo
 from .Here import Here
+from .HereCache import HereCache
+from .Statistics import Statistics
+from .MatrixModel import MatrixModel
@@ -0,0 +1,83 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import flexpolyline as fp
+import threading
+import unittest
+import logging
+import types
+import json
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from algorithm.Map import Map
+from utils import Here, Thread
+
+
+class HereRoutesStub(BaseHTTPRequestHandler):
+    """
+    Stub of the HERE v8 routes endpoint: answers the route through the requested points, 1 km and 1 minute per point.
+    Routes whose origin latitude is negative fail with a 500, and the first routes answer later than the last ones
+    """
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        points = [query['origin'][0]] + query.get('via', []) + [query['destination'][0]]
+        coordinates = [tuple(float(value) for value in point.split(',')) for point in points]
+        if coordinates[0][0] < 0:
+            self.send_response(500)
+            self.end_headers()
+            return
+        time.sleep(0.05 * (10 - coordinates[0][0]))
+        body = json.dumps({'routes': [{'sections': [{'polyline': fp.encode(coordinates),
+                                                     'summary': {'length': 1000 * len(coordinates), 'duration': 60 * len(coordinates)}}]}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestFetchRoutesHERE(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), HereRoutesStub)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def create_map(self):
+        parameters = types.SimpleNamespace(here_API_key='test', here_routes_URL=f'http://127.0.0.1:{self.server.server_port}/v8/routes?',
+                                           HERE_MAX_CONCURRENCY=4, HERE_TIMEOUT=5.0, HERE_MAX_RETRIES=0, HERE_BACKOFF_FACTOR=0.0)
+        map_object = Map.__new__(Map)
+        map_object.context = types.SimpleNamespace(parameters=parameters, logger=logging.getLogger(__name__))
+        map_object.Here = Here(max_connections=parameters.HERE_MAX_CONCURRENCY, max_retries=parameters.HERE_MAX_RETRIES)
+        map_object.Thread = Thread(max_workers=parameters.HERE_MAX_CONCURRENCY)
+        return map_object
+
+    def test_routes_keep_their_order(self):
+        routes_coordinates = [[[float(route), float(stop)] for stop in range(route + 1)] for route in range(1, 9)]
+        routes_info = self.create_map().fetch_routes_HERE(routes_coordinates)
+        self.assertEqual(len(routes_info), len(routes_coordinates))
+        for coordinates, (route_coordinates, distance, duration) in zip(routes_coordinates, routes_info):
+            self.assertEqual([list(point) for point in route_coordinates], coordinates)
+            self.assertEqual(distance, len(coordinates))
+            self.assertEqual(duration, round(len(coordinates) / 60, 2))
+
+    def test_failed_routes_are_straight_lines(self):
+        routes_coordinates = [[[1.0, 0.0], [1.0, 1.0]], [[-2.0, 0.0], [-2.0, 1.0], [-2.0, 2.0]], [[3.0, 0.0], [3.0, 1.0]]]
+        routes_info = self.create_map().fetch_routes_HERE(routes_coordinates)
+        self.assertEqual(routes_info[1], [routes_coordinates[1], None, None])
+        self.assertEqual(routes_info[0][1:], [2, round(2 / 60, 2)])
+        self.assertEqual(routes_info[2][1:], [2, round(2 / 60, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()